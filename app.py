@@ -1,7 +1,40 @@
+import os
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime
+from nextbarrel.charts import (
+    CHART_CONFIG,
+    Series,
+    area,
+    chart_json,
+    figure_from_json,
+    heatmap_json,
+    lines,
+    spec_columns,
+    term_json,
+)
+from nextbarrel.curves import REGIME_NAMES, available_curves, regime_run, term_structure
+from nextbarrel.events import column_events
+from nextbarrel.metrics import window_metrics
+from nextbarrel.netback import arb_cube, input_columns
+from nextbarrel.news import PAGE_SIZE, news_feed, render_items
+from nextbarrel.newsindex import news_index
+from nextbarrel.sources import derived_columns, price_source, read_columns
+from nextbarrel.store import SchemaError
+from nextbarrel.ticks import DEFAULT_ADDRESS, LIVE_COLUMNS, REFRESH_SECONDS, live_view, tick_feed
+from nextbarrel.pages import PAGES, freight_columns, page_payloads
+from nextbarrel.memo import cache_stats
+from nextbarrel.profiling import breakdown, finish_run, start_run, timed
+from nextbarrel.relvalue import (
+    CORRELATION_WINDOWS,
+    DEFAULT_CORRELATION_WINDOW,
+    GRADES,
+    correlation_matrix,
+    pair_correlation,
+    stationarity,
+)
+from nextbarrel.rolling import DEFAULT_WINDOW, ROLLING_WINDOWS, rolling_stats
+from nextbarrel.windows import DEFAULT_TIMEFRAME, TIMEFRAMES, window, window_bounds, window_positions
 # from chatoil import run_oil_chatbot
 
 # .\venv\Scripts\Activate
@@ -9,9 +42,14 @@ from datetime import datetime
 # --- App Settings ---
 st.set_page_config(layout="wide", page_title="NextBarrel Terminal")
 
-# Initialize session state for active tab
+# Initialize session state for active tab and timeframe
 if 'active_tab' not in st.session_state:
     st.session_state.active_tab = "North Sea"
+if 'timeframe' not in st.session_state:
+    st.session_state.timeframe = DEFAULT_TIMEFRAME
+
+# Stage timings of this rerun (see nextbarrel.profiling)
+run = start_run(st.session_state.active_tab)
 
 # Custom CSS for Bloomberg-style dark theme
 st.markdown("""
@@ -46,15 +84,22 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-#--- Load CSV data ---
+#--- Price source: the CSV or a long SQLite file built from it (see nextbarrel.sources) ---
+# Tabs read only their own columns from it; shared read-only by all sessions.
+# NEXTBARREL_PRECISION=float32 holds prices as float32 where that is exact to the quote.
+PRICES = os.environ.get("NEXTBARREL_PRICES", "Historical_prices.csv")
+PRECISION = os.environ.get("NEXTBARREL_PRECISION", "float64")
 try:
-    df = pd.read_csv("Historical_prices.csv", index_col=0, parse_dates=True)
+    source = price_source(PRICES, PRECISION)
 except FileNotFoundError:
-    st.error("❌ Historical_prices.csv not found. Please upload the file.")
+    st.error(f"❌ {PRICES} not found. Please upload the file.")
+    st.stop()
+except SchemaError as e:
+    st.error(f"❌ {PRICES} cannot be loaded: {e}")
     st.stop()
 
 # Get available products
-available_stocks = df.select_dtypes(include="number").columns.tolist()
+available_stocks = list(source.numeric_columns)
 
 if not available_stocks:
     st.error("No numeric columns found in the CSV file.")
@@ -64,7 +109,13 @@ if not available_stocks:
 st.sidebar.image("logo.png", width=200)
 # st.sidebar.markdown("---")
 
-tab_names = [ "North Sea", "Americas", "Middle East", "WAF", "Refined Products", "Freight", "Charts-News"]
+tab_names = list(PAGES)
+
+
+def select(key, value):
+    # Runs before the rerun, so a click renders the new tab/timeframe once
+    st.session_state[key] = value
+
 
 # Navigation buttons in 2-column layout
 col_n1, col_n2 = st.sidebar.columns(2)
@@ -72,9 +123,8 @@ col_n1, col_n2 = st.sidebar.columns(2)
 for idx, tab_name in enumerate(tab_names):
     target_col = col_n1 if idx % 2 == 0 else col_n2
     with target_col:
-        if st.button(tab_name, key=f"tab_{tab_name}", use_container_width=True):
-            st.session_state.active_tab = tab_name
-            st.rerun()
+        st.button(tab_name, key=f"tab_{tab_name}", use_container_width=True,
+                  on_click=select, args=("active_tab", tab_name))
 
 st.sidebar.markdown("---")
 
@@ -82,162 +132,177 @@ st.sidebar.markdown("---")
 col_t1, col_t2, col_t3 = st.sidebar.columns(3)
 col_t4, col_t5 = st.sidebar.columns(2)
 
-timeframe = None
-
-with col_t1:
-    if st.button("1W", use_container_width=True):
-        timeframe = "1W"
-with col_t2:
-    if st.button("1M", use_container_width=True):
-        timeframe = "1M"
-with col_t3:
-    if st.button("3M", use_container_width=True):
-        timeframe = "3M"
-with col_t4:
-    if st.button("YTD", use_container_width=True):
-        timeframe = "YTD"
-with col_t5:
-    if st.button("ALL", use_container_width=True):
-        timeframe = "ALL"
-
-
-
-# Apply timeframe filter
-max_date = df.index.max()
-if timeframe:
-    if timeframe == "1W":
-        start_date = (max_date - pd.Timedelta(weeks=1)).date()
-    elif timeframe == "1M":
-        start_date = (max_date - pd.Timedelta(days=30)).date()
-    elif timeframe == "3M":
-        start_date = (max_date - pd.Timedelta(days=90)).date()
-    elif timeframe == "YTD":
-        start_date = pd.Timestamp('2025-01-01').date()
-    elif timeframe == "ALL":
-        start_date = df.index.min().date()
-    end_date = max_date.date()
-else:
-    # Default to 3 months if no timeframe selected
-    start_date = (max_date - pd.Timedelta(days=90)).date()
-    end_date = max_date.date()
-
-# Filter data
-df_filtered = df.loc[end_date:start_date]
-
-if df_filtered.empty:
+for target_col, tf in zip([col_t1, col_t2, col_t3, col_t4, col_t5], TIMEFRAMES):
+    with target_col:
+        st.button(tf, use_container_width=True, on_click=select, args=("timeframe", tf))
+
+st.sidebar.toggle("News markers", key="show_events", help="Mark dated headlines on the price charts")
+band_window = st.sidebar.selectbox(
+    "Rolling bands",
+    (None,) + ROLLING_WINDOWS,
+    format_func=lambda w: "Off" if w is None else f"{w}d mean, 5-95% band",
+    key="band_window",
+)
+st.sidebar.toggle("Profiling", key="show_profile", help="Per-stage timings of this rerun and the tab's p50/p95")
+# Intraday prices pushed by a local feed process (see nextbarrel.ticks)
+TICKS = os.environ.get("NEXTBARREL_TICKS", DEFAULT_ADDRESS)
+st.sidebar.toggle("Live ticks", key="live", help=f"Intraday prices from the tick feed at {TICKS}")
+
+st.sidebar.metric(
+    "Data load",
+    f"{source.load_seconds * 1000:.0f} ms",
+    help=(
+        f"{source.backend} source {source.path} · version {source.version[:8]} · "
+        f"{PRECISION}, {len(source.precision.float32)} columns float32 · "
+        f"{source.memory_bytes / 1024:,.0f} KB held"
+    ),
+)
+
+# Timeframe bounds (binary search on the ascending date index); data is read per tab
+window_start, window_end = window_bounds(source.dates, st.session_state.timeframe)
+visible_rows = window_positions(source.dates, window_start, window_end)
+
+if visible_rows.stop <= visible_rows.start:
     st.warning("No data available for selected date range.")
     st.stop()
 
 
 # --- Tabs ---
 # --- Render active tab based on session state ---
-
-# --- Tab 1: Charts + News ---
-if st.session_state.active_tab == "Charts-News":
+page = PAGES[st.session_state.active_tab]
+
+
+def chart_events(columns):
+    """News events tagged with any of ``columns``, or None when markers are off."""
+    if not st.session_state.get("show_events"):
+        return None
+    return column_events(columns, available_stocks, source.dates[-1])
+
+
+def read(columns, history=False):
+    """``columns`` (raw or derived) over the timeframe, or their whole history."""
+    return read_columns(source, columns, None if history else window_start, window_end)
+
+
+def bands(history):
+    """Rolling statistics of a history frame when bands are on, cached per (window, version, columns)."""
+    return rolling_stats(history, source.version, band_window) if band_window else None
+
+
+def show_chart(payload):
+    """Send a serialized figure to the browser, unpacked: every trace carries its own x array."""
+    with timed("plotly_chart"):
+        st.plotly_chart(figure_from_json(payload), use_container_width=True, config=CHART_CONFIG)
+
+
+def plot(spec, events=None):
+    """Render a chart spec over the current window (memoised per data version)."""
+    history = read(spec_columns(spec), history=band_window is not None)
+    frame = window(history, st.session_state.timeframe)
+    show_chart(chart_json(spec, frame, source.version, events=events, stats=bands(history)))
+
+
+# --- Live ticks ---
+# A fragment rerun on a timer: ticks never rerun the whole script, and the
+# charts of columns without new ticks come back unchanged from the memo.
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_panel():
+    live_run = start_run("Live")
+    feed = tick_feed(TICKS)
+    closes = read([c for c in LIVE_COLUMNS if c in available_stocks], history=True)
+    status = "connected" if feed.connected else f"waiting for feed ({feed.error or 'connecting'})"
+    st.caption(f"LIVE · {TICKS} · {status} · {feed.received:,} ticks · {feed.rejected:,} rejected")
+    for col, column in zip(st.columns(len(LIVE_COLUMNS)), LIVE_COLUMNS):
+        with col:
+            quoted = closes[column].dropna() if column in closes.columns else ()
+            view = live_view(feed.book, column, quoted.iloc[-1] if len(quoted) else None)
+            if view is None:
+                st.metric(column, "—")
+                continue
+            change = f"{view.change:+.3f} vs close" if len(quoted) else None
+            st.metric(column, f"${view.value:.3f}", change, help=f"Last tick {view.time:%H:%M:%S} UTC")
+            show_chart(view.figure)
+    finish_run(live_run)
+
+
+if st.session_state.get("live"):
+    live_panel()
+
+# --- Chart grid tabs: North Sea, Americas, Middle East, WAF, Refined Products ---
+if page.panels:
+    st.subheader(page.title)
+
+    # Only this tab's columns are read; the figures come from one cache entry per (tab, window, data version)
+    history = read(page.columns, history=band_window is not None)
+    frame = window(history, st.session_state.timeframe)
+    payloads = page_payloads(page, frame, source.version, chart_events(page.columns), bands(history))
+    for row_start in range(0, len(payloads), 2):
+        row = st.columns(2)
+        for col, (title, payload) in zip(row, payloads[row_start:row_start + 2]):
+            with col:
+                st.markdown(f"**{title}**")
+                show_chart(payload)
+
+# --- Charts + News ---
+if page.name == "Charts-News":
     # Product selector for Charts-News tab
     selected_stock = st.selectbox("Select Product", available_stocks, key="charts_product")
     
-    # Calculate key metrics
-    latest_price = df_filtered[selected_stock].iloc[0]
-    prev_price = df_filtered[selected_stock].iloc[-1] if len(df_filtered) > 1 else latest_price
-    price_change = latest_price - prev_price
-    pct_change = (price_change / prev_price) * 100 if prev_price != 0 else 0
+    # Key metrics
+    m = window_metrics(read((selected_stock,)), selected_stock, source.version)
     
     # Display key metrics
     col_m1, col_m2, col_m3, col_m4 = st.columns(4)
     with col_m1:
-        st.metric(f"{selected_stock} - Current Price", f"${latest_price:.2f}", f"{price_change:+.2f}")
+        st.metric(f"{selected_stock} - Current Price", f"${m.latest:.2f}", f"{m.change:+.2f}")
     with col_m2:
-        st.metric("% Change", f"{pct_change:+.2f}%")
+        st.metric("% Change", f"{m.pct_change:+.2f}%")
     with col_m3:
-        st.metric("High", f"${df_filtered[selected_stock].max():.2f}")
+        st.metric("High", f"${m.high:.2f}")
     with col_m4:
-        st.metric("Low", f"${df_filtered[selected_stock].min():.2f}")
+        st.metric("Low", f"${m.low:.2f}")
+
+    # Rolling analytics for the selected product (latest date)
+    analytics = rolling_stats(read((selected_stock,), history=True), source.version, band_window or DEFAULT_WINDOW)
+    latest = analytics.column(selected_stock).iloc[-1]
+    col_a1, col_a2, col_a3, col_a4 = st.columns(4)
+    with col_a1:
+        st.metric(f"{analytics.window}d Mean", f"${latest['mean']:.2f}")
+    with col_a2:
+        st.metric(f"{analytics.window}d Vol (daily)", f"{latest['vol']:.2f}")
+    with col_a3:
+        st.metric("Z-Score", f"{latest['zscore']:+.2f}")
+    with col_a4:
+        st.metric("Percentile (history)", f"{analytics.percentile_rank()[selected_stock]:.0f}%")
     
     col1, col2 = st.columns([2, 1])
 
     # Column 1: Bloomberg-style Chart
     with col1:
         st.subheader(f"{selected_stock} - PRICE CHART")
-        
-        # Create the figure
-        fig = go.Figure()
-        
-        # Add area trace
-        fig.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered[selected_stock],
-            mode='lines',
-            name=selected_stock,
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Price</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # Bloomberg Terminal styling
-        fig.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(
-                family='Courier New, monospace',
-                size=12,
-                color='#faa537'
-            ),
-            xaxis=dict(
-                gridcolor='#1a1a1a',
-                showgrid=True,
-                zeroline=False,
-                showline=True,
-                linewidth=1,
-                linecolor='#333333',
-                mirror=True
-            ),
-            yaxis=dict(
-                gridcolor='#1a1a1a',
-                showgrid=True,
-                zeroline=False,
-                showline=True,
-                linewidth=1,
-                linecolor='#333333',
-                mirror=True,
-                tickprefix='$'
-            ),
-            hovermode='x unified',
-            showlegend=False,
-            height=500,
-            margin=dict(l=60, r=30, t=30, b=50)
-        )
-        
-        # Update axes for cleaner look
-        fig.update_xaxes(
-            showspikes=True,
-            spikecolor='#faa537',
-            spikesnap='cursor',
-            spikemode='across',
-            spikethickness=1
-        )
-        
-        fig.update_yaxes(
-            showspikes=True,
-            spikecolor='#faa537',
-            spikesnap='cursor',
-            spikemode='across',
-            spikethickness=1
-        )
-        
-        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+        plot(area(selected_stock, "Price", height=500, large=True), chart_events((selected_stock,)))
        
     # Column 2: News Feed
     with col2:
         st.subheader("LATEST OIL NEWS")
         try:
-            with open("daily_news_feed.txt", "r", encoding="utf-8") as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-
-            news_html = """
+            feed = news_feed()
+            index = news_index(feed, available_stocks)
+            query = st.text_input("Search news", key="news_query", placeholder="lukoil OR novo*, -bulgaria")
+            related = st.checkbox(f"Only news tagged {selected_stock}", value=True, key="news_related")
+
+            matches = index.matches(query, selected_stock if related else None)
+            if related and not query and not matches:
+                st.caption(f"No headlines mention {selected_stock}; showing all news.")
+                matches = index.matches()
+
+            page_count = max(-(-len(matches) // PAGE_SIZE), 1)
+            if st.session_state.get("news_page", 1) > page_count:
+                st.session_state.news_page = 1
+            news_page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="news_page")
+            visible = feed.records(matches[(news_page - 1) * PAGE_SIZE:news_page * PAGE_SIZE])
+
+            news_html = f"""
             <div style="
                 height: 500px;
                 overflow-y: auto;
@@ -248,1008 +313,210 @@ if st.session_state.active_tab == "Charts-News":
                 font-family: 'Courier New', monospace;
                 font-size: 13px;
             ">
-            <ul style="list-style-type: none; padding-left: 0;">
+            <ul style="list-style-type: none; padding-left: 0;">{render_items(visible)}</ul></div>
             """
-
-            for line in lines:
-                news_html += f"<li style='margin-bottom: 12px; border-bottom: 1px solid #1a1a1a; padding-bottom: 8px;'>▸ {line}</li>"
-
-            news_html += "</ul></div>"
             st.markdown(news_html, unsafe_allow_html=True)
 
         except FileNotFoundError:
             st.warning("🟡 No news file found.")
 
-# --- Tab 2: North Sea ---
-if st.session_state.active_tab == "North Sea":
-    st.subheader("NORTH SEA COMPLEX")
-    
-    # Row 1
-    col1, col2 = st.columns(2)
-    
-    # Chart 1: Brent DFL
-    with col1:
-        st.markdown("**DATED TO FRONTLINE (DFL)**")
-        fig_dfl = go.Figure()
-        
-        fig_dfl.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered[' Dated to Frontline (DFL)'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>DFL</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_dfl.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"
-),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_dfl, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 2: Brent/WTI Spread
-    with col2:
-        st.markdown("**BRENT/WTI SPREAD**")
-        fig_brentwti = go.Figure()
-        
-        fig_brentwti.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Brent/Ti'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Brent/WTI</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_brentwti.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"
-),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_brentwti, use_container_width=True, config={'displayModeBar': False})
-    
-    # Row 2
-    col3, col4 = st.columns(2)
-    
-    # Chart 3: Brent M1/M2 Spread
-    with col3:
-        st.markdown("**BRENT M1/M2 SPREAD**")
-        fig_m1m2 = go.Figure()
-        
-        fig_m1m2.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Brent M1/M2 spread'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>M1/M2</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_m1m2.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"
-),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_m1m2, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 4: Weekly CFDs Curve
-    with col4:
-        st.markdown("**WEEKLY CFDs CURVE**")
-        fig_cfd = go.Figure()
-        
-        # Get the latest (most recent) values for each CFD week
-        latest_data = df_filtered.iloc[0]
-        
-        cfd_weeks = [
-            'North Sea Dated CFD week 1',
-            'North Sea Dated CFD week 2',
-            'North Sea Dated CFD week 3',
-            'North Sea Dated CFD week 4',
-            'North Sea Dated CFD week 5'
-        ]
-        
-        cfd_values = [latest_data[week] for week in cfd_weeks if pd.notna(latest_data[week])]
-        cfd_labels = [f'W{i+1}' for i in range(len(cfd_values))]
-        
-        fig_cfd.add_trace(go.Scatter(
-            x=cfd_labels,
-            y=cfd_values,
-            mode='lines+markers',
-            line=dict(color='#faa537', width=2),
-            marker=dict(size=8, color='#faa537'),
-            hovertemplate='<b>%{x}</b><br>' +
-                          '<b>Price</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_cfd.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(
-                gridcolor='#1a1a1a', 
-                showgrid=True, 
-                zeroline=False, 
-                showline=True, 
-                linewidth=1, 
-                linecolor='#333333',
-                title='Week'
-            ),
-            yaxis=dict(
-                gridcolor='#1a1a1a', 
-                showgrid=True, 
-                zeroline=False, 
-                showline=True, 
-                linewidth=1, 
-                linecolor='#333333', 
-                tickprefix="$"
-,
-                title='Price'
-            ),
-            hovermode='closest',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_cfd, use_container_width=True, config={'displayModeBar': False})
+# --- Term Structure: CFD week curve and M1/M2 futures curves ---
+if page.name == "Term Structure":
+    st.subheader(page.title)
+
+    curves = available_curves(source.columns)
+    curve_name = st.selectbox("Select Curve", list(curves), key="curve_selector")
+
+    # Whole-history date x tenor array, built once per data version
+    curve = curves[curve_name]
+    structure = term_structure(read(curve.columns, history=True), curve, source.version)
+    windowed = structure.between(window_start, window_end)
+    regime, days = regime_run(windowed.regimes())
+    spread = windowed.spread()
+
+    col_r1, col_r2, col_r3, col_r4 = st.columns(4)
+    with col_r1:
+        st.metric("Structure", REGIME_NAMES[regime])
+    with col_r2:
+        st.metric("Days in regime", f"{days}")
+    with col_r3:
+        st.metric("Front - back", f"${spread[-1]:.2f}", f"{spread[-1] - spread[0]:+.2f}")
+    with col_r4:
+        st.metric("Backwardated", f"{(windowed.regimes() > 0).mean() * 100:.0f}% of window")
+
+    history = [d.strftime("%Y-%m-%d") for d in structure.dates[::-1]]
+    defaults = [d.strftime("%Y-%m-%d") for d in structure.recent_dates()]
+    compare = st.multiselect("Compare curves on", history, default=defaults, key="curve_dates")
 
-# --- Tab 3: US ---
-if st.session_state.active_tab == "Americas":
-    st.subheader("US OIL")
-    
-    # Row 1
     col1, col2 = st.columns(2)
-    
-    # Chart 1: WTI M1/M2
     with col1:
-        st.markdown("**WTI M1/M2 SPREAD**")
-        fig_wti_m1m2 = go.Figure()
-        
-        fig_wti_m1m2.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['WTI M1/M2'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>WTI M1/M2</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_wti_m1m2.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_wti_m1m2, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 2: Houston MEH vs WTI
+        st.markdown("**CURVE SNAPSHOTS**")
+        payload = term_json("snapshots", structure, tuple(sorted(compare)))
+        show_chart(payload)
     with col2:
-        st.markdown("**HOUSTON MEH vs WTI**")
-        fig_houston = go.Figure()
-        
-        fig_houston.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Houston MEH vs WTI'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Houston MEH</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_houston.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
+        st.markdown("**CURVE OVER WINDOW**")
+        payload = term_json("animation", windowed)
+        show_chart(payload)
+
+    st.markdown("**FRONT - BACK SPREAD** (green: backwardation, red: contango)")
+    payload = term_json("regime", windowed)
+    show_chart(payload)
+
+# --- Relative Value: correlations and spread stationarity across grades ---
+if page.name == "Relative Value":
+    st.subheader(page.title)
+
+    numeric_columns = available_stocks + list(derived_columns(source.columns))
+    col_u1, col_u2 = st.columns([4, 1])
+    with col_u1:
+        universe = st.multiselect(
+            "Universe", numeric_columns, default=[c for c in GRADES if c in numeric_columns], key="rv_universe"
         )
-        
-        st.plotly_chart(fig_houston, use_container_width=True, config={'displayModeBar': False})
-    
-    # Row 2
-    col3, col4 = st.columns(2)
-    
-    # Chart 3: WCS Hardisty vs WTI and Mars vs WTI (multiline)
-    with col3:
-        st.markdown("**SOURS vs WTI**")
-        fig_crudes = go.Figure()
-        
-        # WCS Hardisty vs WTI
-        fig_crudes.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['WCS Hardisty vs WTI'],
-            mode='lines',
-            name='WCS Hardisty',
-            line=dict(color='#faa537', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>WCS Hardisty</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # Mars vs WTI
-        fig_crudes.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Mars vs WTI 1st Line'],
-            mode='lines',
-            name='Mars',
-            line=dict(color='#00d9ff', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Mars</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_crudes.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#faa537')
-            ),
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
+    with col_u2:
+        corr_window = st.selectbox(
+            "Correlation window (days)",
+            CORRELATION_WINDOWS,
+            index=CORRELATION_WINDOWS.index(DEFAULT_CORRELATION_WINDOW),
+            key="rv_window",
         )
-        
-        st.plotly_chart(fig_crudes, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 4: Refinery Utilization (multiline with dotted US average)
-    with col4:
-        st.markdown("**REFINERY UTILIZATION**")
-        fig_refinery = go.Figure()
-        
-        # PADD 1
-        fig_refinery.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Refinery runs East Coast (PADD 1)'],
-            mode='lines',
-            name='PADD 1',
-            line=dict(color='#faa537', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>PADD 1</b>: %{y:.1f}%<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # PADD 3
-        fig_refinery.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Refinery runs Gulf Coast (PADD 3)'],
-            mode='lines',
-            name='PADD 3',
-            line=dict(color='#00d9ff', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>PADD 3</b>: %{y:.1f}%<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # US Average (dotted line)
-        fig_refinery.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['U.S. Average Utilization'],
-            mode='lines',
-            name='US Average',
-            line=dict(color='#ff6b6b', width=2, dash='dot'),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>US Avg</b>: %{y:.1f}%<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_refinery.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(
-                gridcolor='#1a1a1a', 
-                showgrid=True, 
-                zeroline=False, 
-                showline=True, 
-                linewidth=1, 
-                linecolor='#333333',
-                ticksuffix='%'
-            ),
-            hovermode='x unified',
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#faa537')
-            ),
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_refinery, use_container_width=True, config={'displayModeBar': False})
 
-# --- Tab 4: Middle East ---
-if st.session_state.active_tab == "Middle East":
-    st.subheader("MIDDLE EAST OIL MARKETS")
-    
-    # Row 1
-    col1, col2 = st.columns(2)
-    
-    # Chart 1: Dubai-Brent EFS
-    with col1:
-        st.markdown("**DUBAI-BRENT EFS**")
-        fig_efs = go.Figure()
-        
-        fig_efs.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Dubai-Brent EFS'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>EFS</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_efs.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
+    if len(universe) < 2:
+        st.info("Select at least two series.")
+    else:
+        # Advanced incrementally from the previous data version (see nextbarrel.relvalue)
+        grades = read(universe, history=True)
+        matrix = correlation_matrix(grades, source.version, universe, corr_window)
+        st.markdown(f"**{corr_window}D CORRELATION OF DAILY CHANGES**")
+        payload = heatmap_json(matrix, (source.version, tuple(universe), corr_window))
+        show_chart(payload)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            col_p1, col_p2 = st.columns(2)
+            with col_p1:
+                pair_a = st.selectbox("Series A", universe, index=0, key="rv_pair_a")
+            with col_p2:
+                pair_b = st.selectbox("Series B", universe, index=1, key="rv_pair_b")
+            label = f"{pair_a.strip()} / {pair_b.strip()}"
+            history = pair_correlation(grades, source.version, pair_a, pair_b, corr_window).to_frame(label)
+            st.markdown(f"**ROLLING CORRELATION: {label}**")
+            spec = lines(Series(label, "Correlation"), tickprefix="", decimals=2, height=350)
+            payload = chart_json(spec, window(history, st.session_state.timeframe), (source.version, corr_window))
+            show_chart(payload)
+
+        with col2:
+            st.markdown("**SPREAD STATIONARITY (ENGLE-GRANGER, 250D)**")
+            table = stationarity(grades, source.version, universe)
+            if table is None:
+                st.info("Stationarity tests are running in the background.")
+                st.button("Refresh", key="rv_refresh")
+            else:
+                st.dataframe(
+                    table,
+                    height=350,
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "beta": st.column_config.NumberColumn("Hedge ratio", format="%.3f"),
+                        "adf_t": st.column_config.NumberColumn("ADF t", format="%.2f"),
+                        "half_life": st.column_config.NumberColumn("Half-life (d)", format="%.1f"),
+                        "stationary": st.column_config.TextColumn("Stationary at"),
+                    },
+                )
+
+# --- Arb Matrix: delivered crude vs destination benchmark, grade x route ---
+if page.name == "Arb Matrix":
+    st.subheader(page.title)
+
+    # Whole date x grade x route cube, computed once per data version
+    cube = arb_cube(read([c for c in input_columns() if c in source.columns], history=True), source.version)
+    views = {"Arb ($/bbl)": "arb", "Delivered ($/bbl)": "delivered", "Netback ($/bbl)": "netback", "Freight ($/bbl)": "freight"}
+    col_v1, col_v2 = st.columns([1, 2])
+    with col_v1:
+        view = views[st.radio("Show", list(views), horizontal=True, key="arb_view")]
+    with col_v2:
+        as_of = st.select_slider(
+            "As of",
+            options=list(cube.dates),
+            value=cube.dates[-1],
+            format_func=lambda d: d.strftime("%Y-%m-%d"),
+            key="arb_date",
         )
-        
-        st.plotly_chart(fig_efs, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 2: DubaiM1/M2
-    with col2:
-        st.markdown("**DUBAI M1/M2 SPREAD**")
-        fig_dubai_m1m2 = go.Figure()
-        
-        fig_dubai_m1m2.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['DubaiM1/M2'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Dubai M1/M2</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_dubai_m1m2.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_dubai_m1m2, use_container_width=True, config={'displayModeBar': False})
-    
-    # Row 2
-    col3, col4 = st.columns(2)
-    
-    # Chart 3: Dubai Physical Premium
-    with col3:
-        st.markdown("**DUBAI PHYSICAL PREMIUM**")
-        fig_premium = go.Figure()
-        
-        fig_premium.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Dubai Physical Premium'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Premium</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_premium.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_premium, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 4: Murban diff to Dubai swaps
-    with col4:
-        st.markdown("**MURBAN DIFF TO DUBAI SWAPS**")
-        fig_murban = go.Figure()
-        
-        fig_murban.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=df_filtered['Murban diff to Dubai swaps'],
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Murban Diff</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_murban.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_murban, use_container_width=True, config={'displayModeBar': False})
 
-# --- Tab 5: WAF (West Africa) ---
-if st.session_state.active_tab == "WAF":
-    st.subheader("WEST AFRICA OIL")
-    
-    # Row 1
-    col1, col2 = st.columns(2)
-    
-    # Chart 1: Bonny vs Dated Brent
-    with col1:
-        st.markdown("**BONNY LIGHT vs DATED BRENT**")
-        fig_bonny = go.Figure()
-        
-        # Calculate Bonny vs Dated Brent differential
-        bonny_diff = df_filtered['Bonny Light FOB'] - df_filtered['Dated Brent']
-        
-        fig_bonny.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=bonny_diff,
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Bonny Diff</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_bonny.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_bonny, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 2: Djeno vs Dated Brent
-    with col2:
-        st.markdown("**DJENGO vs DATED BRENT**")
-        fig_djeno = go.Figure()
-        
-        # Calculate Djeno vs Dated Brent differential
-        djeno_diff = df_filtered['Djeno FOB'] - df_filtered['Dated Brent']
-        
-        fig_djeno.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=djeno_diff,
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Djeno Diff</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_djeno.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=20, b=40)
-        )
-        
-        st.plotly_chart(fig_djeno, use_container_width=True, config={'displayModeBar': False})
-    
-    # Row 2
-    col3, col4 = st.columns(2)
-    
-    # Chart 3: Tanker dirty west Africa to China ($/bbl)
-    with col3:
-        st.markdown("**FREIGHT WAF-CHINA (VLCC)**")
-        fig_freight_china = go.Figure()
-        
-        # Convert from $/mt to $/bbl
-        freight_china_bbl = df_filtered['Tanker dirty west Africa to China 260kt $/mt '] / 7.45
-        
-        fig_freight_china.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=freight_china_bbl,
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Freight</b>: $%{y:.2f}/bbl<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_freight_china.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$", ticksuffix="/bbl"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_freight_china, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 4: Tanker dirty west Africa to UKCM ($/bbl)
-    with col4:
-        st.markdown("**FREIGHT WAF-UKC (SUEZ)**")
-        fig_freight_ukcm = go.Figure()
-        
-        # Convert from $/mt to $/bbl
-        freight_ukcm_bbl = df_filtered['Tanker dirty west Africa to UKCM 130kt $/mt '] / 7.45
-        
-        fig_freight_ukcm.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=freight_ukcm_bbl,
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Freight</b>: $%{y:.2f}/bbl<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_freight_ukcm.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$", ticksuffix="/bbl"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_freight_ukcm, use_container_width=True, config={'displayModeBar': False})
+    matrix = cube.on(as_of, view)
+    values = matrix.to_numpy()
+    zrange = None if view == "arb" else (float(np.nanmin(values)), float(np.nanmax(values)))
+    st.markdown("**ARB OPEN > 0: DESTINATION BENCHMARK ABOVE DELIVERED COST**" if view == "arb" else f"**{view.upper()}**")
+    payload = heatmap_json(matrix, (source.version, view, as_of), height=450, zrange=zrange)
+    show_chart(payload)
 
-# --- Tab 6: Refined Products ---
-if st.session_state.active_tab == "Refined Products":
-    st.subheader("REFINED PRODUCTS CRACKS")
-    
-    # Row 1
-    col1, col2 = st.columns(2)
-    
-    # Chart 1: Distillates Cracks
+    col1, col2 = st.columns([2, 1])
     with col1:
-        st.markdown("**DISTILLATES CRACKS**")
-        fig_distillates = go.Figure()
-        
-        # Calculate cracks
-        nwe_gasoil = df_filtered['Gasoil Ice NWE M1 $/bbl'] - df_filtered['Ice Brent M1']
-        sing_10ppm = df_filtered['Gasoil swap Singapore M1'] - df_filtered['Dubai M1']
-        ulsd = df_filtered['Diesel ULSD 62 fob USGC waterborne $/bbl'] - df_filtered['Nymex WTI futures M1']
-        
-        # NWE Gasoil
-        fig_distillates.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=nwe_gasoil,
-            mode='lines',
-            name='NWE Gasoil',
-            line=dict(color='#faa537', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>NWE Gasoil</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # Sing 10ppm
-        fig_distillates.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=sing_10ppm,
-            mode='lines',
-            name='Sing 10ppm',
-            line=dict(color='#00d9ff', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Sing 10ppm</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # ULSD
-        fig_distillates.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=ulsd,
-            mode='lines',
-            name='ULSD',
-            line=dict(color='#ff6b6b', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>USGC ULSD</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_distillates.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#faa537')
-            ),
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_distillates, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 2: Gasoline Cracks
+        col_g, col_r = st.columns(2)
+        with col_g:
+            arb_grade = st.selectbox("Grade", cube.grades, key="arb_grade")
+        with col_r:
+            carried = [r.label for r in cube.routes if arb_grade in r.grades]
+            arb_route = st.selectbox("Route", carried, key="arb_route")
+        history = cube.series(arb_grade, arb_route, view)
+        label = history.name
+        spec = area(label, view.title(), ticksuffix="/bbl", height=350)
+        payload = chart_json(spec, window(history.to_frame(label), st.session_state.timeframe), (source.version, view))
+        show_chart(payload)
     with col2:
-        st.markdown("**GASOLINE CRACKS**")
-        fig_gasoline = go.Figure()
-        
-        # Calculate cracks
-        nwe_gasoline = df_filtered['Gasoline Eurobob oxy NWE barge $/bbl'] - df_filtered['Ice Brent M1']
-        sing_92 = df_filtered['Gasoline 92r Singapore'] - df_filtered['Dubai M1']
-        usgc_gasoline = df_filtered['Gasoline 87 conv USGC waterborne $/bbl'] - df_filtered['Nymex WTI futures M1']
-        
-        # NWE Gasoline
-        fig_gasoline.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=nwe_gasoline,
-            mode='lines',
-            name='NWE Gasoline',
-            line=dict(color='#faa537', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>NWE Gasoline</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # Sing 92
-        fig_gasoline.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=sing_92,
-            mode='lines',
-            name='Sing 92',
-            line=dict(color='#00d9ff', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Sing 92</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # USGC Gasoline
-        fig_gasoline.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=usgc_gasoline,
-            mode='lines',
-            name='USGC Gasoline',
-            line=dict(color='#ff6b6b', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>USGC Gasoline</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_gasoline.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#faa537')
-            ),
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_gasoline, use_container_width=True, config={'displayModeBar': False})
-    
-    # Row 2
-    col3, col4 = st.columns(2)
-    
-    # Chart 3: Jet Cracks
-    with col3:
-        st.markdown("**JET FUEL CRACKS**")
-        fig_jet = go.Figure()
-        
-        # Calculate cracks
-        nwe_jet = df_filtered['Jet/kerosine NWE barge $/bbl'] - df_filtered['Ice Brent M1']
-        sing_jet = df_filtered['Jet/kerosine Singapore'] - df_filtered['Dubai M1']
-        usgc_jet = df_filtered['Jet fuel USGC waterborne fob $/bbl'] - df_filtered['Nymex WTI futures M1']
-        
-        # NWE Jet
-        fig_jet.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=nwe_jet,
-            mode='lines',
-            name='NWE Jet',
-            line=dict(color='#faa537', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>NWE Jet</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # Sing Jet
-        fig_jet.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=sing_jet,
-            mode='lines',
-            name='Sing Jet',
-            line=dict(color='#00d9ff', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>Sing Jet/Kero</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        # USGC Jet
-        fig_jet.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=usgc_jet,
-            mode='lines',
-            name='USGC Jet',
-            line=dict(color='#ff6b6b', width=2),
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>USGC Jet</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_jet.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#faa537')
-            ),
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
+        st.markdown("**WIDEST ARB PER GRADE (LATEST)**")
+        st.dataframe(
+            cube.best(),
+            use_container_width=True,
+            column_config={"arb": st.column_config.NumberColumn("Arb $/bbl", format="%.2f")},
         )
-        
-        st.plotly_chart(fig_jet, use_container_width=True, config={'displayModeBar': False})
-    
-    # Chart 4: Asia Fuel Oil Crack
-    with col4:
-        st.markdown("**ASIA FUEL OIL CRACK**")
-        fig_fueloil = go.Figure()
-        
-        # Calculate crack: (Fuel Oil $/mt / 6.35) - Dubai M1
-        asia_fo_crack = (df_filtered['Fuel Oil 3.5% Sing 380 $/mt'] / 6.35) - df_filtered['Dubai M1']
-        
-        fig_fueloil.add_trace(go.Scatter(
-            x=df_filtered.index,
-            y=asia_fo_crack,
-            mode='lines',
-            line=dict(color='#faa537', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(250, 165, 55, 0.2)',
-            hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                          '<b>HSFO Crack</b>: $%{y:.2f}<br>' +
-                          '<extra></extra>'
-        ))
-        
-        fig_fueloil.update_layout(
-            plot_bgcolor='#0a0a0a',
-            paper_bgcolor='#0a0a0a',
-            font=dict(family='Courier New, monospace', size=10, color='#faa537'),
-            xaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333'),
-            yaxis=dict(gridcolor='#1a1a1a', showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor='#333333', tickprefix="$"),
-            hovermode='x unified',
-            showlegend=False,
-            height=300,
-            margin=dict(l=50, r=20, t=40, b=40)
-        )
-        
-        st.plotly_chart(fig_fueloil, use_container_width=True, config={'displayModeBar': False})
 
-# --- Tab 7: Freight ---
-if st.session_state.active_tab == "Freight":
-    st.subheader("TANKER RATES")
-    
-    # Get freight columns (columns 55-79, which are indices 54-78)
-    all_columns = df.select_dtypes(include="number").columns.tolist()
+# --- Freight ---
+if page.name == "Freight":
+    st.subheader(page.title)
     
-    # Filter for freight columns based on column names containing "Tanker" or "Naphtha" or "TC14"
-    freight_columns = [col for col in all_columns if 'Tanker' in col or 'TCE' in col in col]
+    # Freight columns: names containing "Tanker" or "TCE"
+    routes = freight_columns(available_stocks)
     
     # Selectbox for freight route selection
-    selected_freight = st.selectbox("Select Freight Route", freight_columns, key="freight_selector")
-    
-    
-    fig_freight = go.Figure()
+    selected_freight = st.selectbox("Select Freight Route", routes, key="freight_selector")
     
-    fig_freight.add_trace(go.Scatter(
-        x=df_filtered.index,
-        y=df_filtered[selected_freight],
-        mode='lines',
-        name=selected_freight,
-        line=dict(color='#faa537', width=2),
-        fill='tozeroy',
-        fillcolor='rgba(250, 165, 55, 0.2)',
-        hovertemplate='<b>Date</b>: %{x|%Y-%m-%d}<br>' +
-                      '<b>Rate</b>: %{y:.2f}<br>' +
-                      '<extra></extra>'
-    ))
-    
-    fig_freight.update_layout(
-        plot_bgcolor='#0a0a0a',
-        paper_bgcolor='#0a0a0a',
-        font=dict(
-            family='Courier New, monospace',
-            size=12,
-            color='#faa537'
-        ),
-        xaxis=dict(
-            gridcolor='#1a1a1a',
-            showgrid=True,
-            zeroline=False,
-            showline=True,
-            linewidth=1,
-            linecolor='#333333',
-            mirror=True
-        ),
-        yaxis=dict(
-            gridcolor='#1a1a1a',
-            showgrid=True,
-            zeroline=False,
-            showline=True,
-            linewidth=1,
-            linecolor='#333333',
-            mirror=True
-        ),
-        hovermode='x unified',
-        showlegend=False,
-        height=600,
-        margin=dict(l=60, r=30, t=30, b=50)
-    )
-    
-    # Update axes for cleaner look
-    fig_freight.update_xaxes(
-        showspikes=True,
-        spikecolor='#faa537',
-        spikesnap='cursor',
-        spikemode='across',
-        spikethickness=1
-    )
-    
-    fig_freight.update_yaxes(
-        showspikes=True,
-        spikecolor='#faa537',
-        spikesnap='cursor',
-        spikemode='across',
-        spikethickness=1
-    )
-    
-    st.plotly_chart(fig_freight, use_container_width=True, config={'displayModeBar': False})
+    plot(area(selected_freight, "Rate", tickprefix="", height=600, large=True), chart_events((selected_freight,)))
     
     # Display statistics
     col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
     
-    latest_rate = df_filtered[selected_freight].iloc[0]
-    prev_rate = df_filtered[selected_freight].iloc[-1] if len(df_filtered) > 1 else latest_rate
-    rate_change = latest_rate - prev_rate
-    pct_change = (rate_change / prev_rate) * 100 if prev_rate != 0 else 0
+    m = window_metrics(read((selected_freight,)), selected_freight, source.version)
     
     with col_stat1:
-        st.metric("Current Rate", f"{latest_rate:.2f}", f"{rate_change:+.2f}")
+        st.metric("Current Rate", f"{m.latest:.2f}", f"{m.change:+.2f}")
     with col_stat2:
-        st.metric("% Change", f"{pct_change:+.2f}%")
+        st.metric("% Change", f"{m.pct_change:+.2f}%")
     with col_stat3:
-        st.metric("High", f"{df_filtered[selected_freight].max():.2f}")
+        st.metric("High", f"{m.high:.2f}")
     with col_stat4:
-        st.metric("Low", f"{df_filtered[selected_freight].min():.2f}")
+        st.metric("Low", f"{m.low:.2f}")
+
+# Time from script start to the end of the active tab (tab-switch latency)
+st.sidebar.metric("Tab render", f"{run.elapsed() * 1000:.0f} ms")
+finish_run(run)
+
+if st.session_state.get("show_profile"):
+    st.sidebar.dataframe(
+        breakdown(run),
+        hide_index=True,
+        column_config={
+            "ms": st.column_config.NumberColumn("This run (ms)", format="%.1f"),
+            "p50_ms": st.column_config.NumberColumn("p50", format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn("p95", format="%.1f"),
+        },
+    )
+    # Result caches shared by every session of this server process
+    st.sidebar.dataframe(
+        cache_stats(),
+        hide_index=True,
+        column_order=("name", "entries", "hits", "misses", "waits", "disk_hits"),
+    )
+
 # if st.session_state.active_tab == "OilGPT":
 #     run_oil_chatbot()
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""NextBarrel Terminal data layer.
+
+The names below are imported from their submodules on first access, so
+``import nextbarrel`` does not load pandas, NumPy or Plotly until a
+function that needs them is used.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "PriceStore": "nextbarrel.store",
+    "SchemaError": "nextbarrel.store",
+    "load_prices": "nextbarrel.store",
+    "with_derived": "nextbarrel.derived",
+    "window": "nextbarrel.windows",
+    "export_report": "nextbarrel.export",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
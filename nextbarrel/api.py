@@ -0,0 +1,283 @@
+"""Read-only HTTP/JSON API over the terminal's prices, derived series and metrics.
+
+    python -m nextbarrel.api --port 8502
+    uvicorn nextbarrel.api:app --workers 4
+
+``app`` is a plain ASGI application; running it needs an ASGI server such
+as ``uvicorn``. It serves the price source the terminal is configured with
+(``NEXTBARREL_PRICES``, ``NEXTBARREL_PRECISION``) through the same
+``read_columns`` and ``window_metrics`` the tabs use:
+
+``GET /v1/version``
+    Data version, backend and first/last date.
+``GET /v1/columns``
+    Raw and derived column names.
+``GET /v1/derived``
+    Definitions of the derived series (cracks, differentials, $/bbl).
+``GET /v1/series?column=...&column=...``, ``GET /v1/series/<column>``
+    Raw or derived columns over a window.
+``GET /v1/metrics?column=...``
+    Latest, change, % change, high and low per price or derived column over
+    a window, as on the Charts-News and Freight tabs.
+
+A window is ``timeframe`` (one of ``TIMEFRAMES``, default ``ALL``),
+optionally narrowed by ``start`` and ``end`` dates.
+
+Tables are JSON in pandas' ``split`` orientation, or Arrow IPC streams for
+``Accept: application/vnd.apache.arrow.stream`` or ``format=arrow``.
+Every response has an ETag derived from the data version and the request,
+so ``If-None-Match`` is answered with 304 before any data is read. Bodies
+of ``GZIP_MIN_BYTES`` or more are gzipped when the client accepts it.
+Encoded responses are memoised per data version (and shared between
+server processes with ``NEXTBARREL_SHARED_CACHE``, see
+``nextbarrel.memo``), so a repeated request costs a lookup.
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sys
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+from nextbarrel.derived import DERIVED_SERIES
+from nextbarrel.memo import LRUMemo, shared_disk
+from nextbarrel.metrics import window_metrics
+from nextbarrel.profiling import timed
+from nextbarrel.sources import derived_columns, price_source, read_columns
+from nextbarrel.store import DEFAULT_CSV, SchemaError
+from nextbarrel.windows import TIMEFRAMES, window_bounds, window_positions
+
+PRICES_ENV = "NEXTBARREL_PRICES"
+PRECISION_ENV = "NEXTBARREL_PRECISION"
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+DEFAULT_API_TIMEFRAME = "ALL"
+GZIP_MIN_BYTES = 1024
+# Encoded response bodies kept in memory
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_PORT = 8502
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_routes = {}
+
+
+def route(path):
+    def decorator(function):
+        _routes[path] = function
+        return function
+
+    return decorator
+
+
+def _source():
+    try:
+        return price_source(os.environ.get(PRICES_ENV, DEFAULT_CSV), os.environ.get(PRECISION_ENV, "float64"))
+    except (FileNotFoundError, SchemaError) as e:
+        raise HTTPError(503, str(e)) from None
+
+
+def _columns(source, query, numeric=False):
+    """Requested ``column=`` names; with ``numeric`` only price and derived columns are accepted."""
+    columns = tuple(dict.fromkeys(query.get("column", ())))
+    if not columns:
+        raise HTTPError(400, "at least one column= is required")
+    derived = set(derived_columns(source.numeric_columns))
+    unknown = [c for c in columns if c not in derived and c not in source.columns]
+    if unknown:
+        raise HTTPError(404, f"unknown columns {unknown}")
+    if numeric:
+        text = [c for c in columns if c not in derived and c not in source.numeric_columns]
+        if text:
+            raise HTTPError(400, f"columns {text} are not numeric")
+    return columns
+
+
+def _param(query, name, default=None):
+    return query[name][-1] if name in query else default
+
+
+def _window(source, query):
+    timeframe = _param(query, "timeframe", DEFAULT_API_TIMEFRAME)
+    try:
+        start, end = window_bounds(source.dates, timeframe, _param(query, "start"), _param(query, "end"))
+    except ValueError as e:
+        raise HTTPError(400, str(e)) from None
+    if start > end:
+        raise HTTPError(400, f"start {start:%Y-%m-%d} is after end {end:%Y-%m-%d}")
+    return start, end
+
+
+@route("/v1/version")
+def _version(source, query):
+    return {
+        "version": source.version,
+        "backend": source.backend,
+        "first": f"{source.dates[0]:%Y-%m-%d}",
+        "last": f"{source.dates[-1]:%Y-%m-%d}",
+        "rows": len(source.dates),
+        "timeframes": list(TIMEFRAMES),
+    }
+
+
+@route("/v1/columns")
+def _column_names(source, query):
+    return {"raw": list(source.columns), "derived": list(derived_columns(source.numeric_columns))}
+
+
+@route("/v1/derived")
+def _derived(source, query):
+    available = set(derived_columns(source.numeric_columns))
+    return pd.DataFrame(
+        [(d.name, d.source, d.benchmark, d.factor) for d in DERIVED_SERIES if d.name in available],
+        columns=["name", "source", "benchmark", "factor"],
+    ).set_index("name")
+
+
+@route("/v1/series")
+def _series(source, query):
+    start, end = _window(source, query)
+    return read_columns(source, _columns(source, query), start, end)
+
+
+@route("/v1/metrics")
+def _metrics(source, query):
+    start, end = _window(source, query)
+    columns = _columns(source, query, numeric=True)
+    positions = window_positions(source.dates, start, end)
+    if positions.start >= positions.stop:
+        raise HTTPError(404, f"no prices between {start:%Y-%m-%d} and {end:%Y-%m-%d}")
+    rows = {}
+    for column in columns:
+        m = window_metrics(read_columns(source, (column,), start, end), column, source.version)
+        rows[column] = {"latest": m.latest, "change": m.change, "pct_change": m.pct_change, "high": m.high, "low": m.low}
+    return pd.DataFrame.from_dict(rows, orient="index", dtype=float)
+
+
+def _resolve(path, query):
+    if path.startswith("/v1/series/") and len(path) > len("/v1/series/"):
+        return _routes["/v1/series"], dict(query, column=[path[len("/v1/series/"):]])
+    handler = _routes.get(path.rstrip("/") or path)
+    if handler is None:
+        raise HTTPError(404, f"no endpoint {path}")
+    return handler, query
+
+
+def _encode(result, fmt):
+    """``(body, content_type)`` for a DataFrame or a JSON document."""
+    if isinstance(result, pd.DataFrame):
+        if fmt == "arrow":
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(result, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue().to_pybytes(), ARROW
+        return result.to_json(orient="split", date_format="iso", date_unit="s").encode("utf-8"), JSON
+    if fmt == "arrow":
+        raise HTTPError(406, "this endpoint returns JSON only")
+    return json.dumps(result).encode("utf-8"), JSON
+
+
+_responses = LRUMemo(
+    maxsize=4096,
+    maxbytes=RESPONSE_CACHE_BYTES,
+    sizeof=lambda response: len(response[0]),
+    disk=shared_disk("api"),
+    name="api_responses",
+)
+
+
+def handle(method, path, query_string, headers):
+    """``(status, headers, body)`` for one request; ``headers`` maps lower-case names to values."""
+    if method not in ("GET", "HEAD"):
+        return _error(405, "read-only API: GET and HEAD only", [("allow", "GET, HEAD")])
+    try:
+        source = _source()
+        query = parse_qs(query_string, keep_blank_values=False)
+        handler, query = _resolve(path, query)
+        wants_arrow = ARROW in headers.get("accept", "") or _param(query, "format") == "arrow"
+        fmt = "arrow" if wants_arrow else "json"
+        compress = "gzip" in headers.get("accept-encoding", "")
+        canonical = tuple(sorted((k, tuple(v)) for k, v in query.items() if k != "format"))
+        key = (source.version, handler.__name__, canonical, fmt, compress)
+        etag = '"' + hashlib.sha1(repr(key).encode("utf-8"), usedforsecurity=False).hexdigest()[:20] + '"'
+        common = [("etag", etag), ("vary", "Accept, Accept-Encoding"), ("x-data-version", source.version)]
+        if etag in (t.strip() for t in headers.get("if-none-match", "").split(",")):
+            return 304, common, b""
+
+        def respond():
+            with timed("api"):
+                body, content_type = _encode(handler(source, query), fmt)
+            if compress and len(body) >= GZIP_MIN_BYTES:
+                return gzip.compress(body, 5, mtime=0), content_type, "gzip"
+            return body, content_type, None
+
+        body, content_type, encoding = _responses.get_or_compute(key, respond)
+    except HTTPError as e:
+        return _error(e.status, str(e))
+    headers_out = common + [("content-type", content_type), ("cache-control", "no-cache")]
+    if encoding:
+        headers_out.append(("content-encoding", encoding))
+    return 200, headers_out, body
+
+
+def _error(status, message, extra=()):
+    body = json.dumps({"error": message}).encode("utf-8")
+    return status, [("content-type", JSON), *extra], body
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+    # Reads and encoding are blocking pandas work; keep them off the event loop
+    status, headers_out, body = await asyncio.to_thread(
+        handle, scope["method"], scope["path"], scope["query_string"].decode("latin-1"), headers
+    )
+    headers_out = headers_out + [("content-length", str(len(body)))]
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers_out],
+    })
+    await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nextbarrel.api", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="server processes (default: %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        print("error: serving the API needs an ASGI server, e.g. pip install uvicorn", file=sys.stderr)
+        return 1
+    uvicorn.run("nextbarrel.api:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
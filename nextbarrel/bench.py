@@ -0,0 +1,224 @@
+"""Stage benchmarks on synthetic price histories.
+
+    python -m nextbarrel.bench --rows 1000 10000 100000 --out bench.json
+    python -m nextbarrel.bench --rows 1000 10000 --baseline bench.json
+
+Synthetic CSVs copy the schema of ``Historical_prices.csv``: the same
+columns in the same order, newest-first rows, the text column, and each
+column's share of missing values. Every numeric column is a random walk
+ending on its latest real value, with its real daily volatility. Each
+(rows, seed) file is generated once into ``CACHE_DIR/bench``. Histories
+longer than ``MAX_DAILY_ROWS`` use hourly dates so they stay inside the
+pandas timestamp range.
+
+Each stage is timed on its own with the functions the terminal uses:
+
+- ``parse``: ``store.read_csv``
+- ``normalize``: ``store.normalize_index`` (ascending, consolidated frame)
+- ``slice``: ``windows.window`` for every timeframe
+- ``derive``: ``derived.compute_derived`` for the Refined Products and WAF tabs
+- ``figure``: ``charts.build_figure`` for those tabs' panels over the whole history
+- ``serialize``: figure JSON as the charts send it (``charts.pack``)
+
+Each stage runs ``repeat`` times and reports its first (cold) run, minimum
+and median. Memoised results are cleared before every run, so each one
+redoes the work (downsampling included) instead of hitting a cache. With
+``--baseline``, stages slower than the baseline by more than ``--tolerance``
+are listed and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.charts import DOWNSAMPLE_THRESHOLD, build_figure, pack, resolution
+from nextbarrel.derived import DERIVED_SERIES, compute_derived
+from nextbarrel.memo import clear_caches
+from nextbarrel.pages import PAGES
+from nextbarrel.store import CACHE_DIR, DEFAULT_CSV, normalize_index, parse_csv, read_csv
+from nextbarrel.windows import TIMEFRAMES, window
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+STAGES = ("parse", "normalize", "slice", "derive", "figure", "serialize")
+BENCH_PAGES = ("Refined Products", "WAF")
+DEFAULT_REPEAT = 3
+DEFAULT_SEED = 0
+MAX_DAILY_ROWS = 100_000
+# A stage this much slower than the baseline is a regression ...
+DEFAULT_TOLERANCE = 0.25
+# ... unless it is within this many seconds of it (timer noise)
+NOISE_SECONDS = 0.002
+
+
+def synthetic_csv(rows, source=DEFAULT_CSV, seed=DEFAULT_SEED, cache_dir=CACHE_DIR):
+    """Path of a synthetic history of ``rows`` rows shaped like ``source``, generated once."""
+    path = os.path.join(cache_dir, "bench", f"prices-{rows}-{seed}.csv")
+    if os.path.exists(path):
+        return path
+    real = parse_csv(source)
+    rng = np.random.default_rng(seed)
+    hourly = rows > MAX_DAILY_ROWS
+    index = pd.date_range(end=real.index[-1], periods=rows, freq="h" if hourly else "D", name=real.index.name)
+
+    columns = {}
+    for name in real.columns:
+        column = real[name]
+        quoted = column.dropna()
+        if not pd.api.types.is_numeric_dtype(column):
+            pool = quoted.to_numpy() if len(quoted) else np.array([""])
+            columns[name] = rng.choice(pool, rows)
+            continue
+        last = float(quoted.iloc[-1]) if len(quoted) else 0.0
+        vol = float(quoted.diff().std()) if len(quoted) > 2 else 0.0
+        if not np.isfinite(vol) or vol <= 0:
+            vol = max(abs(last) * 0.01, 0.01)
+        walk = np.cumsum(rng.normal(0.0, vol, rows))
+        values = last + walk - walk[-1]
+        values[rng.random(rows) < column.isna().mean()] = np.nan
+        columns[name] = values
+
+    frame = pd.DataFrame(columns, index=index).iloc[::-1]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".partial"
+    frame.to_csv(partial, float_format="%.3f", date_format="%m/%d/%Y %H:%M" if hourly else "%m/%d/%Y")
+    os.replace(partial, path)
+    return path
+
+
+def _timed(function, repeat):
+    runs = []
+    for _ in range(repeat):
+        clear_caches()
+        started = time.perf_counter()
+        result = function()
+        runs.append(time.perf_counter() - started)
+    return result, runs
+
+
+def run_stages(path, repeat=DEFAULT_REPEAT):
+    """``{stage: [seconds per run]}`` for the history in ``path``."""
+    timings = {}
+    raw, timings["parse"] = _timed(lambda: read_csv(path), repeat)
+    frame, timings["normalize"] = _timed(lambda: normalize_index(raw), repeat)
+    _, timings["slice"] = _timed(lambda: [window(frame, tf) for tf in TIMEFRAMES], repeat)
+
+    specs = [panel.spec for name in BENCH_PAGES for panel in PAGES[name].panels]
+    wanted = {column for name in BENCH_PAGES for column in PAGES[name].columns}
+    registry = tuple(d for d in DERIVED_SERIES if d.name in wanted)
+    derived, timings["derive"] = _timed(lambda: compute_derived(frame, registry), repeat)
+
+    joined = pd.concat([frame, derived], axis=1)
+    downsample = len(joined) > DOWNSAMPLE_THRESHOLD
+    figures, timings["figure"] = _timed(
+        lambda: [build_figure(joined, spec, resolution(spec) if downsample else None) for spec in specs],
+        repeat,
+    )
+    _, timings["serialize"] = _timed(lambda: [pack(figure) for figure in figures], repeat)
+    return timings
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=SIZES, repeat=DEFAULT_REPEAT, seed=DEFAULT_SEED, source=DEFAULT_CSV, cache_dir=CACHE_DIR):
+    """Benchmark document: environment metadata plus one record per (rows, stage)."""
+    import plotly
+
+    results = []
+    for rows in sizes:
+        path = synthetic_csv(rows, source, seed, cache_dir)
+        for stage, runs in run_stages(path, repeat).items():
+            results.append({
+                "rows": rows,
+                "stage": stage,
+                "first": runs[0],
+                "min": min(runs),
+                "median": statistics.median(runs),
+                "runs": runs,
+            })
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plotly": plotly.__version__,
+            "repeat": repeat,
+            "seed": seed,
+            "hourly_above_rows": MAX_DAILY_ROWS,
+        },
+        "results": results,
+    }
+
+
+def regressions(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """``(rows, stage, baseline_min, current_min)`` for every stage slower than ``baseline``."""
+    before = {(r["rows"], r["stage"]): r["min"] for r in baseline["results"]}
+    slower = []
+    for r in current["results"]:
+        base = before.get((r["rows"], r["stage"]))
+        if base is not None and r["min"] > base * (1 + tolerance) and r["min"] - base > NOISE_SECONDS:
+            slower.append((r["rows"], r["stage"], base, r["min"]))
+    return slower
+
+
+def format_table(document, statistic="min"):
+    """Milliseconds per stage for ``statistic`` (``min``, ``median`` or ``first``), one line per history size."""
+    by_size = {}
+    for r in document["results"]:
+        by_size.setdefault(r["rows"], {})[r["stage"]] = r.get(statistic, float("nan"))
+    lines = [f"{'rows':>9}" + "".join(f"{stage:>11}" for stage in STAGES) + f"  ({statistic})"]
+    for rows, stages in by_size.items():
+        lines.append(f"{rows:>9,}" + "".join(f"{stages.get(s, float('nan')) * 1000:>9.1f}ms" for s in STAGES))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nextbarrel.bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", nargs="+", type=int, default=list(SIZES), help="history sizes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per stage (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="schema source (default: %(default)s)")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    document = run_benchmarks(args.rows, args.repeat, args.seed, args.csv)
+    print(format_table(document))
+    print(format_table(document, "first"))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        slower = regressions(document, baseline, args.tolerance)
+        for rows, stage, before, after in slower:
+            print(f"REGRESSION {stage} at {rows:,} rows: {before * 1000:.1f} ms -> {after * 1000:.1f} ms", file=sys.stderr)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,565 @@
+"""Chart factory for the terminal.
+
+The dark terminal look is registered once as the ``"nextbarrel"`` Plotly
+template, and every chart is described by a small frozen ``ChartSpec``.
+Built figures are memoised as JSON keyed by (spec, window, data version);
+a rerun that hits the memo rebuilds the figure from JSON with validation
+switched off instead of constructing and validating it trace by trace.
+With ``NEXTBARREL_SHARED_CACHE`` set, the memo also has a disk tier that
+all server processes read and fill (see ``nextbarrel.memo``).
+
+Payloads carry arrays as Plotly's base64 typed arrays, dates included:
+date axes get float64 epoch milliseconds instead of an ISO string per
+point (plotly.js typed arrays have no int64, and float64 is exact to the
+millisecond). ``pack`` also stores an x array shared by several traces
+once, under the payload's ``"xs"`` key, and ``unpack`` (or
+``figure_from_json``) puts it back on every trace. That sharing only
+saves memo memory and shared-cache space: the app unpacks each figure
+before ``st.plotly_chart``, so the browser still receives one x array per
+trace. Exported HTML (``nextbarrel.export``) is the one place the packed
+payload is sent as is, with ``UNPACK_JS`` expanding it in the page.
+
+Windows longer than ``DOWNSAMPLE_THRESHOLD`` points are downsampled (see
+``nextbarrel.downsample``) to ``POINTS_PER_PIXEL`` points per pixel of the
+chart's estimated width before they are sent to the browser.
+
+Line charts can overlay news events (see ``nextbarrel.events``) as markers
+on their first series, and single-series charts rolling mean and quantile
+bands from ``nextbarrel.rolling``. Term-structure charts (snapshots, animation, regime)
+are built from ``nextbarrel.curves.TermStructure`` arrays and memoised the
+same way by ``term_json``.
+Intraday tick charts (see ``nextbarrel.ticks``) are memoised
+per column and tick version by ``ticks_json``, so columns without new
+ticks are sent unchanged.
+
+Plotly is imported when the first figure is built, not with this module,
+so page registries and the data layers stay cheap to import.
+"""
+
+import json
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+
+from nextbarrel.curves import BACKWARDATION, CONTANGO
+from nextbarrel.downsample import downsample, downsampled
+from nextbarrel.events import event_markers
+from nextbarrel.memo import LRUMemo, shared_disk
+from nextbarrel.profiling import timed
+from nextbarrel.windows import window_key, window_positions
+
+TEMPLATE = "nextbarrel"
+ACCENT = "#faa537"
+EVENT_COLOR = "#00d9ff"
+BAND_COLOR = "#00d9ff"
+BAND_FILL = "rgba(0, 217, 255, 0.12)"
+PALETTE = ("#faa537", "#00d9ff", "#ff6b6b")
+# Snapshot lines beyond the palette fade from the accent colour
+SNAPSHOT_COLORS = PALETTE + ("#7ee787", "#d2a8ff", "#8b949e")
+REGIME_COLORS = {BACKWARDATION: "#7ee787", CONTANGO: "#ff6b6b"}
+CHART_CONFIG = {"displayModeBar": False}
+
+# Full-width chart width in pixels; grid charts are half of it
+CHART_WIDTH_PX = 1400
+POINTS_PER_PIXEL = 1.0
+DOWNSAMPLE_THRESHOLD = 2000
+DOWNSAMPLE_METHOD = "lttb"
+# Serialized figures kept in memory by each figure memo
+FIGURE_CACHE_BYTES = 128 * 1024 * 1024
+
+_AXIS = dict(gridcolor="#1a1a1a", showgrid=True, zeroline=False, showline=True, linewidth=1, linecolor="#333333")
+_SPIKES = dict(showspikes=True, spikecolor=ACCENT, spikesnap="cursor", spikemode="across", spikethickness=1)
+
+_TEMPLATE_LAYOUT = dict(
+    plot_bgcolor="#0a0a0a",
+    paper_bgcolor="#0a0a0a",
+    font=dict(family="Courier New, monospace", size=10, color=ACCENT),
+    colorway=PALETTE,
+    xaxis=_AXIS,
+    yaxis=_AXIS,
+    hovermode="x unified",
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="right",
+        x=1,
+        bgcolor="rgba(0,0,0,0)",
+        font=dict(color=ACCENT),
+    ),
+)
+_template_registered = False
+
+
+def _plotly():
+    """``plotly.graph_objects``, imported on first use with the ``"nextbarrel"`` template registered."""
+    global _template_registered
+    import plotly.graph_objects as go
+
+    if not _template_registered:
+        import plotly.io as pio
+
+        pio.templates[TEMPLATE] = go.layout.Template(layout=_TEMPLATE_LAYOUT)
+        _template_registered = True
+    return go
+
+
+@dataclass(frozen=True)
+class Series:
+    column: str
+    label: str
+    color: str = None
+    dash: str = None
+
+
+@dataclass(frozen=True)
+class ChartSpec:
+    """What to draw: one or more columns plus axis formatting.
+
+    ``area`` fills a single series to zero; ``large`` is the full-width
+    style with 12px font, mirrored axes and crosshair spikes.
+    """
+
+    series: tuple
+    area: bool = False
+    tickprefix: str = "$"
+    ticksuffix: str = ""
+    decimals: int = 2
+    height: int = 300
+    large: bool = False
+
+
+@dataclass(frozen=True)
+class CurveSpec:
+    """Snapshot of a tenor curve (e.g. CFD weeks) on the last date of a window."""
+
+    columns: tuple
+    labels: tuple
+    xaxis_title: str = ""
+    yaxis_title: str = ""
+    height: int = 300
+
+
+def area(column, label, **options):
+    """Single filled series."""
+    return ChartSpec((Series(column, label),), area=True, **options)
+
+
+def lines(*series, **options):
+    """One line per ``Series``, coloured from the palette unless set."""
+    return ChartSpec(tuple(series), **options)
+
+
+def curve_spec(curve, **options):
+    """Latest snapshot of a ``nextbarrel.curves.Curve``."""
+    return CurveSpec(curve.columns, curve.labels, **options)
+
+
+def epoch_ms(dates):
+    """``dates`` (a DatetimeIndex or datetime64 array) as float64 milliseconds since the epoch, UTC."""
+    values = np.asarray(getattr(dates, "values", dates))
+    return values.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+
+
+def _hovertemplate(label, spec):
+    value = f"{spec.tickprefix}%{{y:.{spec.decimals}f}}{spec.ticksuffix}"
+    return f"<b>Date</b>: %{{x|%Y-%m-%d}}<br><b>{label}</b>: {value}<br><extra></extra>"
+
+
+def resolution(spec, points_per_pixel=POINTS_PER_PIXEL):
+    """Number of points worth drawing for ``spec`` at its estimated width."""
+    width = CHART_WIDTH_PX if spec.large else CHART_WIDTH_PX // 2
+    return max(int(width * points_per_pixel), 3)
+
+
+def _band_traces(band, spec):
+    """Quantile band and rolling mean under a series; ``band`` has mean/low/high columns."""
+    go = _plotly()
+    value = f"{spec.tickprefix}%{{y:.{spec.decimals}f}}{spec.ticksuffix}"
+    common = dict(x=epoch_ms(band.index), mode="lines", showlegend=False)
+    return [
+        go.Scatter(y=band["low"], line=dict(width=0), hoverinfo="skip", **common),
+        go.Scatter(y=band["high"], line=dict(width=0), fill="tonexty", fillcolor=BAND_FILL, hoverinfo="skip", **common),
+        go.Scatter(
+            y=band["mean"],
+            name="Rolling mean",
+            line=dict(color=BAND_COLOR, width=1, dash="dot"),
+            hovertemplate=f"<b>Rolling mean</b>: {value}<extra></extra>",
+            **common,
+        ),
+    ]
+
+
+def build_figure(frame, spec, max_points=None, version=None, markers=None, band=None):
+    """Build a themed figure for ``spec`` over the rows of ``frame``.
+
+    With ``max_points`` each series longer than that is downsampled with
+    ``DOWNSAMPLE_METHOD``. ``markers`` (``nextbarrel.events.Markers``) are
+    drawn on top as news events; ``band`` (rolling statistics of the first
+    series, see ``RollingStats.column``) is drawn underneath.
+    """
+    go = _plotly()
+    fig = go.Figure()
+    for i, s in enumerate(spec.series):
+        values = frame[s.column]
+        if max_points and len(values) > max_points:
+            values = downsampled(frame, s.column, max_points, version, DOWNSAMPLE_METHOD)
+        if i == 0 and band is not None:
+            band = band.iloc[window_positions(band.index, values.index[0], values.index[-1])]
+            if len(band) != len(values):
+                band = band.reindex(values.index)
+            fig.add_traces(_band_traces(band, spec))
+        trace = dict(
+            x=epoch_ms(values.index),
+            y=values.to_numpy(),
+            mode="lines",
+            name=s.label,
+            line=dict(color=s.color or PALETTE[i % len(PALETTE)], width=2, dash=s.dash),
+            hovertemplate=_hovertemplate(s.label, spec),
+        )
+        if spec.area:
+            trace.update(fill="tozeroy", fillcolor="rgba(250, 165, 55, 0.2)")
+        fig.add_trace(go.Scatter(**trace))
+    if markers is not None and len(markers.x):
+        fig.add_trace(go.Scatter(
+            x=epoch_ms(markers.x),
+            y=markers.y,
+            mode="markers",
+            name="News",
+            text=markers.text,
+            marker=dict(symbol="diamond", size=9, color=EVENT_COLOR, line=dict(color="#0a0a0a", width=1)),
+            hovertemplate="%{text}<extra></extra>",
+            showlegend=False,
+        ))
+
+    legend = len(spec.series) > 1
+    fig.update_layout(
+        template=TEMPLATE,
+        showlegend=legend,
+        height=spec.height,
+        xaxis=dict(type="date"),
+        yaxis=dict(tickprefix=spec.tickprefix, ticksuffix=spec.ticksuffix),
+    )
+    if spec.large:
+        fig.update_layout(font=dict(size=12), margin=dict(l=60, r=30, t=30, b=50))
+        fig.update_xaxes(mirror=True, **_SPIKES)
+        fig.update_yaxes(mirror=True, **_SPIKES)
+    else:
+        fig.update_layout(margin=dict(l=50, r=20, t=40 if legend else 20, b=40))
+    return fig
+
+
+def spec_columns(spec):
+    """Columns a chart spec reads."""
+    if isinstance(spec, CurveSpec):
+        return spec.columns
+    return tuple(s.column for s in spec.series)
+
+
+def build_curve(labels, values, xaxis_title="", yaxis_title="", height=300):
+    """Line-and-marker chart over categorical tenors (e.g. CFD weeks)."""
+    go = _plotly()
+    fig = go.Figure(go.Scatter(
+        x=labels,
+        y=values,
+        mode="lines+markers",
+        line=dict(color=ACCENT, width=2),
+        marker=dict(size=8, color=ACCENT),
+        hovertemplate="<b>%{x}</b><br><b>Price</b>: $%{y:.2f}<br><extra></extra>",
+    ))
+    fig.update_layout(
+        template=TEMPLATE,
+        hovermode="closest",
+        showlegend=False,
+        height=height,
+        margin=dict(l=50, r=20, t=20, b=40),
+        xaxis=dict(title=xaxis_title),
+        yaxis=dict(title=yaxis_title, tickprefix="$"),
+    )
+    return fig
+
+
+_figures = LRUMemo(
+    maxsize=256, maxbytes=FIGURE_CACHE_BYTES, sizeof=len, disk=shared_disk("figures"), name="figures"
+)
+
+
+def _build(frame, spec, max_points, version, events, stats):
+    if isinstance(spec, CurveSpec):
+        latest = frame[list(spec.columns)].to_numpy(dtype=float)[-1]
+        quoted = ~np.isnan(latest)
+        return build_curve(
+            list(np.asarray(spec.labels)[quoted]),
+            latest[quoted],
+            spec.xaxis_title,
+            spec.yaxis_title,
+            spec.height,
+        )
+    markers = None
+    if events is not None:
+        markers = event_markers(frame, spec.series[0].column, events, version)
+    band = None
+    if stats is not None and len(spec.series) == 1 and spec.series[0].column in stats.columns:
+        band = stats.column(spec.series[0].column)
+    return build_figure(frame, spec, max_points, version, markers, band)
+
+
+def _x_key(x):
+    return (x["dtype"], x["bdata"]) if isinstance(x, dict) and "bdata" in x else None
+
+
+def pack(fig):
+    """Figure JSON for ``fig`` with each x array shared by several traces stored once."""
+    from plotly.io.json import to_json_plotly
+
+    figure = fig.to_plotly_json()
+    traces = figure.get("data", [])
+    counts = Counter(_x_key(trace.get("x")) for trace in traces)
+    shared = {}
+    for trace in traces:
+        key = _x_key(trace.get("x"))
+        if key is not None and counts[key] > 1:
+            trace["x"] = {"shared": shared.setdefault(key, len(shared))}
+    if shared:
+        figure["xs"] = [{"dtype": dtype, "bdata": bdata} for dtype, bdata in shared]
+    return to_json_plotly(figure)
+
+
+def unpack(figure):
+    """Plain figure dict from a ``pack`` payload dict, in place."""
+    xs = figure.pop("xs", None)
+    if xs:
+        for trace in figure.get("data", ()):
+            x = trace.get("x")
+            if isinstance(x, dict) and "shared" in x:
+                trace["x"] = xs[x["shared"]]
+    return figure
+
+
+# Expands a packed payload held in the JavaScript variable ``f`` (see ``nextbarrel.export``)
+UNPACK_JS = (
+    "if (f.xs) { f.data.forEach(function (t) { if (t.x && t.x.shared !== undefined) t.x = f.xs[t.x.shared]; }); }"
+)
+
+
+def _figure_json(build):
+    """``build()`` packed, timed as the ``figure`` stage."""
+    with timed("figure"):
+        return pack(build())
+
+
+def chart_json(spec, frame, version, points_per_pixel=POINTS_PER_PIXEL, events=None, stats=None):
+    """Serialized figure for ``spec`` over ``frame``, memoised per data version.
+
+    Windows longer than ``DOWNSAMPLE_THRESHOLD`` are drawn at
+    ``resolution(spec, points_per_pixel)`` points per series. ``events``
+    (a ``nextbarrel.events.EventSet``) adds news markers to line charts and
+    ``stats`` (``nextbarrel.rolling.RollingStats``) bands to single-series
+    charts.
+    """
+    max_points = None
+    if isinstance(spec, ChartSpec) and len(frame) > DOWNSAMPLE_THRESHOLD:
+        max_points = resolution(spec, points_per_pixel)
+    events_key = events.key if events is not None else None
+    stats_key = stats.key if stats is not None else None
+    key = (spec, window_key(frame), version, max_points, events_key, stats_key)
+    # News events are versioned per process, so figures with them stay out of the shared tier
+    return _figures.get_or_compute(
+        key,
+        lambda: _figure_json(lambda: _build(frame, spec, max_points, version, events, stats)),
+        shared=events is None,
+    )
+
+
+def figure_from_json(payload):
+    """Rehydrate a memoised figure without re-running Plotly validation."""
+    go = _plotly()
+    return go.Figure(unpack(json.loads(payload)), _validate=False)
+
+
+def _curve_layout(fig, height, yaxis_title="Price"):
+    fig.update_layout(
+        template=TEMPLATE,
+        hovermode="closest",
+        height=height,
+        margin=dict(l=50, r=20, t=40, b=40),
+        yaxis=dict(title=yaxis_title, tickprefix="$"),
+    )
+    return fig
+
+
+def build_snapshots(labels, dates, values, height=400):
+    """One curve per snapshot date, newest in the accent colour."""
+    go = _plotly()
+    fig = go.Figure()
+    for i, (when, row) in enumerate(sorted(zip(dates, values), key=lambda p: p[0], reverse=True)):
+        name = f"{when:%Y-%m-%d}"
+        fig.add_trace(go.Scatter(
+            x=list(labels),
+            y=row,
+            mode="lines+markers",
+            name=name,
+            line=dict(color=SNAPSHOT_COLORS[i % len(SNAPSHOT_COLORS)], width=2),
+            marker=dict(size=7),
+            hovertemplate=f"<b>{name}</b> %{{x}}: $%{{y:.2f}}<extra></extra>",
+        ))
+    return _curve_layout(fig, height)
+
+
+def build_curve_animation(labels, dates, values, height=400):
+    """The curve replayed over ``dates`` with a play button and date slider."""
+    go = _plotly()
+    labels = list(labels)
+    names = [f"{when:%Y-%m-%d}" for when in dates]
+    finite = values[np.isfinite(values)]
+    low, high = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+    pad = (high - low) * 0.1 or 1.0
+    trace = dict(x=labels, mode="lines+markers", line=dict(color=ACCENT, width=2), marker=dict(size=8, color=ACCENT))
+    fig = go.Figure(
+        data=[go.Scatter(y=values[-1], **trace)],
+        frames=[go.Frame(name=name, data=[go.Scatter(y=row, **trace)]) for name, row in zip(names, values)],
+    )
+    step = dict(mode="immediate", frame=dict(duration=150, redraw=False), transition=dict(duration=0))
+    fig.update_layout(
+        showlegend=False,
+        yaxis=dict(range=[low - pad, high + pad]),
+        updatemenus=[dict(
+            type="buttons",
+            showactive=False,
+            x=0,
+            y=1.15,
+            xanchor="left",
+            buttons=[dict(label="▶", method="animate", args=[None, dict(step, fromcurrent=True)])],
+            font=dict(color=ACCENT),
+            bgcolor="#1a1a1a",
+        )],
+        sliders=[dict(
+            active=len(names) - 1,
+            currentvalue=dict(prefix="", font=dict(color=ACCENT)),
+            pad=dict(t=30),
+            steps=[dict(label=name, method="animate", args=[[name], step]) for name in names],
+        )],
+    )
+    _curve_layout(fig, height)
+    fig.update_layout(margin=dict(l=50, r=20, t=50, b=20))
+    return fig
+
+
+def build_regime(dates, spread, flags, height=250):
+    """Front-back spread as bars coloured by contango/backwardation."""
+    go = _plotly()
+    colors = [REGIME_COLORS.get(int(f), "#555555") for f in flags]
+    fig = go.Figure(go.Bar(
+        x=epoch_ms(dates),
+        y=spread,
+        marker=dict(color=colors, line=dict(width=0)),
+        hovertemplate="<b>Date</b>: %{x|%Y-%m-%d}<br><b>Front - back</b>: $%{y:.2f}<extra></extra>",
+    ))
+    fig.update_layout(
+        template=TEMPLATE,
+        showlegend=False,
+        height=height,
+        bargap=0,
+        margin=dict(l=50, r=20, t=20, b=40),
+        xaxis=dict(type="date"),
+        yaxis=dict(tickprefix="$"),
+    )
+    return fig
+
+
+_analytics_figures = LRUMemo(maxsize=64, maxbytes=FIGURE_CACHE_BYTES, sizeof=len, name="analytics_figures")
+
+
+def term_json(kind, structure, snapshot_dates=()):
+    """Serialized ``"snapshots"``, ``"animation"`` or ``"regime"`` chart of a term structure."""
+
+    def build():
+        labels = structure.curve.labels
+        if kind == "snapshots":
+            dates, values = structure.snapshots(snapshot_dates)
+            return build_snapshots(labels, dates, values)
+        if kind == "animation":
+            frames = structure.frames()
+            return build_curve_animation(labels, structure.dates[frames], structure.values[frames])
+        if kind == "regime":
+            return build_regime(structure.dates, structure.spread(), structure.regimes())
+        raise ValueError(f"unknown term-structure chart {kind!r}")
+
+    key = (kind, structure.key, tuple(snapshot_dates))
+    return _analytics_figures.get_or_compute(key, lambda: _figure_json(build))
+
+
+def build_heatmap(matrix, height=600, zrange=(-1, 1), value_format=".2f"):
+    """Heatmap of a DataFrame, red below and amber above the middle of ``zrange``.
+
+    ``zrange=None`` centres the scale on zero at the largest absolute value.
+    """
+    go = _plotly()
+    values = matrix.to_numpy(dtype=float)
+    if zrange is None:
+        finite = np.abs(values[np.isfinite(values)])
+        bound = finite.max() if len(finite) else 1.0
+        zrange = (-bound, bound)
+    fig = go.Figure(go.Heatmap(
+        z=values,
+        x=[str(c).strip() for c in matrix.columns],
+        y=[str(i).strip() for i in matrix.index],
+        zmin=zrange[0],
+        zmax=zrange[1],
+        colorscale=[[0, "#ff6b6b"], [0.5, "#0a0a0a"], [1, ACCENT]],
+        hovertemplate=f"<b>%{{y}}</b> / <b>%{{x}}</b><br>%{{z:{value_format}}}<extra></extra>",
+        colorbar=dict(thickness=10, tickfont=dict(color=ACCENT)),
+    ))
+    fig.update_layout(
+        template=TEMPLATE,
+        hovermode="closest",
+        height=height,
+        margin=dict(l=160, r=20, t=20, b=160),
+        xaxis=dict(showgrid=False, tickangle=-45),
+        yaxis=dict(showgrid=False, autorange="reversed"),
+    )
+    return fig
+
+
+def heatmap_json(matrix, key, height=600, zrange=(-1, 1), value_format=".2f"):
+    """Serialized ``build_heatmap`` memoised under ``key`` (e.g. version, universe, window)."""
+    return _analytics_figures.get_or_compute(
+        ("heatmap", key, height, zrange, value_format),
+        lambda: _figure_json(lambda: build_heatmap(matrix, height, zrange, value_format)),
+    )
+
+
+def build_ticks(series, label, height=220):
+    """Intraday line of one column's ticks, times in UTC."""
+    go = _plotly()
+    fig = go.Figure(go.Scatter(
+        x=epoch_ms(series.index),
+        y=series.to_numpy(),
+        mode="lines",
+        line=dict(color=ACCENT, width=1.5),
+        hovertemplate=f"<b>Time</b>: %{{x|%H:%M:%S}}<br><b>{label}</b>: $%{{y:.3f}}<br><extra></extra>",
+    ))
+    fig.update_layout(
+        template=TEMPLATE,
+        showlegend=False,
+        height=height,
+        margin=dict(l=50, r=20, t=20, b=40),
+        yaxis=dict(tickprefix="$"),
+        xaxis=dict(type="date", tickformat="%H:%M:%S"),
+    )
+    return fig
+
+
+def ticks_json(column, label, book, height=220):
+    """Serialized ``build_ticks`` for ``column`` in a ``TickBook``, memoised per tick version."""
+
+    def build():
+        series = book.series(column)
+        max_points = CHART_WIDTH_PX // 3
+        if len(series) > max_points:
+            series = downsample(series, max_points, DOWNSAMPLE_METHOD)
+        return build_ticks(series, label, height)
+
+    key = ("ticks", id(book), column, book.version(column), label, height)
+    return _analytics_figures.get_or_compute(key, lambda: _figure_json(build))
@@ -0,0 +1,139 @@
+"""Compact, read-only and cross-process representations of price frames.
+
+``compact`` stores price columns as float32 where that is accurate enough.
+A column is downcast only if every value survives the round trip within
+``FLOAT32_TOLERANCE``, below the 3-decimal quoting of the CSV. Other
+columns stay float64 and are listed in the returned ``Precision``. Text
+columns with few distinct values become categoricals.
+
+``freeze`` rebuilds a frame on read-only arrays, one block per dtype. The
+one copy a process holds (see ``nextbarrel.sources``) is handed to every
+session as views; in-place writes fail or, under copy-on-write, go to a
+private copy, never to the shared arrays.
+
+``share`` places the numeric columns in one ``multiprocessing`` shared
+memory block and ``attach`` maps it in another process, so worker
+processes (see ``nextbarrel.export``) read the parent's frame instead of
+loading their own.
+"""
+
+import threading
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+PRECISIONS = ("float64", "float32")
+# Largest absolute error accepted when a column is stored as float32
+FLOAT32_TOLERANCE = 5e-4
+
+_attached = {}
+_attached_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Precision:
+    """Which columns ``compact`` stored as float32 and the largest error it introduced."""
+
+    float32: tuple = ()
+    float64: tuple = ()
+    max_error: float = 0.0
+
+
+def _numeric_blocks(frame):
+    """``{dtype: [columns]}`` for the numeric columns of ``frame``, in column order."""
+    blocks = {}
+    for column, dtype in frame.dtypes.items():
+        if pd.api.types.is_numeric_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+            blocks.setdefault(np.dtype(dtype), []).append(column)
+    return blocks
+
+
+def freeze(frame):
+    """``frame`` rebuilt with every numeric dtype in one read-only 2-D array."""
+    parts = []
+    for dtype, columns in _numeric_blocks(frame).items():
+        values = np.ascontiguousarray(frame[columns].to_numpy(dtype=dtype))
+        values.flags.writeable = False
+        parts.append(pd.DataFrame(values, index=frame.index, columns=columns, copy=False))
+    numeric = {c for part in parts for c in part.columns}
+    others = [c for c in frame.columns if c not in numeric]
+    if others:
+        parts.append(frame[others])
+    if not parts:
+        return frame
+    return pd.concat(parts, axis=1)[list(frame.columns)]
+
+
+def compact(frame, precision="float32", tolerance=FLOAT32_TOLERANCE):
+    """``(frozen frame, Precision)`` with price columns in ``precision`` where accurate enough."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision {precision!r}, expected one of {PRECISIONS}")
+    parts, narrow, wide, worst = {}, [], [], 0.0
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_float_dtype(values.dtype) and precision == "float32":
+            exact = values.to_numpy(dtype=np.float64)
+            small = exact.astype(np.float32)
+            quoted = ~np.isnan(exact)
+            error = float(np.abs(small[quoted] - exact[quoted]).max()) if quoted.any() else 0.0
+            if error <= tolerance:
+                parts[column] = small
+                narrow.append(column)
+                worst = max(worst, error)
+                continue
+            wide.append(column)
+        elif not pd.api.types.is_numeric_dtype(values.dtype) and values.nunique() <= len(values) // 2:
+            parts[column] = values.astype("category")
+            continue
+        elif pd.api.types.is_float_dtype(values.dtype):
+            wide.append(column)
+        parts[column] = values
+    compacted = pd.DataFrame(parts, index=frame.index)
+    return freeze(compacted), Precision(tuple(narrow), tuple(wide), worst)
+
+
+@dataclass(frozen=True)
+class SharedFrame:
+    """Picklable handle to a frame whose numeric columns live in shared memory.
+
+    ``blocks`` holds ``(dtype, columns, offset)`` for each numeric dtype,
+    stored one after another in the block ``name``.
+    """
+
+    name: str
+    blocks: tuple
+    index: pd.Index
+    others: pd.DataFrame
+    columns: tuple
+
+
+def share(frame):
+    """``(SharedMemory, SharedFrame)`` for ``frame``; close and unlink the block when done."""
+    layout, offset = [], 0
+    for dtype, columns in _numeric_blocks(frame).items():
+        layout.append((dtype.str, tuple(columns), offset))
+        offset += len(frame) * len(columns) * dtype.itemsize
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    numeric = set()
+    for dtype, columns, start in layout:
+        values = np.ndarray((len(frame), len(columns)), dtype=np.dtype(dtype), buffer=block.buf, offset=start)
+        values[:] = frame[list(columns)].to_numpy(dtype=np.dtype(dtype))
+        numeric.update(columns)
+    others = frame[[c for c in frame.columns if c not in numeric]]
+    return block, SharedFrame(block.name, tuple(layout), frame.index, others, tuple(frame.columns))
+
+
+def attach(handle):
+    """The frame behind ``handle`` on read-only views of the shared block, kept mapped per process."""
+    with _attached_lock:
+        block = _attached.get(handle.name)
+        if block is None:
+            block = _attached[handle.name] = shared_memory.SharedMemory(name=handle.name)
+    parts = []
+    for dtype, columns, start in handle.blocks:
+        values = np.ndarray((len(handle.index), len(columns)), dtype=np.dtype(dtype), buffer=block.buf, offset=start)
+        values.flags.writeable = False
+        parts.append(pd.DataFrame(values, index=handle.index, columns=list(columns), copy=False))
+    return pd.concat(parts + [handle.others], axis=1)[list(handle.columns)]
@@ -0,0 +1,148 @@
+"""Forward curves as dense date × tenor arrays.
+
+A ``Curve`` names the columns of one term structure, front tenor first:
+the weekly North Sea CFDs and the M1/M2 pairs of the futures benchmarks.
+``term_structure`` stacks those columns into one float array per data
+version; snapshots on any date, curve-shape history and the
+contango/backwardation regime are then slices and array operations on it
+instead of per-row Python lists.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.profiling import timed
+from nextbarrel.windows import window_positions
+
+BACKWARDATION = 1
+FLAT = 0
+CONTANGO = -1
+REGIME_NAMES = {BACKWARDATION: "Backwardation", FLAT: "Flat", CONTANGO: "Contango"}
+
+# Frames drawn by a curve animation; longer windows are sampled evenly
+MAX_FRAMES = 60
+# Default curve snapshots: the last date, a week and a month before it
+SNAPSHOT_OFFSETS = (pd.Timedelta(0), pd.Timedelta(weeks=1), pd.Timedelta(days=30))
+
+
+@dataclass(frozen=True)
+class Curve:
+    name: str
+    columns: tuple
+    labels: tuple
+
+
+CURVES = {}
+
+
+def register(curve):
+    CURVES[curve.name] = curve
+    return curve
+
+
+def _months(name, front, back):
+    return register(Curve(name, (front, back), ("M1", "M2")))
+
+
+register(Curve(
+    "North Sea CFDs",
+    tuple(f"North Sea Dated CFD week {i}" for i in range(1, 6)),
+    tuple(f"W{i}" for i in range(1, 6)),
+))
+_months("Brent", "Ice Brent M1", "Ice Brent M2")
+_months("WTI", "Nymex WTI futures M1", "Nymex WTI futures M2")
+_months("Dubai", "Dubai M1", "Dubai M2")
+_months("RBOB", "Gasoline RBOB Nymex M1 $/bbl", "Gasoline RBOB Nymex M2 $/bbl")
+_months("Heating Oil", "Heating Oil Nymex M1 $/bbl", "Heating Oil Nymex M2 $/bbl")
+_months("ICE Gasoil", "Gasoil Ice NWE M1 $/bbl", "Gasoil Ice NWE M2 $/bbl")
+_months("Sing Gasoil", "Gasoil swap Singapore M1", "Gasoil swap Singapore M2")
+
+
+@dataclass(frozen=True, eq=False)
+class TermStructure:
+    """``values[i, j]`` is tenor ``j`` of ``curve`` on ``dates[i]``."""
+
+    curve: Curve
+    dates: pd.DatetimeIndex
+    values: np.ndarray
+    key: tuple
+
+    def __len__(self):
+        return len(self.dates)
+
+    def between(self, start, end):
+        """The rows dated ``start`` to ``end`` inclusive (views, not copies)."""
+        rows = window_positions(self.dates, start, end)
+        dates = self.dates[rows]
+        key = self.key + ((dates[0], dates[-1], len(dates)) if len(dates) else ())
+        return TermStructure(self.curve, dates, self.values[rows], key)
+
+    def snapshots(self, when):
+        """``(dates, values)`` of the last rows on or before each of ``when``.
+
+        Dates before the first row are dropped.
+        """
+        targets = pd.DatetimeIndex(when)
+        pos = self.dates.searchsorted(targets, side="right") - 1
+        pos = pos[pos >= 0]
+        return self.dates[pos], self.values[pos]
+
+    def recent_dates(self, offsets=SNAPSHOT_OFFSETS):
+        """Distinct snapshot dates ``offsets`` before the last row, latest first."""
+        last = self.dates[-1]
+        return self.snapshots([last - offset for offset in offsets])[0].unique()
+
+    def spread(self):
+        """Front minus back tenor for every date."""
+        return self.values[:, 0] - self.values[:, -1]
+
+    def shape(self):
+        """Each tenor's discount to the front, per date (0 for the front itself)."""
+        return self.values[:, :1] - self.values
+
+    def regimes(self, tolerance=0.0):
+        """``BACKWARDATION``, ``CONTANGO`` or ``FLAT`` per date from the front-back spread.
+
+        Dates with a missing tenor count as ``FLAT``.
+        """
+        spread = self.spread()
+        flags = np.where(spread > tolerance, BACKWARDATION, np.where(spread < -tolerance, CONTANGO, FLAT))
+        return flags.astype(np.int8)
+
+    def frames(self, max_frames=MAX_FRAMES):
+        """Evenly spaced row positions for animating the curve, always ending on the last row."""
+        n = len(self.dates)
+        if n <= max_frames:
+            return np.arange(n)
+        return np.unique(np.linspace(0, n - 1, max_frames).round().astype(int))
+
+
+def regime_run(flags):
+    """``(regime, days)``: the latest regime and how many rows it has lasted."""
+    if not len(flags):
+        return FLAT, 0
+    changes = np.flatnonzero(flags[1:] != flags[:-1])
+    start = changes[-1] + 1 if len(changes) else 0
+    return int(flags[-1]), len(flags) - start
+
+
+def available_curves(columns):
+    """Registered curves whose columns are all in ``columns``."""
+    columns = set(columns)
+    return {name: c for name, c in CURVES.items() if all(col in columns for col in c.columns)}
+
+
+_structures = LRUMemo(maxsize=32, name="term_structures")
+
+
+def term_structure(frame, curve, version):
+    """``TermStructure`` of ``curve`` over the whole of ``frame``, built once per data version."""
+    key = (curve, version)
+    def compute():
+        with timed("term_structure"):
+            return TermStructure(curve, frame.index, frame[list(curve.columns)].to_numpy(dtype=float), key)
+
+    return _structures.get_or_compute(key, compute)
@@ -0,0 +1,120 @@
+"""Derived series: cracks, differentials and unit conversions.
+
+Every derived column is one entry in ``DERIVED_SERIES`` of the form
+
+    value = source / BBL_PER_MT[factor] - benchmark
+
+where ``factor`` and ``benchmark`` are optional. The whole registry is
+evaluated in a single vectorised pass over the full history and cached per
+data version, so tabs only slice precomputed columns. Adding a crack is one
+``crack(...)`` line below.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.netback import GRADE_BBL_PER_MT
+from nextbarrel.profiling import count, timed
+
+# Barrels per metric tonne used to turn $/mt quotes into $/bbl: generic
+# crude and fuel oil, plus one entry per crude grade from its API gravity
+BBL_PER_MT = {
+    "crude": 7.45,
+    "fuel_oil": 6.35,
+    **GRADE_BBL_PER_MT,
+}
+
+
+@dataclass(frozen=True)
+class DerivedSeries:
+    name: str
+    source: str
+    benchmark: str = None
+    factor: str = None
+
+
+def crack(name, product, benchmark, factor=None):
+    """``product`` (converted to $/bbl with ``factor`` if given) minus ``benchmark``."""
+    return DerivedSeries(name, product, benchmark, factor)
+
+
+def to_bbl(name, column, factor):
+    """``column`` converted from $/mt to $/bbl."""
+    return DerivedSeries(name, column, None, factor)
+
+
+DERIVED_SERIES = (
+    # Distillates
+    crack("NWE Gasoil crack", "Gasoil Ice NWE M1 $/bbl", "Ice Brent M1"),
+    crack("Sing 10ppm crack", "Gasoil swap Singapore M1", "Dubai M1"),
+    crack("USGC ULSD crack", "Diesel ULSD 62 fob USGC waterborne $/bbl", "Nymex WTI futures M1"),
+    # Gasoline
+    crack("NWE Gasoline crack", "Gasoline Eurobob oxy NWE barge $/bbl", "Ice Brent M1"),
+    crack("Sing 92 crack", "Gasoline 92r Singapore", "Dubai M1"),
+    crack("USGC Gasoline crack", "Gasoline 87 conv USGC waterborne $/bbl", "Nymex WTI futures M1"),
+    # Jet
+    crack("NWE Jet crack", "Jet/kerosine NWE barge $/bbl", "Ice Brent M1"),
+    crack("Sing Jet crack", "Jet/kerosine Singapore", "Dubai M1"),
+    crack("USGC Jet crack", "Jet fuel USGC waterborne fob $/bbl", "Nymex WTI futures M1"),
+    # Fuel oil
+    crack("Asia HSFO crack", "Fuel Oil 3.5% Sing 380 $/mt", "Dubai M1", factor="fuel_oil"),
+    # WAF differentials
+    crack("Bonny Light vs Dated Brent", "Bonny Light FOB", "Dated Brent"),
+    crack("Djeno vs Dated Brent", "Djeno FOB", "Dated Brent"),
+    # Freight, per barrel of Bonny Light
+    to_bbl("Freight WAF-China $/bbl", "Tanker dirty west Africa to China 260kt $/mt ", "Bonny Light FOB"),
+    to_bbl("Freight WAF-UKCM $/bbl", "Tanker dirty west Africa to UKCM 130kt $/mt ", "Bonny Light FOB"),
+)
+
+_memo = LRUMemo(maxsize=4, name="derived")
+
+
+def compute_derived(frame, registry=DERIVED_SERIES):
+    """Evaluate ``registry`` over ``frame`` in one pass.
+
+    Entries whose input columns are missing from ``frame`` are skipped.
+    """
+    with timed("derive"):
+        entries = [
+            d for d in registry
+            if d.source in frame.columns and (d.benchmark is None or d.benchmark in frame.columns)
+        ]
+        count("derived_series", len(entries))
+        if not entries:
+            return pd.DataFrame(index=frame.index)
+
+        source = frame[[d.source for d in entries]].to_numpy(dtype=float)
+        divisor = np.array([BBL_PER_MT[d.factor] if d.factor else 1.0 for d in entries])
+        has_benchmark = np.array([d.benchmark is not None for d in entries])
+        benchmark = frame[[d.benchmark or d.source for d in entries]].to_numpy(dtype=float)
+
+        values = source / divisor - np.where(has_benchmark, benchmark, 0.0)
+        return pd.DataFrame(values, index=frame.index, columns=[d.name for d in entries])
+
+
+def derived_frame(store, registry=DERIVED_SERIES):
+    """Derived columns for a ``PriceStore``, computed once per data version."""
+    return _memo.get_or_compute((store.version, registry), lambda: compute_derived(store.frame, registry))
+
+
+def _joined(store, registry):
+    derived = derived_frame(store, registry)
+    with timed("join"):
+        return pd.concat([store.frame, derived], axis=1)
+
+
+def with_derived(store, registry=DERIVED_SERIES):
+    """The store's frame with the derived columns appended, cached per version."""
+    return _memo.get_or_compute(
+        (store.version, registry, "joined"),
+        lambda: _joined(store, registry),
+    )
+
+
+def source_columns(columns, registry=DERIVED_SERIES):
+    """``columns`` with each derived name replaced by the raw column it is built from."""
+    sources = {d.name: d.source for d in registry}
+    return tuple(dict.fromkeys(sources.get(c, c) for c in columns))
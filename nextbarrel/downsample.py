@@ -0,0 +1,79 @@
+"""Server-side downsampling for long chart windows.
+
+``lttb`` (Largest-Triangle-Three-Buckets) keeps the visual shape of a line,
+``minmax`` keeps the extreme of every bucket so no peak is lost. Both keep
+the first and last point and return positions into the input, so the
+caller can take matching x/y values from the original arrays.
+"""
+
+import numpy as np
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.windows import window_key
+
+METHODS = ("lttb", "minmax")
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb(x, y, n_out):
+    """Positions of the ``n_out`` points LTTB keeps from ``(x, y)``."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_float(x), np.asarray(y, dtype=float)
+
+    # n - 2 inner points split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(x, y, n_out):
+    """Positions of the minimum and maximum of ``n_out // 2`` equal buckets."""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out // 2).astype(int)
+    keep = [0]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        bucket = y[lo:hi]
+        keep.extend(sorted((lo + int(np.argmin(bucket)), lo + int(np.argmax(bucket)))))
+    keep.append(n - 1)
+    return np.unique(keep)
+
+
+def downsample(series, n_out, method="lttb"):
+    """``series`` reduced to about ``n_out`` points; NaNs are dropped first."""
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}, expected one of {METHODS}")
+    series = series.dropna()
+    if len(series) <= n_out:
+        return series
+    pick = lttb if method == "lttb" else minmax
+    return series.iloc[pick(series.index.values, series.to_numpy(), n_out)]
+
+
+_downsampled = LRUMemo(maxsize=512, name="downsampled")
+
+
+def downsampled(frame, column, n_out, version, method="lttb"):
+    """``downsample`` of ``frame[column]``, memoised per (series, window, resolution)."""
+    key = (column, window_key(frame), version, n_out, method)
+    return _downsampled.get_or_compute(key, lambda: downsample(frame[column], n_out, method))
@@ -0,0 +1,171 @@
+"""News events as dated markers on price charts.
+
+Day headings in the feed carry no year (``Saturday,15-11``); the year used
+is the one near the last price date on which that day falls on that
+weekday. Events are matched to trading dates in one vectorised
+``searchsorted`` (an as-of join) and grouped into one marker per trading
+date. Event sets are memoised per feed version and tag filter, markers per
+(series, window, data version, event set), so drawing hundreds of events
+costs one lookup after the first render.
+"""
+
+import html
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.derived import source_columns
+from nextbarrel.memo import LRUMemo
+from nextbarrel.news import DEFAULT_FEED, news_feed
+from nextbarrel.newsindex import news_index
+from nextbarrel.windows import window_key
+
+# Events further than this from the matched trading date are not drawn
+EVENT_TOLERANCE = pd.Timedelta(days=4)
+# Headlines listed in one marker's hover text
+MAX_LABELS = 5
+
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+@dataclass(frozen=True, eq=False)
+class EventSet:
+    """Dated headlines in ascending date order; ``key`` identifies the set in caches."""
+
+    key: tuple
+    dates: np.ndarray
+    labels: tuple
+
+
+@dataclass(frozen=True, eq=False)
+class Markers:
+    """One marker per trading date: position on the series plus hover text."""
+
+    x: np.ndarray
+    y: np.ndarray
+    text: tuple
+
+
+def day_date(label, reference):
+    """Date of a feed day heading such as ``"Saturday,15-11"``, or ``None``.
+
+    The year is chosen around ``reference`` so that the weekday matches,
+    falling back to the closest candidate when none does.
+    """
+    name, _, day_month = (label or "").partition(",")
+    try:
+        day, month = (int(part) for part in day_month.strip().split("-"))
+    except ValueError:
+        return None
+    weekday = _WEEKDAYS.index(name.strip().lower()) if name.strip().lower() in _WEEKDAYS else None
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(date(year, month, day))
+        except ValueError:
+            continue
+    if not candidates:
+        return None
+    target = reference.date()
+    matching = [d for d in candidates if d.weekday() == weekday] or candidates
+    return pd.Timestamp(min(matching, key=lambda d: abs((d - target).days)))
+
+
+_event_sets = LRUMemo(maxsize=64, name="event_sets")
+
+
+def news_events(feed, index, reference, tags=None):
+    """``EventSet`` of the buffered headlines, limited to those tagged with any of ``tags``.
+
+    ``reference`` is the last price date and fixes the year of each day heading.
+    """
+    reference = pd.Timestamp(reference)
+    tags = tuple(tags) if tags is not None else None
+    key = (feed.path, feed.generation, feed.version, tags, reference)
+
+    def compute():
+        if tags is None:
+            seqs = index.matches()
+        else:
+            seqs = sorted(set().union(*(index.matches(tag=tag) for tag in tags)))
+        days, labels = {}, []
+        dates = []
+        for item in feed.records(seqs):
+            if item.day not in days:
+                days[item.day] = day_date(item.day, reference)
+            if days[item.day] is not None:
+                dates.append(days[item.day])
+                labels.append(item.headline)
+        dates = np.array(dates, dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        return EventSet(key, dates[order], tuple(labels[i] for i in order))
+
+    return _event_sets.get_or_compute(key, compute)
+
+
+def column_events(columns, universe, reference, path=DEFAULT_FEED):
+    """``news_events`` tagged with any of ``columns``, or ``None`` without a feed file.
+
+    Derived columns match the headlines of their source columns;
+    ``universe`` is the column list the headlines are tagged against.
+    """
+    try:
+        feed = news_feed(path)
+    except FileNotFoundError:
+        return None
+    return news_events(feed, news_index(feed, universe), reference, source_columns(columns))
+
+
+def align(index, dates, direction="backward"):
+    """Positions in the ascending ``index`` matched to each of ``dates``; -1 where none.
+
+    ``backward`` takes the last index date on or before each event,
+    ``forward`` the first on or after it; matches further than
+    ``EVENT_TOLERANCE`` away are dropped.
+    """
+    values = np.asarray(index.values, dtype="datetime64[ns]")
+    if direction == "backward":
+        pos = np.searchsorted(values, dates, side="right") - 1
+    elif direction == "forward":
+        pos = np.searchsorted(values, dates, side="left")
+    else:
+        raise ValueError(f"unknown direction {direction!r}, expected 'backward' or 'forward'")
+    found = (pos >= 0) & (pos < len(values))
+    safe = np.clip(pos, 0, max(len(values) - 1, 0))
+    if len(values):
+        found &= np.abs(values[safe] - dates) <= EVENT_TOLERANCE.to_timedelta64()
+    return np.where(found, pos, -1)
+
+
+def _label(headlines):
+    shown = "<br>".join(f"▸ {html.escape(h, quote=False)}" for h in headlines[:MAX_LABELS])
+    more = len(headlines) - MAX_LABELS
+    return shown + (f"<br>… {more} more" if more > 0 else "")
+
+
+def build_markers(series, events, direction="backward"):
+    """``Markers`` for ``events`` on ``series``, grouped per matched date."""
+    pos = align(series.index, events.dates, direction)
+    keep = pos >= 0
+    positions, groups = np.unique(pos[keep], return_inverse=True)
+    labels = [[] for _ in positions]
+    for group, label in zip(groups, np.asarray(events.labels, dtype=object)[keep]):
+        labels[group].append(label)
+    y = series.to_numpy(dtype=float)[positions]
+    drawn = ~np.isnan(y)
+    return Markers(
+        series.index.values[positions][drawn],
+        y[drawn],
+        tuple(_label(h) for h, d in zip(labels, drawn) if d),
+    )
+
+
+_markers = LRUMemo(maxsize=512, name="event_markers")
+
+
+def event_markers(frame, column, events, version, direction="backward"):
+    """``build_markers`` for ``frame[column]``, memoised per window and event set."""
+    key = (column, window_key(frame), version, events.key, direction)
+    return _markers.get_or_compute(key, lambda: build_markers(frame[column], events, direction))
@@ -0,0 +1,379 @@
+"""Headless report export: every tab's charts and metrics without Streamlit.
+
+    python -m nextbarrel.export --date 2025-11-14 --out reports
+
+Prices come from ``nextbarrel.store`` (and its Parquet cache) plus the
+derived series, cut at ``--date``; each page is then rendered with the same
+compute and chart layers the app uses. Pages are rendered in parallel, one
+task per page, by a process pool. The parent loads the data once and places
+it in shared memory (see ``nextbarrel.compact``); workers map it read-only
+instead of loading their own copy, write their page's PNG and Parquet files
+and return the figure JSON. The parent assembles one self-contained HTML
+report from them. ``--float32`` holds prices as float32 where that is exact
+to the quoted decimals.
+
+PNG output needs the optional ``kaleido`` package and is skipped without it.
+"""
+
+import argparse
+import html
+import importlib.util
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import pandas as pd
+
+from nextbarrel.charts import CHART_WIDTH_PX, UNPACK_JS, area, chart_json, figure_from_json, heatmap_json, term_json
+from nextbarrel.compact import attach, compact, share
+from nextbarrel.curves import REGIME_NAMES, available_curves, regime_run, term_structure
+from nextbarrel.derived import with_derived
+from nextbarrel.memo import LRUMemo
+from nextbarrel.metrics import window_metrics
+from nextbarrel.netback import arb_cube
+from nextbarrel.news import DEFAULT_FEED, PAGE_SIZE, news_feed
+from nextbarrel.pages import PAGES, freight_columns, page_payloads
+from nextbarrel.relvalue import DEFAULT_CORRELATION_WINDOW, GRADES, correlation_matrix, stationarity_table
+from nextbarrel.rolling import DEFAULT_WINDOW, rolling_stats
+from nextbarrel.store import DEFAULT_CSV, load_prices
+from nextbarrel.windows import DEFAULT_TIMEFRAME, TIMEFRAMES, window
+
+FORMATS = ("html", "png", "parquet")
+DEFAULT_OUT = "reports"
+
+
+@dataclass(frozen=True, eq=False)
+class ReportData:
+    """Prices as of ``date``; ``version`` identifies that cut in the compute caches."""
+
+    frame: pd.DataFrame
+    window: pd.DataFrame
+    version: str
+    date: pd.Timestamp
+    columns: tuple
+
+
+@dataclass(frozen=True, eq=False)
+class PageReport:
+    """One rendered page.
+
+    ``figures`` are ``(title, figure_json)``; ``tables`` are ``(name,
+    DataFrame)`` shown in the HTML report and written to Parquet, ``data``
+    the same but Parquet only.
+    """
+
+    name: str
+    title: str
+    figures: tuple = ()
+    tables: tuple = ()
+    data: tuple = ()
+    files: tuple = ()
+
+
+def load_report_data(csv_path=DEFAULT_CSV, date=None, timeframe=DEFAULT_TIMEFRAME, precision="float64"):
+    """``ReportData`` for the prices on or before ``date`` (default: the last date), read-only."""
+    store = load_prices(csv_path)
+    frame = with_derived(store)
+    end = len(frame) if date is None else frame.index.searchsorted(pd.Timestamp(date), side="right")
+    if end == 0:
+        raise ValueError(f"no prices on or before {date}")
+    version = store.version if end == len(frame) else f"{store.version}@{frame.index[end - 1]:%Y-%m-%d}"
+    frame, _ = compact(frame.iloc[:end], precision)
+    if precision != "float64":
+        version = f"{version}:{precision}"
+    columns = tuple(store.frame.select_dtypes(include="number").columns)
+    return ReportData(frame, window(frame, timeframe), version, frame.index[-1], columns)
+
+
+_renderers = {}
+
+
+def renders(name):
+    def decorator(function):
+        _renderers[name] = function
+        return function
+
+    return decorator
+
+
+def _render_grid(page, data, options):
+    figures = page_payloads(page, data.window, data.version)
+    return PageReport(page.name, page.title, figures, data=(("prices", data.window[list(page.columns)]),))
+
+
+@renders("Term Structure")
+def _render_term_structure(page, data, options):
+    figures, rows = [], []
+    for name, curve in available_curves(data.frame.columns).items():
+        structure = term_structure(data.frame, curve, data.version)
+        windowed = structure.between(data.window.index[0], data.window.index[-1])
+        figures.append((f"{name.upper()} CURVE SNAPSHOTS", term_json("snapshots", structure, tuple(sorted(structure.recent_dates())))))
+        figures.append((f"{name.upper()} FRONT - BACK SPREAD", term_json("regime", windowed)))
+        regime, days = regime_run(windowed.regimes())
+        spread = windowed.spread()
+        rows.append({
+            "curve": name,
+            "structure": REGIME_NAMES[regime],
+            "days_in_regime": days,
+            "front_back": spread[-1],
+            "change": spread[-1] - spread[0],
+            "backwardated_pct": (windowed.regimes() > 0).mean() * 100,
+        })
+    return PageReport(page.name, page.title, tuple(figures), (("regimes", pd.DataFrame(rows)),))
+
+
+@renders("Relative Value")
+def _render_relative_value(page, data, options):
+    universe = [c for c in GRADES if c in data.frame.columns]
+    matrix = correlation_matrix(data.frame, data.version, universe, DEFAULT_CORRELATION_WINDOW)
+    figure = heatmap_json(matrix, (data.version, tuple(universe), DEFAULT_CORRELATION_WINDOW))
+    return PageReport(
+        page.name,
+        page.title,
+        ((f"{DEFAULT_CORRELATION_WINDOW}D CORRELATION OF DAILY CHANGES", figure),),
+        (("stationarity", stationarity_table(data.frame, universe)),),
+        (("correlation", matrix),),
+    )
+
+
+@renders("Arb Matrix")
+def _render_arb_matrix(page, data, options):
+    cube = arb_cube(data.frame, data.version)
+    matrix = cube.on(data.date)
+    figure = heatmap_json(matrix, (data.version, "arb", data.date), height=450, zrange=None, value_format="+.2f")
+    return PageReport(
+        page.name,
+        page.title,
+        (("ARB ($/BBL) BY GRADE AND ROUTE", figure),),
+        (("best_route", cube.best()),),
+        (("arb", matrix), ("netback", cube.on(data.date, "netback"))),
+    )
+
+
+def _metrics_table(data, columns):
+    """Window metrics plus the latest rolling statistics for each of ``columns``."""
+    stats = rolling_stats(data.frame, data.version, DEFAULT_WINDOW)
+    ranks = stats.percentile_rank()
+    rows = {}
+    for column in columns:
+        m = window_metrics(data.window, column, data.version)
+        latest = stats.column(column).iloc[-1]
+        rows[column] = {
+            "latest": m.latest,
+            "change": m.change,
+            "pct_change": m.pct_change,
+            "high": m.high,
+            "low": m.low,
+            f"mean_{stats.window}d": latest["mean"],
+            f"vol_{stats.window}d": latest["vol"],
+            "zscore": latest["zscore"],
+            "percentile": ranks[column],
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+@renders("Freight")
+def _render_freight(page, data, options):
+    routes = freight_columns(data.columns)
+    figures = tuple(
+        (route.strip(), chart_json(area(route, "Rate", tickprefix=""), data.window, data.version))
+        for route in routes
+    )
+    return PageReport(page.name, page.title, figures, (("rates", _metrics_table(data, routes)),))
+
+
+@renders("Charts-News")
+def _render_charts_news(page, data, options):
+    tables = [("metrics", _metrics_table(data, data.columns))]
+    try:
+        items = news_feed(options["news"]).page(1, PAGE_SIZE)
+        tables.append(("news", pd.DataFrame(items, columns=["day", "section", "headline"])))
+    except FileNotFoundError:
+        pass
+    return PageReport(page.name, "METRICS AND NEWS", (), tuple(tables))
+
+
+def slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def _write_files(report, directory, formats, width):
+    files = []
+    os.makedirs(directory, exist_ok=True)
+    if "png" in formats:
+        for n, (title, payload) in enumerate(report.figures, 1):
+            path = os.path.join(directory, f"{n:02d}-{slug(title)}.png")
+            figure_from_json(payload).write_image(path, width=width)
+            files.append(path)
+    if "parquet" in formats:
+        for name, table in report.tables + report.data:
+            path = os.path.join(directory, f"{name}.parquet")
+            table.to_parquet(path)
+            files.append(path)
+    return tuple(files)
+
+
+_data = LRUMemo(maxsize=4, name="report_data")
+
+
+def _report_data(options):
+    shared = options.get("shared")
+    if shared is None:
+        return load_report_data(options["csv"], options["date"], options["timeframe"], options["precision"])
+    handle, version, columns = shared
+    frame = attach(handle)
+    return ReportData(frame, window(frame, options["timeframe"]), version, frame.index[-1], columns)
+
+
+def render_page(name, options):
+    """Render page ``name`` and write its PNG/Parquet files; runs in a worker process."""
+    shared = options.get("shared")
+    key = shared[1] if shared else (options["csv"], options["date"], options["timeframe"], options["precision"])
+    data = _data.get_or_compute(key, lambda: _report_data(options))
+    page = PAGES[name]
+    render = _renderers.get(name, _render_grid)
+    report = render(page, data, options)
+    width = CHART_WIDTH_PX // 2 if page.panels else CHART_WIDTH_PX
+    files = _write_files(report, os.path.join(options["directory"], slug(name)), options["formats"], width)
+    return PageReport(report.name, report.title, report.figures, report.tables, files=files)
+
+
+def _render_all(names, options, data, workers):
+    if workers > 1:
+        block = None
+        try:
+            block, handle = share(data.frame)
+            shared = dict(options, shared=(handle, data.version, data.columns))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(render_page, names, [shared] * len(names)))
+        except (BrokenProcessPool, OSError):
+            # Fall back to rendering here, e.g. where processes or shared memory are unavailable
+            pass
+        finally:
+            if block is not None:
+                block.close()
+                block.unlink()
+    _data.get_or_compute((options["csv"], options["date"], options["timeframe"], options["precision"]), lambda: data)
+    return [render_page(name, options) for name in names]
+
+
+def _script_json(payload):
+    # Keep "</script>" inside a headline or label from closing the script tag
+    return payload.replace("</", "<\\/")
+
+
+def render_html(reports, date, timeframe):
+    """One self-contained HTML document with every page's figures and tables."""
+    from plotly.offline import get_plotlyjs
+
+    nav = " · ".join(f'<a href="#{slug(r.name)}">{html.escape(r.name)}</a>' for r in reports)
+    body, scripts = [], []
+    for report in reports:
+        body.append(f'<section id="{slug(report.name)}"><h2>{html.escape(report.title or report.name)}</h2>')
+        for title, payload in report.figures:
+            div = f"fig-{len(scripts)}"
+            body.append(f'<h3>{html.escape(title)}</h3><div id="{div}"></div>')
+            scripts.append(
+                f'var f = {_script_json(payload)}; {UNPACK_JS} '
+                f'Plotly.newPlot("{div}", f.data, f.layout, {{"displayModeBar": false, "responsive": true}});'
+            )
+        for name, table in report.tables:
+            body.append(f"<h3>{html.escape(name.replace('_', ' ').upper())}</h3>")
+            body.append(table.to_html(border=0, float_format=lambda v: f"{v:,.2f}", na_rep=""))
+        body.append("</section>")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>NextBarrel report {date:%Y-%m-%d}</title>
+<script>{get_plotlyjs()}</script>
+<style>
+body {{ background: #0a0a0a; color: #faa537; font-family: 'Courier New', monospace; margin: 2rem; }}
+a {{ color: #00d9ff; }}
+table {{ border-collapse: collapse; font-size: 12px; }}
+th, td {{ padding: 2px 10px; border-bottom: 1px solid #1a1a1a; text-align: right; }}
+</style></head><body>
+<h1>NEXTBARREL TERMINAL · {date:%Y-%m-%d} · {html.escape(timeframe)}</h1>
+<p>{nav}</p>
+{"".join(body)}
+<script>{"".join(f"(function() {{ {s} }})();" for s in scripts)}</script>
+</body></html>
+"""
+
+
+def export_report(
+    date=None,
+    out=DEFAULT_OUT,
+    csv_path=DEFAULT_CSV,
+    news_path=DEFAULT_FEED,
+    timeframe=DEFAULT_TIMEFRAME,
+    formats=FORMATS,
+    pages=None,
+    workers=None,
+    precision="float64",
+):
+    """Render ``pages`` (default: all) as of ``date`` into ``out/<date>/``; return the written paths."""
+    # Loaded once here; workers map this copy from shared memory
+    data = load_report_data(csv_path, date, timeframe, precision)
+    names = list(pages or PAGES)
+    directory = os.path.join(out, f"{data.date:%Y-%m-%d}")
+    os.makedirs(directory, exist_ok=True)
+    options = {
+        "csv": csv_path,
+        "news": news_path,
+        "date": data.date,
+        "timeframe": timeframe,
+        "precision": precision,
+        "directory": directory,
+        "formats": tuple(formats),
+    }
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(names))
+    reports = _render_all(names, options, data, workers)
+    files = [path for report in reports for path in report.files]
+    if "html" in formats:
+        path = os.path.join(directory, "report.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_html(reports, data.date, timeframe))
+        files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nextbarrel.export", description=__doc__.splitlines()[0])
+    parser.add_argument("--date", help="report date, YYYY-MM-DD (default: last date in the data)")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="output directory (default: %(default)s)")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="price history (default: %(default)s)")
+    parser.add_argument("--news", default=DEFAULT_FEED, help="news feed (default: %(default)s)")
+    parser.add_argument("--timeframe", default=DEFAULT_TIMEFRAME, choices=TIMEFRAMES)
+    parser.add_argument("--format", nargs="+", default=list(FORMATS), choices=FORMATS, dest="formats")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), help="pages to render (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument(
+        "--float32", action="store_const", const="float32", default="float64", dest="precision",
+        help="hold prices as float32 where exact to the quoted decimals",
+    )
+    args = parser.parse_args(argv)
+
+    formats = list(args.formats)
+    if "png" in formats and importlib.util.find_spec("kaleido") is None:
+        print("PNG export needs the kaleido package; skipping PNG files.", file=sys.stderr)
+        formats.remove("png")
+
+    started = time.perf_counter()
+    try:
+        files = export_report(
+            args.date, args.out, args.csv, args.news, args.timeframe, formats, args.pages, args.workers, args.precision
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"Wrote {len(files)} files in {time.perf_counter() - started:.1f} s")
+    for path in files:
+        print(f"  {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
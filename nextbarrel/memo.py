@@ -0,0 +1,277 @@
+"""Small thread-safe LRU memo shared by the compute layers.
+
+Every memo is process-wide, so all Streamlit sessions of a server share
+its entries. Concurrent calls for a key that is being computed wait for
+that computation instead of repeating it (single flight), so 40 sessions
+opening the same tab at once build its figures once.
+
+A memo can also be given a ``DiskCache``: a directory of pickled values
+that several server processes share. Values missing from memory are
+looked up there before they are computed, and one process computes a
+missing value while the others wait for its file. Pointing the directory
+at ``/dev/shm`` keeps the tier in shared memory. ``shared_disk`` returns
+the tier configured by ``NEXTBARREL_SHARED_CACHE``, or None.
+
+``cache_stats`` reports hits, misses, single-flight waits and evictions
+for every named memo; ``clear_caches`` empties them.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+SHARED_CACHE_ENV = "NEXTBARREL_SHARED_CACHE"
+# Bytes kept in each namespace of a disk tier before the least recently used files go
+DISK_BYTES = 256 * 1024 * 1024
+# Seconds another process may hold a key before its lock is ignored
+LOCK_SECONDS = 30.0
+_POLL_SECONDS = 0.02
+
+_MISSING = object()
+_memos = weakref.WeakSet()
+
+
+class _Flight:
+    """A computation other threads can wait for."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def finish(self, value=None, error=None):
+        self._value, self._error = value, error
+        self._done.set()
+
+    def result(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class LRUMemo:
+    """Map keys to computed values, keeping the ``maxsize`` most recent.
+
+    With ``maxbytes`` the least recent entries are also evicted once the
+    ``sizeof`` of all entries exceeds it. ``disk`` (a ``DiskCache``) adds
+    a tier shared between processes for calls made with ``shared=True``;
+    their keys must have the same ``repr`` in every process.
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None, sizeof=None, disk=None, name=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.disk = disk
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.bytes = 0
+        self._items = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        _memos.add(self)
+
+    def get_or_compute(self, key, compute, shared=True):
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key][0]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.waits += 1
+        if not leader:
+            return flight.result()
+        try:
+            if self.disk is not None and shared:
+                value, found = self.disk.get_or_compute(key, compute)
+                self.disk_hits += found
+            else:
+                value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            flight.finish(error=e)
+            raise
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.bytes += size
+            while self._items and (
+                len(self._items) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes)
+            ):
+                self.bytes -= self._items.popitem(last=False)[1][1]
+                self.evictions += 1
+            del self._inflight[key]
+        flight.finish(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "entries": len(self._items),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "evictions": self.evictions,
+            "disk_hits": self.disk_hits,
+        }
+
+    def __len__(self):
+        return len(self._items)
+
+
+def cache_stats():
+    """``LRUMemo.stats()`` of every named memo, by name."""
+    return sorted((memo.stats() for memo in list(_memos) if memo.name), key=lambda s: s["name"])
+
+
+def clear_caches():
+    """Empty the in-memory entries of every memo (disk tiers are left alone)."""
+    for memo in list(_memos):
+        memo.clear()
+
+
+class DiskCache:
+    """Pickled values under ``directory/namespace``, one file per key, shared between processes.
+
+    Files are named by a digest of ``repr(key)``, written atomically and
+    evicted least recently read first once the namespace holds more than
+    ``maxbytes``.
+    """
+
+    def __init__(self, directory, namespace, maxbytes=DISK_BYTES):
+        self.directory = os.path.join(directory, namespace)
+        self.maxbytes = maxbytes
+        self._written = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8"), usedforsecurity=False).hexdigest()
+        return os.path.join(self.directory, digest + ".pkl")
+
+    def get(self, key):
+        """The value stored for ``key``, or ``_MISSING``."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return _MISSING
+        if stored_key != repr(key):
+            return _MISSING
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store ``value`` for ``key``; a full or unwritable disk only skips it."""
+        path = self._path(key)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        try:
+            with open(partial, "wb") as f:
+                pickle.dump((repr(key), value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(partial, path)
+        except OSError:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            return
+        self._written += size
+        if self._written > self.maxbytes // 10:
+            self._written = 0
+            self.evict()
+
+    def evict(self):
+        """Delete the least recently read files until the namespace fits in ``maxbytes``."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxbytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def get_or_compute(self, key, compute):
+        """``(value, found)``: the stored value, or ``compute()`` stored by whichever process gets there first."""
+        value = self.get(key)
+        if value is not _MISSING:
+            return value, True
+        lock = self._path(key) + ".lock"
+        deadline = time.monotonic() + LOCK_SECONDS
+        while True:
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                # Another process is computing it; take over if it is stuck
+                try:
+                    stale = time.time() - os.path.getmtime(lock) > LOCK_SECONDS
+                except OSError:
+                    continue
+                if stale or time.monotonic() > deadline:
+                    value = compute()
+                    self.put(key, value)
+                    return value, False
+                time.sleep(_POLL_SECONDS)
+                value = self.get(key)
+                if value is not _MISSING:
+                    return value, True
+            except OSError:
+                return compute(), False
+        try:
+            value = self.get(key)
+            if value is not _MISSING:
+                return value, True
+            value = compute()
+            self.put(key, value)
+            return value, False
+        finally:
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+
+
+def shared_disk(namespace, maxbytes=DISK_BYTES):
+    """``DiskCache`` for ``namespace`` under ``$NEXTBARREL_SHARED_CACHE``, or None when it is unset."""
+    directory = os.environ.get(SHARED_CACHE_ENV)
+    if not directory:
+        return None
+    return DiskCache(directory, namespace, maxbytes)
@@ -0,0 +1,33 @@
+"""Headline metrics for a series over a window."""
+
+from dataclasses import dataclass
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.windows import window_key
+
+
+@dataclass(frozen=True)
+class WindowMetrics:
+    latest: float
+    change: float
+    pct_change: float
+    high: float
+    low: float
+
+
+_metrics = LRUMemo(maxsize=512, name="metrics")
+
+
+def compute_metrics(series):
+    """Latest value, change and % change against the window's first value, high and low."""
+    latest = series.iloc[-1]
+    first = series.iloc[0] if len(series) > 1 else latest
+    change = latest - first
+    pct_change = (change / first) * 100 if first != 0 else 0
+    return WindowMetrics(latest, change, pct_change, series.max(), series.min())
+
+
+def window_metrics(frame, column, version):
+    """``compute_metrics`` for ``frame[column]``, memoised per window and data version."""
+    key = (column, window_key(frame), version)
+    return _metrics.get_or_compute(key, lambda: compute_metrics(frame[column]))
@@ -0,0 +1,156 @@
+"""Crude arbitrage and netbacks across grades and tanker routes.
+
+Each dirty-tanker route column is mapped to where it loads and discharges:
+the grades it can carry and the benchmark of the destination market. Freight
+quoted in $/mt is converted to $/bbl with each grade's own barrels-per-tonne
+factor, derived from its API gravity, instead of one constant for all crude.
+
+For every date, grade and route::
+
+    delivered = grade FOB + freight $/bbl
+    arb       = destination benchmark - delivered   (> 0: arb open)
+    netback   = destination benchmark - freight $/bbl
+
+The whole date × grade × route cube is one broadcasted NumPy expression,
+computed once per data version; combinations a route cannot carry are NaN.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.profiling import timed
+
+# Typical API gravity of each grade (assay values)
+GRADE_API = {
+    "Dated Brent": 38.3,
+    "WTI fob USGC": 42.0,
+    "Dubai M1": 31.0,
+    "Johan Sverdrup FOB dated Mongstad": 28.0,
+    "CPC Blend FOB": 45.3,
+    "Bonny Light FOB": 35.3,
+    "Djeno FOB": 27.6,
+    "Tupi FOB": 29.0,
+    "Liza FOB": 32.0,
+    "Urals FOB Primorsk": 31.7,
+    "ESPO blend FOB Kozmino": 34.8,
+    "Es Sider FOB": 37.0,
+    "Cold Lake FOB TMX": 20.8,
+}
+
+_BBL_M3 = 0.158987
+_WATER_KG_M3 = 999.016
+
+
+def bbl_per_mt(api):
+    """Barrels in one metric tonne of crude with gravity ``api`` (°API at 60°F)."""
+    specific_gravity = 141.5 / (api + 131.5)
+    return 1000.0 / (specific_gravity * _WATER_KG_M3) / _BBL_M3
+
+
+GRADE_BBL_PER_MT = {grade: bbl_per_mt(api) for grade, api in GRADE_API.items()}
+
+MARKETS = {
+    "Europe": "Dated Brent",
+    "Asia": "Dubai M1",
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    column: str
+    label: str
+    market: str
+    grades: tuple
+
+
+ROUTES = (
+    Route("Tanker dirty Mideast Gulf to Asia Pacific 270kt $/mt ", "MEG-Asia VLCC", "Asia", ("Dubai M1",)),
+    Route("Tanker dirty Mideast Gulf to southeast Asia 130kt $/mt ", "MEG-SE Asia Suezmax", "Asia", ("Dubai M1",)),
+    Route("Tanker dirty west Africa to China 260kt $/mt ", "WAF-China VLCC", "Asia", ("Bonny Light FOB", "Djeno FOB")),
+    Route("Tanker dirty Brazil to China 260kt $/mt ", "Brazil-China VLCC", "Asia", ("Tupi FOB",)),
+    Route("Tanker dirty USGC to China (STS) 270kt $/mt ", "USGC-China VLCC", "Asia", ("WTI fob USGC",)),
+    Route("Tanker dirty Vancouver to China 80kt $/mt ", "Vancouver-China Aframax", "Asia", ("Cold Lake FOB TMX",)),
+    Route("Tanker dirty USGC to Rotterdam 270kt $/mt", "USGC-Rotterdam VLCC", "Europe", ("WTI fob USGC",)),
+    Route("Tanker dirty USGC to UKC 70kt $/mt ", "USGC-UKC Aframax", "Europe", ("WTI fob USGC",)),
+    Route("Tanker dirty west Africa to UKCM 130kt $/mt ", "WAF-UKCM Suezmax", "Europe", ("Bonny Light FOB", "Djeno FOB")),
+    Route("Tanker dirty Caribbean to UKC 145t $/mt ", "Caribbean-UKC Suezmax", "Europe", ("Liza FOB",)),
+    Route("Tanker dirty Med to UKC 80kt $/mt ", "Med-UKC Aframax", "Europe", ("Es Sider FOB", "CPC Blend FOB")),
+    Route("Tanker dirty Med to Med 80kt $/mt", "Med-Med Aframax", "Europe", ("Es Sider FOB", "CPC Blend FOB")),
+)
+
+
+@dataclass(frozen=True, eq=False)
+class ArbCube:
+    """``arb[t, g, r]`` etc. for ``dates`` × ``grades`` × ``routes``."""
+
+    dates: pd.DatetimeIndex
+    grades: tuple
+    routes: tuple
+    freight: np.ndarray
+    delivered: np.ndarray
+    arb: np.ndarray
+    netback: np.ndarray
+
+    def on(self, when, values="arb"):
+        """Grade × route DataFrame of ``values`` on the last date at or before ``when``."""
+        t = max(self.dates.searchsorted(pd.Timestamp(when), side="right") - 1, 0)
+        labels = [r.label for r in self.routes]
+        return pd.DataFrame(getattr(self, values)[t], index=list(self.grades), columns=labels)
+
+    def series(self, grade, route_label, values="arb"):
+        """History of one grade/route combination."""
+        g = self.grades.index(grade)
+        r = [route.label for route in self.routes].index(route_label)
+        return pd.Series(getattr(self, values)[:, g, r], index=self.dates, name=f"{grade.strip()} via {route_label}")
+
+    def best(self, values="arb"):
+        """Per grade, the route with the widest ``values`` on the latest date."""
+        latest = pd.DataFrame(getattr(self, values)[-1], index=list(self.grades), columns=[r.label for r in self.routes])
+        quoted = latest.dropna(how="all")
+        return pd.DataFrame({"route": quoted.idxmax(axis=1), values: quoted.max(axis=1)})
+
+
+def input_columns(routes=ROUTES, markets=MARKETS):
+    """Every column ``compute_arb`` can read for ``routes``: freight, grades and benchmarks."""
+    columns = {}
+    for r in routes:
+        for column in (r.column, markets[r.market]) + r.grades:
+            columns.setdefault(column, None)
+    return tuple(columns)
+
+
+def compute_arb(frame, routes=ROUTES, markets=MARKETS):
+    """``ArbCube`` over ``frame`` for the routes whose columns are present."""
+    routes = tuple(
+        r for r in routes
+        if r.column in frame.columns and markets[r.market] in frame.columns
+        and any(g in frame.columns for g in r.grades)
+    )
+    grades = tuple(dict.fromkeys(g for r in routes for g in r.grades if g in frame.columns))
+
+    price = frame[list(grades)].to_numpy(dtype=float)                               # t × g
+    freight_mt = frame[[r.column for r in routes]].to_numpy(dtype=float)            # t × r
+    benchmark = frame[[markets[r.market] for r in routes]].to_numpy(dtype=float)    # t × r
+    factor = np.array([GRADE_BBL_PER_MT[g] for g in grades])                        # g
+    carries = np.array([[g in r.grades for r in routes] for g in grades])           # g × r
+
+    freight = np.where(carries, freight_mt[:, None, :] / factor[None, :, None], np.nan)
+    delivered = price[:, :, None] + freight
+    arb = benchmark[:, None, :] - delivered
+    netback = benchmark[:, None, :] - freight
+    return ArbCube(frame.index, grades, routes, freight, delivered, arb, netback)
+
+
+_cubes = LRUMemo(maxsize=4, name="arb_cubes")
+
+
+def arb_cube(frame, version, routes=ROUTES):
+    """``compute_arb`` over the full history, cached per data version."""
+    def compute():
+        with timed("arb"):
+            return compute_arb(frame, routes)
+
+    return _cubes.get_or_compute((version, routes), compute)
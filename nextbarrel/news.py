@@ -0,0 +1,273 @@
+"""Incremental reader for the daily news feed.
+
+The feed is plain text grouped into day sections::
+
+    📅 Saturday,15-11
+    📰 Top News: first headline
+    second headline
+    📰 Market Commentary: ...
+
+``NewsFeed`` parses it into ``NewsItem`` records and remembers how far it
+has read. A refresh costs an ``os.stat`` when the file is unchanged; when
+lines were appended only the bytes past the stored offset are read, and
+when a new day was written above the old top only the new head of the file
+is read. The feed is newest first, so only the first ``maxlen`` records of
+the file are kept, in file order: reading stops once the buffer is full,
+and records pushed below it by a new day at the top are dropped from the
+bottom. Memory and render cost do not grow with the length of the feed.
+
+Every buffered record has a sequence number that follows file order and
+stays fixed while the record is buffered; ``generation`` changes when the
+file had to be re-read from scratch and numbering restarted. Consumers that
+keep their own state per record (``nextbarrel.newsindex``) use ``delta`` to
+pick up only the records they have not seen.
+"""
+
+import hashlib
+import html
+import os
+import threading
+from collections import deque
+from itertools import islice
+from dataclasses import dataclass
+
+from nextbarrel.profiling import timed
+
+DEFAULT_FEED = "daily_news_feed.txt"
+DAY_MARK = "📅"
+SECTION_MARK = "📰"
+
+# Records kept in memory, from the top of the file; older ones below are dropped
+MAX_ITEMS = 5000
+PAGE_SIZE = 50
+
+# Bytes at the start of the file used to tell appends from inserts at the top
+_HEAD_BYTES = 4096
+_BATCH_LINES = 10000
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class NewsItem:
+    day: str
+    section: str
+    headline: str
+
+
+def parse_lines(lines, day=None, section=None):
+    """``NewsItem`` records for ``lines`` plus the day and section in force at the end."""
+    items = []
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith(DAY_MARK):
+            day, section = line[len(DAY_MARK):].strip(), None
+            continue
+        if line.startswith(SECTION_MARK):
+            name, _, line = line[len(SECTION_MARK):].partition(":")
+            section, line = name.strip(), line.strip()
+            if not line:
+                continue
+        # A trailing "..." marks the last headline of a section
+        headline = line.removesuffix("...").strip()
+        if headline:
+            items.append(NewsItem(day, section, headline))
+    return items, day, section
+
+
+def _digest(data):
+    return hashlib.sha1(data, usedforsecurity=False).hexdigest()
+
+
+class NewsFeed:
+    """Tail of one feed file, refreshed incrementally.
+
+    ``version`` increases whenever the file changed and can be
+    used as a cache key by renderers.
+    """
+
+    def __init__(self, path=DEFAULT_FEED, maxlen=MAX_ITEMS):
+        self.path = path
+        self.maxlen = maxlen
+        self.version = 0
+        self.generation = 0
+        self._items = deque(maxlen=maxlen)
+        # Sequence number of the first buffered record
+        self._lo = 0
+        self._lock = threading.Lock()
+        self._stamp = None
+        # Byte offset just past the last complete line read
+        self._offset = 0
+        # Records parsed from an unterminated last line, re-read on append
+        self._pending = 0
+        self._head = None
+        self._day = None
+        self._section = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def refresh(self):
+        """Read whatever was added since the last call; return the number of new records."""
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if stamp == self._stamp:
+                return 0
+            with open(self.path, "rb") as f:
+                added = self._update(f, st.st_size)
+            self._stamp = stamp
+            self.version += 1
+            return added
+
+    def _update(self, f, size):
+        old_size = self._stamp[1] if self._stamp else None
+        if old_size is not None and size > old_size and self._head is not None:
+            head = f.read(len(self._head[0]))
+            if _digest(head) == self._head[1]:
+                return self._append(f, size)
+            # Old head shifted down by the size difference: lines were inserted at the top
+            f.seek(size - old_size)
+            if _digest(f.read(len(self._head[0]))) == self._head[1]:
+                return self._prepend(f, size - old_size)
+        f.seek(0)
+        return self._reload(f, size)
+
+    def _reload(self, f, size):
+        self._items.clear()
+        self._lo = 0
+        self.generation += 1
+        self._offset, self._pending, self._day, self._section = 0, 0, None, None
+        added = self._append(f, size)
+        f.seek(0)
+        head = f.read(_HEAD_BYTES)
+        self._head = (head, _digest(head))
+        return added
+
+    def _append(self, f, size):
+        for _ in range(self._pending):
+            self._items.pop()
+        added = -self._pending
+        self._pending = 0
+        # A full buffer already holds the newest records; anything below them is older
+        if len(self._items) >= self.maxlen:
+            return max(added, 0)
+        f.seek(self._offset)
+        batch, tail = [], b""
+        for line in f:
+            if not line.endswith(b"\n"):
+                tail = line
+                break
+            batch.append(line.decode("utf-8"))
+            self._offset += len(line)
+            if len(batch) >= _BATCH_LINES:
+                added += self._extend(batch)
+                batch = []
+                if len(self._items) >= self.maxlen:
+                    return max(added, 0)
+        added += self._extend(batch)
+        # The unterminated last line is parsed now and replaced once it is finished
+        pending, _, _ = parse_lines([tail.decode("utf-8", errors="replace")], self._day, self._section)
+        self._pending = self._push(pending)
+        return max(added + self._pending, 0)
+
+    def _extend(self, lines):
+        items, self._day, self._section = parse_lines(lines, self._day, self._section)
+        return self._push(items)
+
+    def _push(self, items):
+        """Add ``items`` at the bottom while there is room; return how many were kept."""
+        items = items[: self.maxlen - len(self._items)]
+        self._items.extend(items)
+        return len(items)
+
+    def _prepend(self, f, length):
+        f.seek(0)
+        data = f.read(length)
+        # Lines above the old first day header belong to the old top day and section
+        first = self._items[0] if self._items else NewsItem(None, None, "")
+        items, _, _ = parse_lines(data.decode("utf-8").splitlines(), first.day, first.section)
+        # Records pushed out of the bottom may include the unterminated last line
+        evicted = max(len(self._items) + len(items) - self.maxlen, 0)
+        self._pending = max(self._pending - evicted, 0)
+        # extendleft on the bounded deque drops the evicted records from the bottom
+        self._items.extendleft(reversed(items))
+        self._lo -= len(items)
+        self._offset += length
+        f.seek(0)
+        head = f.read(_HEAD_BYTES)
+        self._head = (head, _digest(head))
+        return len(items)
+
+    def items(self):
+        """Buffered records in file order."""
+        with self._lock:
+            return list(self._items)
+
+    def page(self, number, size=PAGE_SIZE):
+        """Records on 1-based page ``number``; only that slice is copied."""
+        with self._lock:
+            start = (number - 1) * size
+            return [self._items[i] for i in range(max(start, 0), min(start + size, len(self._items)))]
+
+    def page_count(self, size=PAGE_SIZE):
+        return max((len(self._items) + size - 1) // size, 1)
+
+    def records(self, seqs):
+        """Buffered records for sequence numbers ``seqs``; evicted ones are skipped."""
+        with self._lock:
+            lo, hi = self._lo, self._lo + len(self._items)
+            return [self._items[s - lo] for s in seqs if lo <= s < hi]
+
+    def delta(self, generation, start, stop):
+        """Records a consumer holding sequence numbers ``[start, stop)`` has not seen.
+
+        Returns ``(generation, lo, hi, pending, new)`` where ``[lo, hi)`` is
+        the buffered range, ``pending`` the number of records at its end
+        parsed from an unfinished line, and ``new`` the ``(seq, record)``
+        pairs outside ``[start, stop)`` (all of them after a re-read).
+        """
+        with self._lock:
+            lo, hi = self._lo, self._lo + len(self._items)
+            if generation != self.generation:
+                start = stop = lo
+            start, stop = max(start, lo), min(stop, hi)
+            if start >= stop:
+                start = stop = lo
+            new = list(zip(range(lo, start), islice(self._items, 0, start - lo)))
+            new += zip(range(stop, hi), islice(self._items, stop - lo, None))
+            return self.generation, lo, hi, self._pending, new
+
+
+def news_feed(path=DEFAULT_FEED, maxlen=MAX_ITEMS):
+    """Process-wide ``NewsFeed`` for ``path``, refreshed on every call."""
+    key = (os.path.abspath(path), maxlen)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = _feeds[key] = NewsFeed(path, maxlen)
+    with timed("news"):
+        feed.refresh()
+    return feed
+
+
+_ITEM_STYLE = "margin-bottom: 12px; border-bottom: 1px solid #1a1a1a; padding-bottom: 8px;"
+_HEADING_STYLE = "margin: 4px 0 10px 0; color: #00d9ff;"
+
+
+def render_items(items):
+    """HTML list for one page of records, with day and section headings where they change."""
+    parts = []
+    day = section = None
+    for item in items:
+        if item.day != day:
+            day, section = item.day, None
+            parts.append(f"<li style='{_HEADING_STYLE}'>{DAY_MARK} {html.escape(day or '')}</li>")
+        if item.section != section:
+            section = item.section
+            parts.append(f"<li style='{_HEADING_STYLE}'>{SECTION_MARK} {html.escape(section or '')}</li>")
+        parts.append(f"<li style='{_ITEM_STYLE}'>▸ {html.escape(item.headline, quote=False)}</li>")
+    return "".join(parts)
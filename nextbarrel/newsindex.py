@@ -0,0 +1,233 @@
+"""Inverted index over the buffered news records.
+
+``NewsIndex`` follows a ``NewsFeed`` by sequence number: each sync indexes
+only the records the feed added since the last one and drops the ones it
+evicted, so keeping the index current costs the same whatever the length
+of the feed.
+
+Every headline is also tagged with the price columns it mentions. A column
+is mentioned by any of its distinctive words (``Urals FOB Primorsk`` by
+"urals" or "primorsk", ``ESPO blend FOB Kozmino`` by "espo" or "kozmino")
+or by one of the ``TAG_ALIASES`` for places and companies tied to a grade.
+
+Queries are case-insensitive: words are ANDed, ``OR`` separates
+alternatives, ``-word`` or ``NOT word`` excludes, and a trailing ``*``
+matches by prefix (``novo*``).
+"""
+
+import bisect
+import re
+import threading
+
+# Words in column names too generic to tag a headline with
+_GENERIC = frozenset("""
+    fob cif dated diff swaps swap spread week line blend futures physical premium
+    crude oil fuel average utilization runs refinery east west north south coast gulf
+    sea tanker dirty clean tce scrubber non day conv waterborne barge cargo gal bbl
+    oxy ice nymex usgc nwe sing singapore asia pacific china ukc ukcm usac med
+    international energy exchange light mideast africa japan korea australia brazil
+    caribbean rotterdam vancouver frontline upper osp sts cold lake
+""".split())
+
+# Phrases that identify a grade without naming it
+TAG_ALIASES = {
+    "novorossiysk": ("CPC Blend FOB",),
+    "kazakhstan": ("CPC Blend FOB",),
+    "black sea": ("CPC Blend FOB", "Urals FOB Primorsk"),
+    "lukoil": ("Urals FOB Primorsk",),
+    "kozmino": ("ESPO blend FOB Kozmino",),
+    "cold lake": ("Cold Lake FOB TMX",),
+    "guyana": ("Liza FOB",),
+    "stabroek": ("Liza FOB",),
+    "nigeria": ("Bonny Light FOB",),
+    "libya": ("Es Sider FOB",),
+    "hsfo": ("Fuel oil 3.5%S 380cst cargo Sing $/bbl", "Fuel Oil 3.5% Sing 380 $/mt"),
+    "ulsd": ("Diesel ULSD 62 fob USGC waterborne c/gal", "Diesel ULSD 62 fob USGC waterborne $/bbl"),
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lower-case words of ``text`` with possessive ``'s`` removed."""
+    return _WORD.findall(text.lower().replace("'s", ""))
+
+
+def column_words(column):
+    """Distinctive words of a column name; ``"DubaiM1/M2"`` gives ``("dubai",)``."""
+    words = re.findall(r"[a-z]+", _CAMEL.sub(" ", column).lower())
+    return tuple(w for w in words if len(w) >= 3 and w not in _GENERIC)
+
+
+def build_tagger(columns, aliases=TAG_ALIASES):
+    """``(word -> columns, phrase -> columns)`` lookup tables for ``columns``."""
+    words, phrases = {}, {}
+    for column in columns:
+        for word in column_words(column):
+            words.setdefault(word, []).append(column)
+    known = set(columns)
+    for alias, targets in aliases.items():
+        targets = [c for c in targets if c in known]
+        if targets:
+            table = phrases if " " in alias else words
+            table.setdefault(alias, []).extend(targets)
+    return words, phrases
+
+
+class NewsIndex:
+    """Word and tag postings for the records of one ``NewsFeed``."""
+
+    def __init__(self, feed, columns=()):
+        self.feed = feed
+        self.columns = tuple(columns)
+        self._words, self._phrases = build_tagger(self.columns)
+        self._postings = {}
+        self._vocabulary = []
+        self._tags = {}
+        self._docs = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._generation = None
+        self._start = self._stop = 0
+        self._pending = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def tags_for(self, item):
+        """Columns mentioned by ``item``'s headline."""
+        return self._tags_for(tokenize(item.headline))
+
+    def _tags_for(self, tokens):
+        tags = {c for w in self._words.keys() & set(tokens) for c in self._words[w]}
+        text = " ".join(tokens)
+        tags.update(c for phrase, cols in self._phrases.items() if phrase in text for c in cols)
+        return tuple(c for c in self.columns if c in tags)
+
+    def sync(self):
+        """Index what the feed added and forget what it dropped since the last sync."""
+        with self._lock:
+            if self.feed.version == self._version and self.feed.generation == self._generation:
+                return
+            version = self.feed.version
+            # The records parsed from an unfinished line may have changed; index them again
+            stop = self._stop - self._pending
+            generation, lo, hi, pending, new = self.feed.delta(self._generation, self._start, stop)
+            if generation != self._generation:
+                dropped = list(self._docs)
+            else:
+                # Indexed records are the contiguous range [start, stop)
+                keep_start, keep_stop = max(self._start, lo), max(min(stop, hi), lo)
+                dropped = [*range(self._start, min(keep_start, self._stop)), *range(max(keep_stop, self._start), self._stop)]
+            for seq in dropped:
+                if seq in self._docs:
+                    self._remove(seq)
+            for seq, item in new:
+                self._add(seq, item)
+            self._version, self._generation = version, generation
+            self._start, self._stop, self._pending = lo, hi, pending
+
+    def _add(self, seq, item):
+        words = tokenize(item.headline)
+        tokens, tags = set(words), self._tags_for(words)
+        self._docs[seq] = (tokens, tags)
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+            postings.add(seq)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(seq)
+
+    def _remove(self, seq):
+        tokens, tags = self._docs.pop(seq)
+        for token in tokens:
+            postings = self._postings[token]
+            postings.discard(seq)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        for tag in tags:
+            self._tags[tag].discard(seq)
+
+    def _term(self, term):
+        if term.endswith("*"):
+            prefix = term[:-1]
+            i = bisect.bisect_left(self._vocabulary, prefix)
+            matched = set()
+            while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+                matched |= self._postings[self._vocabulary[i]]
+                i += 1
+            return matched
+        return self._postings.get(term, set())
+
+    def _clause(self, terms):
+        include, exclude = [], []
+        negate = False
+        for term in terms:
+            if term == "not":
+                negate = True
+                continue
+            if term.startswith("-") and len(term) > 1:
+                negate, term = True, term[1:]
+            words = tokenize(term.rstrip("*"))
+            # "Black-Sea" style terms are the AND of their words; "*" applies to the last
+            postings = [self._term(w) for w in words[:-1]]
+            if words:
+                postings.append(self._term(words[-1] + ("*" if term.endswith("*") else "")))
+            (exclude if negate else include).extend(postings)
+            negate = False
+        if not include:
+            matched = set(self._docs)
+        else:
+            matched = set.intersection(*sorted(include, key=len))
+        for postings in exclude:
+            matched -= postings
+        return matched
+
+    def matches(self, query="", tag=None):
+        """Sequence numbers of records matching ``query`` (and tagged ``tag``), in file order."""
+        self.sync()
+        with self._lock:
+            clauses, current = [], []
+            for term in query.replace('"', " ").split():
+                if term == "OR":
+                    clauses.append(current)
+                    current = []
+                else:
+                    current.append(term.lower())
+            clauses.append(current)
+            clauses = [c for c in clauses if c]
+            if clauses:
+                matched = set().union(*(self._clause(c) for c in clauses))
+            else:
+                matched = set(self._docs)
+            if tag is not None:
+                matched &= self._tags.get(tag, set())
+            return sorted(matched)
+
+    def search(self, query="", tag=None):
+        """Records matching ``query`` (and tagged ``tag``), in file order."""
+        return self.feed.records(self.matches(query, tag))
+
+    def tag_counts(self):
+        """Number of buffered headlines tagged with each column."""
+        self.sync()
+        with self._lock:
+            return {tag: len(seqs) for tag, seqs in self._tags.items() if seqs}
+
+
+def news_index(feed, columns=()):
+    """Process-wide ``NewsIndex`` for ``feed`` and ``columns``, synced on every call."""
+    key = (id(feed), tuple(columns))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or index.feed is not feed:
+            index = _indexes[key] = NewsIndex(feed, columns)
+    index.sync()
+    return index
@@ -0,0 +1,153 @@
+"""Terminal tabs as registered page objects.
+
+A ``Page`` declares its panels (title + chart spec) and therefore the
+columns it depends on. ``page_payloads`` renders every panel of a page for
+one window and caches the result per (page, window, data version), so
+switching back to a tab is a single dictionary lookup. Pages with
+interactive widgets (``Term Structure``, ``Relative Value``, ``Arb Matrix``,
+``Freight``, ``Charts-News``) declare no panels and are drawn by the app
+itself.
+"""
+
+from dataclasses import dataclass
+
+from nextbarrel.charts import ChartSpec, Series, area, chart_json, curve_spec, lines, spec_columns
+from nextbarrel.curves import CURVES
+from nextbarrel.memo import LRUMemo, shared_disk
+from nextbarrel.windows import window_key
+
+
+@dataclass(frozen=True)
+class Panel:
+    title: str
+    spec: object
+
+
+@dataclass(frozen=True)
+class Page:
+    name: str
+    title: str = ""
+    panels: tuple = ()
+
+    @property
+    def columns(self):
+        """Columns this page reads, in first-use order."""
+        seen = {}
+        for panel in self.panels:
+            for column in spec_columns(panel.spec):
+                seen.setdefault(column, None)
+        return tuple(seen)
+
+
+PAGES = {}
+# Serialized figures kept in memory for whole pages
+PAYLOAD_CACHE_BYTES = 128 * 1024 * 1024
+
+
+def register(page):
+    PAGES[page.name] = page
+    return page
+
+
+register(Page("North Sea", "NORTH SEA COMPLEX", (
+    Panel("DATED TO FRONTLINE (DFL)", area(" Dated to Frontline (DFL)", "DFL")),
+    Panel("BRENT/WTI SPREAD", area("Brent/Ti", "Brent/WTI")),
+    Panel("BRENT M1/M2 SPREAD", area("Brent M1/M2 spread", "M1/M2")),
+    Panel("WEEKLY CFDs CURVE", curve_spec(CURVES["North Sea CFDs"], xaxis_title="Week", yaxis_title="Price")),
+)))
+
+register(Page("Americas", "US OIL", (
+    Panel("WTI M1/M2 SPREAD", area("WTI M1/M2", "WTI M1/M2")),
+    Panel("HOUSTON MEH vs WTI", area("Houston MEH vs WTI", "Houston MEH")),
+    Panel("SOURS vs WTI", lines(
+        Series("WCS Hardisty vs WTI", "WCS Hardisty"),
+        Series("Mars vs WTI 1st Line", "Mars"),
+    )),
+    Panel("REFINERY UTILIZATION", lines(
+        Series("Refinery runs East Coast (PADD 1)", "PADD 1"),
+        Series("Refinery runs Gulf Coast (PADD 3)", "PADD 3"),
+        Series("U.S. Average Utilization", "US Average", dash="dot"),
+        tickprefix="",
+        ticksuffix="%",
+        decimals=1,
+    )),
+)))
+
+register(Page("Middle East", "MIDDLE EAST OIL MARKETS", (
+    Panel("DUBAI-BRENT EFS", area("Dubai-Brent EFS", "EFS")),
+    Panel("DUBAI M1/M2 SPREAD", area("DubaiM1/M2", "Dubai M1/M2")),
+    Panel("DUBAI PHYSICAL PREMIUM", area("Dubai Physical Premium", "Premium")),
+    Panel("MURBAN DIFF TO DUBAI SWAPS", area("Murban diff to Dubai swaps", "Murban Diff")),
+)))
+
+register(Page("WAF", "WEST AFRICA OIL", (
+    Panel("BONNY LIGHT vs DATED BRENT", area("Bonny Light vs Dated Brent", "Bonny Diff")),
+    Panel("DJENGO vs DATED BRENT", area("Djeno vs Dated Brent", "Djeno Diff")),
+    Panel("FREIGHT WAF-CHINA (VLCC)", area("Freight WAF-China $/bbl", "Freight", ticksuffix="/bbl")),
+    Panel("FREIGHT WAF-UKC (SUEZ)", area("Freight WAF-UKCM $/bbl", "Freight", ticksuffix="/bbl")),
+)))
+
+register(Page("Refined Products", "REFINED PRODUCTS CRACKS", (
+    Panel("DISTILLATES CRACKS", lines(
+        Series("NWE Gasoil crack", "NWE Gasoil"),
+        Series("Sing 10ppm crack", "Sing 10ppm"),
+        Series("USGC ULSD crack", "USGC ULSD"),
+    )),
+    Panel("GASOLINE CRACKS", lines(
+        Series("NWE Gasoline crack", "NWE Gasoline"),
+        Series("Sing 92 crack", "Sing 92"),
+        Series("USGC Gasoline crack", "USGC Gasoline"),
+    )),
+    Panel("JET FUEL CRACKS", lines(
+        Series("NWE Jet crack", "NWE Jet"),
+        Series("Sing Jet crack", "Sing Jet/Kero"),
+        Series("USGC Jet crack", "USGC Jet"),
+    )),
+    Panel("ASIA FUEL OIL CRACK", area("Asia HSFO crack", "HSFO Crack")),
+)))
+
+register(Page("Term Structure", "TERM STRUCTURE"))
+register(Page("Relative Value", "RELATIVE VALUE"))
+register(Page("Arb Matrix", "CRUDE ARBITRAGE MATRIX"))
+register(Page("Freight", "TANKER RATES"))
+register(Page("Charts-News"))
+
+
+def freight_columns(columns):
+    """Tanker rate columns (dirty/clean $/mt routes and TCE) drawn on the Freight page."""
+    return [c for c in columns if "Tanker" in c or "TCE" in c]
+
+
+_payloads = LRUMemo(
+    maxsize=128,
+    maxbytes=PAYLOAD_CACHE_BYTES,
+    sizeof=lambda payloads: sum(len(p) for _, p in payloads),
+    disk=shared_disk("payloads"),
+    name="page_payloads",
+)
+
+
+def _panel_json(panel, frame, version, events, stats):
+    if not isinstance(panel.spec, ChartSpec):
+        return chart_json(panel.spec, frame, version)
+    return chart_json(panel.spec, frame, version, events=events, stats=stats)
+
+
+def page_payloads(page, frame, version, events=None, stats=None):
+    """``(title, figure_json)`` for every panel of ``page`` over ``frame``.
+
+    ``events`` overlays the same news markers on every line chart of the
+    page and ``stats`` adds rolling bands to its single-series charts.
+    """
+    key = (
+        page.name,
+        window_key(frame),
+        version,
+        events.key if events is not None else None,
+        stats.key if stats is not None else None,
+    )
+    return _payloads.get_or_compute(
+        key,
+        lambda: tuple((panel.title, _panel_json(panel, frame, version, events, stats)) for panel in page.panels),
+        shared=events is None,
+    )
@@ -0,0 +1,190 @@
+"""Hot-path timers and per-tab latency percentiles.
+
+``timed(stage)`` wraps one unit of work: a data load, a window, the
+derived series, a figure build, a chart sent to the browser. Measurements
+add up in the ``Run`` active in the current context, which is one
+Streamlit rerun (see ``start_run``), so a rerun can show its own
+breakdown. ``finish_run`` adds each stage's total for the rerun to a
+process-wide rolling window of the last ``SAMPLES`` values per (tab,
+stage), from which ``percentiles`` reports p50/p95. It also writes them
+to ``STATS_FILE``, with the hit/miss counts of the result caches, at most
+every ``EXPORT_INTERVAL`` seconds, for monitoring to pick up.
+
+Work done outside a run (background jobs, batch export) is sampled per
+call under the tab ``None``.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from nextbarrel.memo import cache_stats
+
+# Durations kept per (tab, stage) for the percentiles
+SAMPLES = 500
+EXPORT_INTERVAL = 30.0
+# Next to the price store's cache
+STATS_FILE = os.path.join(".nextbarrel_cache", "profile_stats.json")
+
+_current = contextvars.ContextVar("nextbarrel_run", default=None)
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES))
+_counters = defaultdict(int)
+_lock = threading.Lock()
+_last_export = 0.0
+
+
+class Run:
+    """Stage timings and counters of one rerun of ``tab``."""
+
+    def __init__(self, tab):
+        self.tab = tab
+        self.started = time.perf_counter()
+        self.seconds = None
+        # stage -> [seconds, calls], in first-use order
+        self.stages = {}
+        self.counters = {}
+        self._token = None
+
+    def elapsed(self):
+        return self.seconds if self.seconds is not None else time.perf_counter() - self.started
+
+    def add(self, stage, seconds):
+        entry = self.stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def rows(self):
+        """``(stage, calls, milliseconds)`` per stage."""
+        return [(stage, calls, seconds * 1000) for stage, (seconds, calls) in self.stages.items()]
+
+
+def record(stage, seconds):
+    run = _current.get()
+    if run is not None:
+        run.add(stage, seconds)
+        return
+    with _lock:
+        _samples[(None, stage)].append(seconds)
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def count(name, n=1):
+    """Add ``n`` to the counter ``name`` of the current run and tab."""
+    run = _current.get()
+    if run is not None:
+        run.counters[name] = run.counters.get(name, 0) + n
+    with _lock:
+        _counters[(run.tab if run else None, name)] += n
+
+
+def start_run(tab):
+    """Begin a rerun of ``tab``; stages timed in this context are added to it."""
+    run = Run(tab)
+    run._token = _current.set(run)
+    return run
+
+
+def finish_run(run, path=STATS_FILE, interval=EXPORT_INTERVAL):
+    """End ``run``, sample its stage totals and the whole rerun, and export the stats if due."""
+    global _last_export
+    run.seconds = time.perf_counter() - run.started
+    try:
+        _current.reset(run._token)
+    except ValueError:
+        # Finished from another context; the next start_run replaces it
+        pass
+    with _lock:
+        for stage, (seconds, _) in run.stages.items():
+            _samples[(run.tab, stage)].append(seconds)
+        _samples[(run.tab, "rerun")].append(run.seconds)
+        due = path is not None and time.monotonic() - _last_export >= interval
+        if due:
+            _last_export = time.monotonic()
+    if due:
+        try:
+            write_stats(path)
+        except OSError:
+            pass
+    return run
+
+
+def percentiles(tab=...):
+    """``{tab: {stage: {count, p50_ms, p95_ms, last_ms}}}``, or one tab's stages."""
+    with _lock:
+        samples = {key: np.array(values) for key, values in _samples.items()}
+    stats = {}
+    for (name, stage), values in samples.items():
+        p50, p95 = np.percentile(values, [50, 95]) * 1000
+        stats.setdefault(name, {})[stage] = {
+            "count": len(values),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "last_ms": float(values[-1] * 1000),
+        }
+    return stats if tab is ... else stats.get(tab, {})
+
+
+def breakdown(run):
+    """Rows for a profiling overlay: ``run``'s stages beside its tab's p50/p95."""
+    tab_stats = percentiles(run.tab)
+    rows = run.rows() + ([("rerun", 1, run.seconds * 1000)] if run.seconds is not None else [])
+    return [
+        {
+            "stage": stage,
+            "calls": calls,
+            "ms": ms,
+            "p50_ms": tab_stats.get(stage, {}).get("p50_ms"),
+            "p95_ms": tab_stats.get(stage, {}).get("p95_ms"),
+        }
+        for stage, calls, ms in rows
+    ]
+
+
+def counters():
+    """``{tab: {name: total}}`` since the process started."""
+    with _lock:
+        items = list(_counters.items())
+    totals = {}
+    for (tab, name), value in items:
+        totals.setdefault(tab, {})[name] = value
+    return totals
+
+
+def write_stats(path=STATS_FILE):
+    """Write the percentiles and counters of every tab to ``path`` as JSON."""
+    document = {
+        "updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pid": os.getpid(),
+        "samples_per_stage": SAMPLES,
+        "tabs": {str(tab): stages for tab, stages in percentiles().items()},
+        "counters": {str(tab): values for tab, values in counters().items()},
+        "caches": cache_stats(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    os.replace(partial, path)
+
+
+def reset():
+    """Forget every sample and counter."""
+    with _lock:
+        _samples.clear()
+        _counters.clear()
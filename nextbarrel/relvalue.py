@@ -0,0 +1,290 @@
+"""Relative value: rolling correlations and spread stationarity across grades.
+
+``RollingCorrelation`` keeps the pairwise sums behind a rolling correlation
+of daily changes (counts, sums, sums of squares and cross products, each a
+k × k matrix) and moves them one day at a time, so a new day costs O(k²)
+instead of recomputing the window. One engine per (universe, window) lives
+for the whole process and is advanced to each new data version.
+
+Pairwise Engle-Granger tests (OLS hedge ratio, then an ADF regression on
+the spread) are heavier. They run batched in a background process pool
+and are published to a process-wide cache; ``stationarity`` returns the
+published table, or ``None`` while the tests are still running;
+``stationarity_table`` computes it synchronously for headless callers.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.profiling import timed
+
+GRADES = (
+    "Dated Brent",
+    "WTI fob USGC",
+    "Dubai M1",
+    "Johan Sverdrup FOB dated Mongstad",
+    "CPC Blend FOB",
+    "Bonny Light FOB",
+    "Djeno FOB",
+    "Tupi FOB",
+    "Liza FOB",
+    "Urals FOB Primorsk",
+    "ESPO blend FOB Kozmino",
+    "Es Sider FOB",
+    "Cold Lake FOB TMX",
+)
+
+CORRELATION_WINDOWS = (20, 60, 120)
+DEFAULT_CORRELATION_WINDOW = 60
+STATIONARITY_LOOKBACK = 250
+ADF_LAGS = 1
+# Engle-Granger (two variables, constant) critical values, MacKinnon (2010)
+EG_CRITICAL = {"1%": -3.90, "5%": -3.34, "10%": -3.04}
+# Pairs per task sent to a worker process
+PAIRS_PER_TASK = 500
+# Published stationarity tables kept; the oldest is dropped first
+MAX_PUBLISHED = 16
+
+_engines = {}
+_engines_lock = threading.Lock()
+_matrices = LRUMemo(maxsize=32, name="correlation_matrices")
+_pair_history = LRUMemo(maxsize=64, name="pair_history")
+
+_published = {}
+_running = set()
+_jobs_lock = threading.Lock()
+_pool = None
+_coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nextbarrel-relvalue")
+
+
+class RollingCorrelation:
+    """Pairwise-complete rolling correlation of daily changes of ``columns``."""
+
+    def __init__(self, columns, window):
+        self.columns = tuple(columns)
+        self.window = window
+        k = len(self.columns)
+        self.n = np.zeros((k, k))
+        # sx[i, j] is the sum of x_i over days where both i and j are quoted
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+        self.last_date = None
+        # Levels of the rows whose changes are in the window, plus the one before
+        self._dates = deque(maxlen=window + 1)
+        self._levels = deque(maxlen=window + 1)
+        self._changes = deque()
+
+    def _apply(self, change, sign):
+        valid = ~np.isnan(change)
+        m = valid.astype(float)
+        x = np.where(valid, change, 0.0)
+        self.n += sign * np.outer(m, m)
+        self.sx += sign * np.outer(x, m)
+        self.sxx += sign * np.outer(x * x, m)
+        self.sxy += sign * np.outer(x, x)
+
+    def push(self, when, levels):
+        """Add the day ``when`` with price ``levels``; drop the day leaving the window."""
+        if self._levels:
+            change = levels - self._levels[-1]
+            self._apply(change, 1)
+            self._changes.append(change)
+            if len(self._changes) > self.window:
+                self._apply(self._changes.popleft(), -1)
+        self._dates.append(when)
+        self._levels.append(levels)
+        self.last_date = when
+
+    def advance(self, frame):
+        """Bring the window up to the end of ``frame``; rebuild it if its rows changed."""
+        index = frame.index
+        values = frame[list(self.columns)]
+        start = None
+        if self.last_date is not None and self.last_date in index:
+            pos = index.get_loc(self.last_date)
+            held = np.array(self._levels)
+            lo = pos + 1 - len(held)
+            if (
+                lo >= 0
+                and index[lo:pos + 1].equals(pd.DatetimeIndex(self._dates))
+                and np.array_equal(values.iloc[lo:pos + 1].to_numpy(dtype=float), held, equal_nan=True)
+            ):
+                start = pos + 1
+        if start is None:
+            self.__init__(self.columns, self.window)
+            start = max(len(index) - self.window - 1, 0)
+        levels = values.iloc[start:].to_numpy(dtype=float)
+        for when, row in zip(index[start:], levels):
+            self.push(when, row)
+
+    def matrix(self, min_periods=None):
+        """Correlation matrix of the current window; pairs with too few days are NaN."""
+        min_periods = min_periods or max(self.window // 2, 3)
+        n = self.n
+        with np.errstate(all="ignore"):
+            cov = self.sxy - self.sx * self.sx.T / n
+            var_x = self.sxx - self.sx * self.sx / n
+            corr = cov / np.sqrt(var_x * var_x.T)
+        corr = np.where(n >= min_periods, np.clip(corr, -1.0, 1.0), np.nan)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+def correlation_matrix(frame, version, columns, window=DEFAULT_CORRELATION_WINDOW):
+    """Rolling correlation of daily changes over the last ``window`` days, per data version."""
+    columns = tuple(columns)
+
+    def compute():
+        with timed("correlation"), _engines_lock:
+            engine = _engines.get((columns, window))
+            if engine is None:
+                engine = _engines[(columns, window)] = RollingCorrelation(columns, window)
+            engine.advance(frame)
+            return engine.matrix()
+
+    return _matrices.get_or_compute((version, columns, window), compute)
+
+
+def pair_correlation(frame, version, a, b, window=DEFAULT_CORRELATION_WINDOW):
+    """History of the rolling correlation between the daily changes of ``a`` and ``b``."""
+
+    def compute():
+        with timed("correlation"):
+            changes = frame[[a, b]].diff()
+            return changes[a].rolling(window, min_periods=max(window // 2, 3)).corr(changes[b])
+
+    return _pair_history.get_or_compute((version, a, b, window), compute)
+
+
+def engle_granger(values, pairs, lags=ADF_LAGS):
+    """Hedge ratio, ADF t-statistic and half-life of ``y - beta * x`` for each pair.
+
+    ``values`` is a (days × columns) array without gaps and ``pairs`` an
+    array of ``(y, x)`` column positions. All pairs are solved as one batch.
+    """
+    y = values[:, pairs[:, 0]]
+    x = values[:, pairs[:, 1]]
+    xc, yc = x - x.mean(axis=0), y - y.mean(axis=0)
+    with np.errstate(all="ignore"):
+        beta = (xc * yc).sum(axis=0) / (xc * xc).sum(axis=0)
+    spread = yc - beta * xc
+
+    # ADF regression per pair: d_e[t] = c + gamma * e[t-1] + sum(phi * d_e[t-i])
+    diff = np.diff(spread, axis=0)
+    target = diff[lags:]
+    regressors = [np.ones_like(target), spread[lags:-1]]
+    regressors += [diff[lags - i:len(diff) - i] for i in range(1, lags + 1)]
+    design = np.stack(regressors, axis=-1).transpose(1, 0, 2)  # pairs × days × regressors
+    target = target.T[:, :, None]
+    xtx = design.transpose(0, 2, 1) @ design
+    xty = design.transpose(0, 2, 1) @ target
+    with np.errstate(all="ignore"):
+        inverse = np.linalg.pinv(xtx)
+        coef = inverse @ xty
+        residuals = target - design @ coef
+        dof = design.shape[1] - design.shape[2]
+        sigma2 = (residuals ** 2).sum(axis=(1, 2)) / dof
+        gamma = coef[:, 1, 0]
+        tstat = gamma / np.sqrt(sigma2 * inverse[:, 1, 1])
+        half_life = np.where((gamma < 0) & (gamma > -1), -np.log(2) / np.log1p(gamma), np.inf)
+    return beta, tstat, half_life
+
+
+def _executor():
+    """The shared worker pool, or ``None`` where processes cannot be started."""
+    global _pool
+    if _pool is None:
+        try:
+            _pool = ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4))
+        except (OSError, NotImplementedError):
+            return None
+    return _pool
+
+
+def _run_tests(values, pairs, lags):
+    global _pool
+    chunks = [pairs[i:i + PAIRS_PER_TASK] for i in range(0, len(pairs), PAIRS_PER_TASK)]
+    pool = _executor()
+    try:
+        if pool is None:
+            raise BrokenProcessPool("no worker processes")
+        futures = [pool.submit(engle_granger, values, chunk, lags) for chunk in chunks]
+        results = [f.result() for f in futures]
+    except (BrokenProcessPool, OSError):
+        # Run in this background thread instead; a broken pool is rebuilt next time
+        _pool = None
+        results = [engle_granger(values, chunk, lags) for chunk in chunks]
+    return [np.concatenate(parts) for parts in zip(*results)] if results else [np.array([])] * 3
+
+
+def _single_batch(values, pairs, lags):
+    return engle_granger(values, pairs, lags) if len(pairs) else [np.array([])] * 3
+
+
+def stationarity_table(frame, columns, lookback=STATIONARITY_LOOKBACK, lags=ADF_LAGS, solve=_single_batch):
+    """Engle-Granger table for every pair of ``columns``, computed in the calling thread.
+
+    ``solve(values, pairs, lags)`` runs the tests; by default one batch here.
+    """
+    data = frame[list(columns)].iloc[-lookback:].dropna()
+    k = len(columns)
+    pairs = np.array([(i, j) for i in range(k) for j in range(i + 1, k)], dtype=int).reshape(-1, 2)
+    if len(data) <= lags + 10 or not len(pairs):
+        return pd.DataFrame(columns=["y", "x", "beta", "adf_t", "half_life", "stationary"])
+    beta, tstat, half_life = solve(data.to_numpy(dtype=float), pairs, lags)
+    table = pd.DataFrame({
+        "y": [columns[i] for i in pairs[:, 0]],
+        "x": [columns[j] for j in pairs[:, 1]],
+        "beta": beta,
+        "adf_t": tstat,
+        "half_life": half_life,
+    })
+    table["stationary"] = pd.cut(
+        table["adf_t"],
+        [-np.inf, EG_CRITICAL["1%"], EG_CRITICAL["5%"], EG_CRITICAL["10%"], np.inf],
+        labels=["1%", "5%", "10%", "no"],
+    ).astype(str)
+    return table.sort_values("adf_t", ignore_index=True)
+
+
+def _stationarity_job(key, frame, columns, lookback, lags):
+    try:
+        with timed("stationarity"):
+            table = stationarity_table(frame, columns, lookback, lags, solve=_run_tests)
+        with _jobs_lock:
+            _published[key] = table
+            while len(_published) > MAX_PUBLISHED:
+                _published.pop(next(iter(_published)))
+    finally:
+        with _jobs_lock:
+            _running.discard(key)
+
+
+def stationarity(frame, version, columns, lookback=STATIONARITY_LOOKBACK, lags=ADF_LAGS):
+    """Published Engle-Granger table for every pair of ``columns``, or ``None`` if pending.
+
+    The first call for a (version, universe, lookback) starts the tests in
+    the background; call again on a later rerun to pick up the result.
+    """
+    key = (version, tuple(columns), lookback, lags)
+    with _jobs_lock:
+        if key in _published:
+            return _published[key]
+        if key in _running:
+            return None
+        _running.add(key)
+    _coordinator.submit(_stationarity_job, key, frame, tuple(columns), lookback, lags)
+    return None
+
+
+def stationarity_pending():
+    """Number of stationarity jobs still running."""
+    with _jobs_lock:
+        return len(_running)
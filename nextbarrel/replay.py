@@ -0,0 +1,268 @@
+"""Replay a price history through the live tick path as a load test.
+
+    python -m nextbarrel.replay --speed 1000 --seconds 30
+    python -m nextbarrel.replay --rows 100000 --speed max --all-columns --out replay.json
+
+Rows of the history (``--csv``, or a synthetic one of ``--rows`` rows from
+``nextbarrel.bench``) are sent oldest first as ticks, one per quoted
+column, with the gaps between their dates divided by ``--speed``, or
+without gaps at ``--speed max``. Each tick is stamped with the wall-clock
+time it is sent, as a live feed would stamp it.
+
+Everything downstream of the feed is what the terminal runs: a ``replay``
+server on a local socket, ``TickFeed`` reading it into a ``TickBook``, and
+a render loop that, every ``--refresh`` seconds, builds the ``LiveView``
+(metric and figure) of every column that received ticks. For each tick the
+report measures latency from its send stamp to the end of the first render
+that showed it, in whole milliseconds. It also counts:
+
+- ``coalesced``: ticks shown by a render that was already showing a newer
+  tick of the same column;
+- ``dropped``: ticks that never reached a render, either overwritten in the
+  ring buffer between renders or lost between sender and book;
+- ``rejected``: lines the feed could not parse.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from nextbarrel.bench import synthetic_csv
+from nextbarrel.profiling import timed
+from nextbarrel.sources import price_source
+from nextbarrel.store import DEFAULT_CSV
+from nextbarrel.ticks import CAPACITY, LIVE_COLUMNS, REFRESH_SECONDS, Tick, TickFeed, live_view, now_ms, serve_replay
+
+DEFAULT_SPEED = 1000
+# Seconds to wait for the book to catch up with the sender at the end
+DRAIN_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class ReplayReport:
+    rows: int
+    columns: int
+    speed: float
+    seconds: float
+    sent: int
+    received: int
+    rejected: int
+    rendered: int
+    coalesced: int
+    dropped: int
+    renders: int
+    render_ms_p50: float
+    latency_ms_p50: float
+    latency_ms_p95: float
+    latency_ms_p99: float
+    latency_ms_max: float
+
+
+def history_batches(frame, speed=DEFAULT_SPEED, stop=None):
+    """One list of ticks per row of ``frame``, released ``speed`` times faster than its dates.
+
+    ``speed=None`` releases rows as fast as they are consumed.
+    """
+    columns = list(frame.columns)
+    values = frame.to_numpy(dtype=float)
+    offsets = (frame.index - frame.index[0]).total_seconds().to_numpy()
+    started = time.perf_counter()
+    for offset, row in zip(offsets, values):
+        if stop is not None and stop.is_set():
+            return
+        if speed:
+            wait = started + offset / speed - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        stamp = now_ms()
+        yield [Tick(column, stamp, float(v)) for column, v in zip(columns, row) if v == v]
+
+
+class _Sender:
+    """One history stream for the first client; later (re)connections get nothing."""
+
+    def __init__(self, frame, speed, stop):
+        self.sent = 0
+        self.done = threading.Event()
+        self._batches = history_batches(frame, speed, stop)
+        self._taken = threading.Lock()
+
+    def __call__(self):
+        if not self._taken.acquire(blocking=False):
+            return iter(())
+        return self._stream()
+
+    def _stream(self):
+        try:
+            for batch in self._batches:
+                yield batch
+                self.sent += len(batch)
+        finally:
+            self.done.set()
+
+
+class _Renderer:
+    """Builds the ``LiveView`` of every column with new ticks and measures what it showed."""
+
+    def __init__(self, book, columns):
+        self.book = book
+        self.columns = columns
+        self.seen = dict.fromkeys(columns, 0)
+        self.latencies = []
+        self.render_seconds = []
+        self.rendered = self.coalesced = self.dropped = 0
+
+    def render(self):
+        started = time.perf_counter()
+        updates = []
+        for column in self.columns:
+            total, times, lost = self.book.since(column, self.seen[column])
+            if total == self.seen[column]:
+                continue
+            live_view(self.book, column)
+            updates.append(times)
+            self.seen[column] = total
+            self.dropped += lost
+            self.rendered += len(times)
+            self.coalesced += max(len(times) - 1, 0)
+        shown = time.time_ns() / 1e6
+        for times in updates:
+            self.latencies.extend((shown - times).tolist())
+        if updates:
+            self.render_seconds.append(time.perf_counter() - started)
+        return len(updates)
+
+
+def _address(directory):
+    if directory is not None:
+        return f"unix:{os.path.join(directory, 'feed.sock')}"
+    return "127.0.0.1:9751"
+
+
+def run_replay(frame, speed=DEFAULT_SPEED, refresh=REFRESH_SECONDS, seconds=None, capacity=CAPACITY, address=None):
+    """Replay ``frame`` through a local feed into the live render path; return a ``ReplayReport``.
+
+    Without ``address`` the feed uses a Unix socket in a temporary
+    directory that is removed afterwards (a local TCP port where Unix
+    sockets are unavailable).
+    """
+    if address is not None or not hasattr(socket, "AF_UNIX"):
+        return _run_replay(frame, speed, refresh, seconds, capacity, address or _address(None))
+    with tempfile.TemporaryDirectory(prefix="nextbarrel-replay-") as directory:
+        return _run_replay(frame, speed, refresh, seconds, capacity, _address(directory))
+
+
+def _run_replay(frame, speed, refresh, seconds, capacity, address):
+    stop, ready = threading.Event(), threading.Event()
+    sender = _Sender(frame, speed, stop)
+    server = threading.Thread(target=serve_replay, args=(address, sender, stop, ready), daemon=True)
+    server.start()
+    ready.wait(5)
+    feed = TickFeed(address, capacity).start()
+    renderer = _Renderer(feed.book, tuple(frame.columns))
+    started = time.perf_counter()
+    try:
+        while not sender.done.is_set():
+            if seconds is not None and time.perf_counter() - started > seconds:
+                stop.set()
+                break
+            time.sleep(max(refresh - (time.perf_counter() - started) % refresh, 0))
+            with timed("replay_render"):
+                renderer.render()
+        sender.done.wait(DRAIN_SECONDS)
+        deadline = time.perf_counter() + DRAIN_SECONDS
+        while feed.received + feed.rejected < sender.sent and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        renderer.render()
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        feed.stop()
+        server.join(timeout=2)
+
+    latencies = np.array(renderer.latencies) if renderer.latencies else np.array([np.nan])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    rows = int(frame.notna().any(axis=1).sum())
+    return ReplayReport(
+        rows=rows,
+        columns=len(frame.columns),
+        speed=float(speed) if speed else float("inf"),
+        seconds=elapsed,
+        sent=sender.sent,
+        received=feed.received,
+        rejected=feed.rejected,
+        rendered=renderer.rendered,
+        coalesced=renderer.coalesced,
+        dropped=renderer.dropped + max(sender.sent - feed.received - feed.rejected, 0),
+        renders=len(renderer.render_seconds),
+        render_ms_p50=statistics.median(renderer.render_seconds) * 1000 if renderer.render_seconds else float("nan"),
+        latency_ms_p50=float(p50),
+        latency_ms_p95=float(p95),
+        latency_ms_p99=float(p99),
+        latency_ms_max=float(np.max(latencies)),
+    )
+
+
+def format_report(report):
+    speed = "max" if report.speed == float("inf") else f"{report.speed:g}x"
+    return "\n".join([
+        f"{report.rows:,} rows x {report.columns} columns at {speed} in {report.seconds:.1f} s",
+        f"ticks    sent {report.sent:,}  received {report.received:,}  rejected {report.rejected:,}"
+        f"  ({report.sent / report.seconds:,.0f}/s)",
+        f"updates  rendered {report.rendered:,}  coalesced {report.coalesced:,}  dropped {report.dropped:,}"
+        f"  in {report.renders:,} renders (p50 {report.render_ms_p50:.1f} ms)",
+        f"latency  p50 {report.latency_ms_p50:.1f}  p95 {report.latency_ms_p95:.1f}"
+        f"  p99 {report.latency_ms_p99:.1f}  max {report.latency_ms_max:.1f} ms",
+    ])
+
+
+def _speed(value):
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nextbarrel.replay", description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="history to replay (default: %(default)s)")
+    parser.add_argument("--rows", type=int, help="replay a synthetic history of this many rows instead")
+    parser.add_argument("--speed", type=_speed, default=DEFAULT_SPEED, help="time compression, or 'max' (default: %(default)s)")
+    parser.add_argument("--columns", nargs="+", default=list(LIVE_COLUMNS))
+    parser.add_argument("--all-columns", action="store_true", help="replay every numeric column")
+    parser.add_argument("--refresh", type=float, default=REFRESH_SECONDS, help="seconds between renders (default: %(default)s)")
+    parser.add_argument("--seconds", type=float, help="stop after this long")
+    parser.add_argument("--capacity", type=int, default=CAPACITY, help="ticks buffered per column (default: %(default)s)")
+    parser.add_argument("--out", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        source = price_source(synthetic_csv(args.rows, args.csv) if args.rows else args.csv)
+        columns = source.numeric_columns if args.all_columns else args.columns
+        missing = [c for c in columns if c not in source.numeric_columns]
+        if missing:
+            raise ValueError(f"unknown columns {missing}")
+        report = run_replay(source.read(columns), args.speed, args.refresh, args.seconds, args.capacity)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(asdict(report), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Rolling analytics over every numeric column at once.
+
+Rolling mean, standard deviation, volatility (standard deviation of daily
+changes), z-score and quantile bands are computed on the whole date ×
+column matrix: the moments with one cumulative-sum kernel in NumPy, the
+bands with a single pandas rolling call over the frame. Results are cached
+per (window length, data version, columns). When a new version only
+appends dates to the previous one, just the new rows are computed, from
+the last ``window`` rows of history, and joined to the previous arrays.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.memo import LRUMemo
+from nextbarrel.profiling import timed
+
+ROLLING_WINDOWS = (20, 60, 250)
+DEFAULT_WINDOW = 20
+BAND_QUANTILES = (0.05, 0.95)
+
+STATS = ("mean", "std", "vol", "zscore", "low", "high")
+
+# Results cached, and bases for incremental updates kept, at most this many of each
+CACHE_SIZE = 16
+
+_stats = LRUMemo(maxsize=CACHE_SIZE, name="rolling")
+# Latest result per (window length, columns), the base for incremental updates,
+# least recently used first
+_latest = OrderedDict()
+_latest_lock = threading.Lock()
+
+
+@dataclass(frozen=True, eq=False)
+class RollingStats:
+    """Rolling statistics aligned with ``index`` × ``columns``.
+
+    Each of ``STATS`` is an array of the same shape as ``values``; rows
+    with fewer than ``min_periods`` observations in the window are NaN.
+    """
+
+    window: int
+    version: str
+    index: pd.DatetimeIndex
+    columns: pd.Index
+    values: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    vol: np.ndarray
+    zscore: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+
+    @property
+    def key(self):
+        return (self.window, self.version, tuple(self.columns))
+
+    def frame(self, stat):
+        """One statistic for all columns as a DataFrame."""
+        return pd.DataFrame(getattr(self, stat), index=self.index, columns=self.columns, copy=False)
+
+    def column(self, column):
+        """All statistics for one column as a DataFrame."""
+        j = self.columns.get_loc(column)
+        return pd.DataFrame({stat: getattr(self, stat)[:, j] for stat in STATS}, index=self.index)
+
+    def percentile_rank(self):
+        """Percentile of each column's latest value within its whole history."""
+        latest = self.values[-1]
+        valid = ~np.isnan(self.values)
+        below = ((self.values <= latest) & valid).sum(axis=0)
+        ranks = below / np.maximum(valid.sum(axis=0), 1) * 100
+        return pd.Series(np.where(np.isnan(latest), np.nan, ranks), index=self.columns)
+
+
+def min_periods(window):
+    return max(window // 2, 2)
+
+
+def _moments(x, window, periods):
+    """Rolling mean and sample standard deviation down the rows of ``x``, ignoring NaNs."""
+    valid = ~np.isnan(x)
+    # Centre each column first so the running sums do not lose precision
+    with np.errstate(all="ignore"):
+        shift = np.where(valid.any(axis=0), np.nanmean(np.where(valid, x, np.nan), axis=0), 0.0)
+    z = np.where(valid, x - shift, 0.0)
+    zeros = np.zeros((1, x.shape[1]))
+    c1 = np.concatenate([zeros, np.cumsum(z, axis=0)])
+    c2 = np.concatenate([zeros, np.cumsum(z * z, axis=0)])
+    cn = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    hi = np.arange(1, len(x) + 1)
+    lo = np.maximum(hi - window, 0)
+    n = cn[hi] - cn[lo]
+    s1 = c1[hi] - c1[lo]
+    s2 = c2[hi] - c2[lo]
+    enough = n >= periods
+    with np.errstate(all="ignore"):
+        mean = np.where(enough, s1 / n + shift, np.nan)
+        var = np.where(enough, (s2 - s1 * s1 / n) / (n - 1), np.nan)
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def compute_rolling(values, window):
+    """Every statistic of ``STATS`` for the matrix ``values`` (dates × columns)."""
+    periods = min_periods(window)
+    mean, std = _moments(values, window, periods)
+    changes = np.vstack([np.full((1, values.shape[1]), np.nan), np.diff(values, axis=0)])
+    _, vol = _moments(changes, window, periods)
+    with np.errstate(all="ignore"):
+        zscore = np.where(std > 0, (values - mean) / std, np.nan)
+    rolling = pd.DataFrame(values, copy=False).rolling(window, min_periods=periods)
+    low, high = (rolling.quantile(q).to_numpy() for q in BAND_QUANTILES)
+    return dict(mean=mean, std=std, vol=vol, zscore=zscore, low=low, high=high)
+
+
+def _extends(previous, index, columns, values):
+    """Whether ``values`` are the rows of ``previous`` followed by later dates."""
+    m = len(previous.index)
+    return (
+        previous.columns.equals(columns)
+        and len(index) > m
+        and index[:m].equals(previous.index)
+        and np.array_equal(previous.values, values[:m], equal_nan=True)
+    )
+
+
+def _build(frame, window, version):
+    numeric = frame.select_dtypes(include="number")
+    values = numeric.to_numpy(dtype=float)
+    latest_key = (window, tuple(numeric.columns))
+    with _latest_lock:
+        previous = _latest.get(latest_key)
+    if previous is not None and _extends(previous, numeric.index, numeric.columns, values):
+        m = len(previous.index)
+        # New rows only need the last ``window`` rows of history (one extra for the daily change)
+        start = max(m - window, 0)
+        tail = compute_rolling(values[start:], window)
+        stats = {
+            name: np.concatenate([getattr(previous, name), tail[name][m - start:]])
+            for name in STATS
+        }
+    else:
+        stats = compute_rolling(values, window)
+    result = RollingStats(window, version, numeric.index, numeric.columns, values, **stats)
+    with _latest_lock:
+        _latest[latest_key] = result
+        _latest.move_to_end(latest_key)
+        while len(_latest) > CACHE_SIZE:
+            _latest.popitem(last=False)
+    return result
+
+
+def _timed_build(frame, window, version):
+    with timed("rolling"):
+        return _build(frame, window, version)
+
+
+def rolling_stats(frame, version, window=DEFAULT_WINDOW):
+    """``RollingStats`` of every numeric column of ``frame``, cached per (window, version, columns)."""
+    key = (window, version, tuple(frame.columns))
+    return _stats.get_or_compute(key, lambda: _timed_build(frame, window, version))
@@ -0,0 +1,395 @@
+"""Pluggable price sources with column and date-range pushdown.
+
+A source serves ``read(columns, start, end)``: only the requested columns
+for the requested dates, as a frame on an ascending DatetimeIndex. Tabs
+ask ``read_columns`` for the columns they draw, and derived series are
+computed from just their inputs, so what is loaded scales with what is on
+screen instead of with the whole history.
+
+Two backends are registered:
+
+``csv``
+    The wide ``Historical_prices.csv`` through ``nextbarrel.store`` (with
+    its Parquet cache). The whole file is loaded and reads are slices.
+``sqlite``
+    A long/narrow SQLite file, one row per (series, day, value), keyed by
+    series then day. A read is one indexed range query per series, so
+    neither other columns nor other dates leave the database. Build it
+    from the CSV with ``python -m nextbarrel.sources import``.
+
+``price_source`` picks the backend from the file extension (``.csv``,
+``.sqlite``/``.db``) or an explicit ``backend:path`` prefix. With
+``precision="float32"`` price columns are held as float32 wherever that is
+exact to the quoted decimals (see ``nextbarrel.compact``). Either way the
+data a source holds is read-only and shared by every session of the
+process; reads hand out slices of it.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.compact import PRECISIONS, Precision, compact
+from nextbarrel.derived import DERIVED_SERIES, compute_derived
+from nextbarrel.memo import LRUMemo
+from nextbarrel.profiling import timed
+from nextbarrel.store import DEFAULT_CSV, load_prices, source_stamp
+from nextbarrel.windows import window_positions
+
+DEFAULT_DB = "prices.sqlite"
+
+BACKENDS = {}
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def register(name, *extensions):
+    def decorator(cls):
+        cls.backend = name
+        cls.extensions = extensions
+        BACKENDS[name] = cls
+        return cls
+
+    return decorator
+
+
+@dataclass(frozen=True)
+class SourceState:
+    """What a source serves: published whole by ``refresh``, so a reader never mixes two loads.
+
+    ``data`` is backend-specific (the frame, or the SQLite series ids).
+    """
+
+    version: str = None
+    columns: tuple = ()
+    text_columns: frozenset = frozenset()
+    dates: pd.DatetimeIndex = field(default_factory=lambda: pd.DatetimeIndex([]))
+    precision: Precision = Precision()
+    memory_bytes: int = 0
+    data: object = None
+
+
+class PriceSource:
+    """Base class: ``columns`` and ``dates`` describe the data, ``read`` fetches part of it.
+
+    ``version`` identifies the content for downstream caches;
+    ``load_seconds`` is the time the last ``refresh`` spent loading.
+    ``precision`` reports which columns are held as float32, and
+    ``memory_bytes`` what the held data takes. All of them come from
+    ``state``, which ``refresh`` replaces in one assignment; callers that
+    need several of them to agree take ``state`` once and pass it to
+    ``read``.
+    """
+
+    backend = None
+    extensions = ()
+
+    def __init__(self, path, precision="float64"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown precision {precision!r}, expected one of {PRECISIONS}")
+        self.path = path
+        self.requested_precision = precision
+        self.state = SourceState()
+        self.load_seconds = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def _version(self, content):
+        # Compacted data differs from the original, so caches must not mix them
+        return content if self.requested_precision == "float64" else f"{content}:{self.requested_precision}"
+
+    @property
+    def version(self):
+        return self.state.version
+
+    @property
+    def columns(self):
+        return self.state.columns
+
+    @property
+    def text_columns(self):
+        return self.state.text_columns
+
+    @property
+    def dates(self):
+        return self.state.dates
+
+    @property
+    def precision(self):
+        return self.state.precision
+
+    @property
+    def memory_bytes(self):
+        return self.state.memory_bytes
+
+    @property
+    def numeric_columns(self):
+        return tuple(c for c in self.columns if c not in self.text_columns)
+
+    def refresh(self):
+        """Load what changed and publish it as the new ``state``; sessions refresh one at a time."""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            state = self._load(self.state)
+            if state is not self.state:
+                self.state = state
+            self.load_seconds = time.perf_counter() - started
+
+    def _load(self, state):
+        """The ``SourceState`` for the current file, or ``state`` itself if it is unchanged."""
+        raise NotImplementedError
+
+    def read(self, columns, start=None, end=None, state=None):
+        """``columns`` between ``start`` and ``end`` from ``state`` (default: the current one)."""
+        raise NotImplementedError
+
+
+@register("csv", ".csv")
+class CSVSource(PriceSource):
+    """The wide CSV, loaded whole through ``load_prices`` and held compacted."""
+
+    def _load(self, state):
+        store = load_prices(self.path)
+        version = self._version(store.version)
+        if version == state.version:
+            return state
+        frame, precision = compact(store.frame, self.requested_precision)
+        return SourceState(
+            version=version,
+            columns=tuple(frame.columns),
+            text_columns=frozenset(c for c in frame.columns if not pd.api.types.is_numeric_dtype(frame[c])),
+            dates=frame.index,
+            precision=precision,
+            memory_bytes=int(frame.memory_usage(deep=True).sum()),
+            data=frame,
+        )
+
+    def read(self, columns, start=None, end=None, state=None):
+        frame = (state or self.state).data
+        rows = window_positions(frame.index, start or frame.index[0], end or frame.index[-1])
+        return frame.iloc[rows][list(columns)]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS series (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, kind TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS days (day INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS prices (
+    series INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    value,
+    PRIMARY KEY (series, day)
+) WITHOUT ROWID;
+"""
+
+
+def _epoch_seconds(index):
+    return index.values.astype("datetime64[s]").astype(np.int64)
+
+
+@register("sqlite", ".sqlite", ".db")
+class SQLiteSource(PriceSource):
+    """Long-format SQLite file written by ``import_csv``; days are epoch seconds."""
+
+    def __init__(self, path, precision="float64"):
+        super().__init__(path, precision)
+        self._stamp = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _load(self, state):
+        stamp = source_stamp(self.path)
+        if stamp == self._stamp:
+            return state
+        with timed("load"), self._lock:
+            if self._connection is None:
+                uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+                self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            db = self._connection
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            series = db.execute("SELECT id, name, kind FROM series ORDER BY id").fetchall()
+            days = np.array([d for (d,) in db.execute("SELECT day FROM days ORDER BY day")], dtype=np.int64)
+        dates = pd.DatetimeIndex(days.astype("datetime64[s]"), name=meta.get("index_name"))
+        numeric = tuple(name for _, name, kind in series if kind != "text")
+        # import_csv records which columns compact() can narrow over the whole history
+        narrow = set(json.loads(meta.get("float32", "[]"))) if self.requested_precision == "float32" else set()
+        self._stamp = stamp
+        return SourceState(
+            version=self._version(meta["version"]),
+            columns=tuple(name for _, name, _ in series),
+            text_columns=frozenset(name for _, name, kind in series if kind == "text"),
+            dates=dates.as_unit(meta.get("index_unit", "ns")),
+            precision=Precision(
+                tuple(c for c in numeric if c in narrow),
+                tuple(c for c in numeric if c not in narrow),
+                float(meta.get("float32_error", 0.0)) if narrow else 0.0,
+            ),
+            data={name: series_id for series_id, name, _ in series},
+        )
+
+    def read(self, columns, start=None, end=None, state=None):
+        state = state or self.state
+        columns = list(columns)
+        rows = window_positions(state.dates, start or state.dates[0], end or state.dates[-1])
+        dates = state.dates[rows]
+        out = {}
+        if len(dates):
+            lo, hi = (int(d) for d in _epoch_seconds(dates[[0, -1]]))
+            day_values = _epoch_seconds(dates)
+            with self._lock:
+                for column in columns:
+                    fetched = self._connection.execute(
+                        "SELECT day, value FROM prices WHERE series = ? AND day BETWEEN ? AND ?",
+                        (state.data[column], lo, hi),
+                    ).fetchall()
+                    out[column] = self._column(column in state.text_columns, fetched, day_values)
+        else:
+            out = {column: [] for column in columns}
+        frame = pd.DataFrame(out, index=dates, columns=columns)
+        narrow = {c: np.float32 for c in columns if c in state.precision.float32}
+        return frame.astype(narrow) if narrow else frame
+
+    def _column(self, text, fetched, day_values):
+        values = np.full(len(day_values), None if text else np.nan, dtype=object if text else float)
+        if fetched:
+            days, quoted = zip(*fetched)
+            values[np.searchsorted(day_values, np.array(days, dtype=np.int64))] = quoted
+        return pd.array(values, dtype="str") if text else values
+
+
+def import_csv(csv_path=DEFAULT_CSV, db_path=DEFAULT_DB):
+    """Write the CSV's history to a long SQLite file at ``db_path``; return the version.
+
+    The columns ``compact`` can hold as float32 are recorded for float32
+    reads. Nothing is written when the file already holds this CSV version.
+    """
+    store = load_prices(csv_path)
+    frame = store.frame
+    db = sqlite3.connect(db_path)
+    try:
+        db.executescript(_SCHEMA)
+        current = dict(db.execute("SELECT key, value FROM meta WHERE key IN ('version', 'float32')"))
+        if current.get("version") == store.version and "float32" in current:
+            return store.version
+        precision = compact(frame, "float32")[1]
+        days = _epoch_seconds(frame.index)
+        with db:
+            db.execute("DELETE FROM prices")
+            db.execute("DELETE FROM series")
+            db.execute("DELETE FROM days")
+            db.executemany("INSERT INTO days VALUES (?)", ((int(d),) for d in days))
+            for series_id, column in enumerate(frame.columns, 1):
+                values = frame[column]
+                numeric = pd.api.types.is_numeric_dtype(values)
+                db.execute(
+                    "INSERT INTO series VALUES (?, ?, ?)", (series_id, column, "number" if numeric else "text")
+                )
+                quoted = values.notna().to_numpy()
+                cells = values.to_numpy(dtype=float if numeric else object)[quoted]
+                db.executemany(
+                    "INSERT INTO prices VALUES (?, ?, ?)",
+                    zip([series_id] * len(cells), days[quoted].tolist(), cells.tolist()),
+                )
+            db.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [
+                    ("version", store.version),
+                    ("source", os.path.abspath(csv_path)),
+                    ("index_name", frame.index.name),
+                    ("index_unit", frame.index.unit),
+                    ("float32", json.dumps(precision.float32)),
+                    ("float32_error", repr(precision.max_error)),
+                ],
+            )
+        return store.version
+    finally:
+        db.close()
+
+
+def price_source(location=DEFAULT_CSV, precision="float64"):
+    """Process-wide ``PriceSource`` for ``location`` at ``precision``, refreshed on every call.
+
+    Raises ``FileNotFoundError`` if the file does not exist.
+    """
+    backend, _, path = location.rpartition(":") if ":" in location.split(os.sep)[0] else ("", "", location)
+    if not backend:
+        extension = os.path.splitext(path)[1].lower()
+        backend = next((name for name, cls in BACKENDS.items() if extension in cls.extensions), None)
+    if backend not in BACKENDS:
+        raise ValueError(f"no price backend for {location!r}, expected one of {sorted(BACKENDS)}")
+    key = (backend, os.path.abspath(path), precision)
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is None:
+            source = _sources[key] = BACKENDS[backend](path, precision)
+    source.refresh()
+    return source
+
+
+def inputs(columns, registry=DERIVED_SERIES):
+    """Raw columns needed for ``columns``: derived names are replaced by their inputs."""
+    derived = {d.name: d for d in registry}
+    needed = {}
+    for column in columns:
+        d = derived.get(column)
+        for raw in ((d.source, d.benchmark) if d else (column,)):
+            if raw is not None:
+                needed.setdefault(raw, None)
+    return tuple(needed)
+
+
+def derived_columns(columns, registry=DERIVED_SERIES):
+    """Names of the derived series that can be computed from ``columns``."""
+    available = set(columns)
+    return tuple(
+        d.name for d in registry
+        if d.source in available and (d.benchmark is None or d.benchmark in available)
+    )
+
+
+_reads = LRUMemo(maxsize=64, name="reads")
+
+
+def read_columns(source, columns, start=None, end=None, registry=DERIVED_SERIES):
+    """``columns`` (raw or derived) between ``start`` and ``end``, cached per source version."""
+    columns = tuple(dict.fromkeys(columns))
+
+    # One state for the key and the read, so a concurrent refresh cannot file new data under an old version
+    state = source.state
+
+    def compute():
+        derived = {d.name: d for d in registry}
+        wanted = tuple(derived[c] for c in columns if c in derived)
+        with timed("read"):
+            frame = source.read(inputs(columns, registry), start, end, state)
+        if wanted:
+            frame = pd.concat([frame, compute_derived(frame, wanted)], axis=1)
+        return frame[list(columns)]
+
+    key = (source.backend, source.path, source.requested_precision, state.version, columns, start, end, registry)
+    return _reads.get_or_compute(key, compute)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nextbarrel.sources")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("import", help="write the CSV history to a long SQLite file")
+    convert.add_argument("csv", nargs="?", default=DEFAULT_CSV)
+    convert.add_argument("db", nargs="?", default=DEFAULT_DB)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    version = import_csv(args.csv, args.db)
+    print(f"{args.db}: version {version[:8]} ({time.perf_counter() - started:.1f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
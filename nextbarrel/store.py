@@ -0,0 +1,388 @@
+"""Price history loading.
+
+The CSV is parsed once per content version and written to a Parquet cache
+next to it, so a restarted server reads the binary file instead of
+re-running date inference over ~100 columns. The loaded frame is kept in a
+process-wide memo shared by every Streamlit session; a rerun only pays for
+an ``os.stat`` of the source file.
+
+The CSV is kept newest-first; the loaded frame always has a monotonic
+ascending DatetimeIndex so windows can be resolved by binary search (see
+``nextbarrel.windows``).
+
+When the CSV changes because rows were added to its top (the daily update)
+or bottom, only the new rows are parsed. They are merged into the loaded
+frame and stored as a small Parquet segment beside the base file, so
+ingesting a day costs the same whatever the length of the history.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+from nextbarrel.profiling import timed
+
+DEFAULT_CSV = "Historical_prices.csv"
+CACHE_DIR = ".nextbarrel_cache"
+
+# Bump when the parse options change so stale caches are not reused
+_CACHE_FORMAT = 3
+
+# Fold segments back into the base file once there are this many
+MAX_SEGMENTS = 32
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class SchemaError(ValueError):
+    """Rows do not match the column schema of the loaded history, or repeat a date."""
+
+
+@dataclass(frozen=True)
+class SourceStamp:
+    """Cheap identity of the source file, taken from ``os.stat``."""
+
+    path: str
+    mtime_ns: int
+    size: int
+
+
+@dataclass(frozen=True)
+class PriceStore:
+    """A loaded price history plus where and how fast it was loaded.
+
+    ``version`` is the content digest of the source CSV and is the key
+    downstream caches should use. ``source`` is ``"csv"`` for a full parse,
+    ``"parquet"`` for a cache hit and ``"ingest"`` when only new rows were
+    parsed.
+    """
+
+    frame: pd.DataFrame
+    version: str
+    stamp: SourceStamp
+    load_seconds: float
+    source: str
+
+
+def source_stamp(path):
+    st = os.stat(path)
+    return SourceStamp(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def _hash(data, prefix=b""):
+    h = hashlib.sha1(prefix, usedforsecurity=False)
+    h.update(data)
+    return h.hexdigest()
+
+
+def _version_digest(data):
+    return _hash(data, prefix=str(_CACHE_FORMAT).encode())
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return _version_digest(f.read())
+
+
+def read_csv(path):
+    """The CSV as written: newest-first, one block per column."""
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+
+def normalize_index(frame):
+    """``frame`` in ascending date order."""
+    # copy() consolidates the ~100 per-column blocks read_csv returns, which
+    # keeps later concat/slicing on the frame cheap
+    return frame.sort_index(kind="stable").copy()
+
+
+def _check_unique(index):
+    """Raise ``SchemaError`` if a date appears more than once in ``index``."""
+    if not index.is_unique:
+        repeated = index[index.duplicated()].unique()
+        raise SchemaError(f"dates appear more than once: {list(repeated.strftime('%Y-%m-%d'))}")
+
+
+def parse_csv(path):
+    frame = normalize_index(read_csv(path))
+    _check_unique(frame.index)
+    return frame
+
+
+def validate_schema(columns, expected):
+    """Raise ``SchemaError`` unless ``columns`` equal ``expected`` exactly.
+
+    Names are compared verbatim, so a lost trailing space in e.g.
+    ``'Tanker dirty west Africa to China 260kt $/mt '`` is reported.
+    """
+    columns, expected = list(columns), list(expected)
+    if columns == expected:
+        return
+    missing = [c for c in expected if c not in columns]
+    unexpected = [c for c in columns if c not in expected]
+    if not missing and not unexpected:
+        raise SchemaError("columns are in a different order than the loaded history")
+    raise SchemaError(f"column mismatch: missing {missing!r}, unexpected {unexpected!r}")
+
+
+def merge_rows(frame, rows):
+    """Return the ascending ``frame`` with ``rows`` merged in date order.
+
+    ``rows`` must carry exactly the same columns and only dates that are
+    not loaded yet, each once (``SchemaError`` otherwise); values are cast
+    to the dtypes of ``frame``.
+    """
+    validate_schema(rows.columns, frame.columns)
+    _check_unique(rows.index)
+    overlap = rows.index.intersection(frame.index)
+    if len(overlap):
+        raise SchemaError(f"rows already loaded for {list(overlap.strftime('%Y-%m-%d'))}")
+    dtypes = frame.dtypes
+    if (rows.dtypes != dtypes).any():
+        # Rebuilding from a dict is several times faster than astype() on a
+        # frame with one block per column, and yields consolidated blocks
+        rows = pd.DataFrame(
+            {c: rows[c] if rows[c].dtype == t else rows[c].astype(t) for c, t in dtypes.items()},
+            index=rows.index,
+        )
+    rows.index = rows.index.astype(frame.index.dtype)
+    rows.index.name = frame.index.name
+    rows = rows.sort_index(kind="stable")
+    if frame.empty or rows.index[0] > frame.index[-1]:
+        return pd.concat([frame, rows])
+    if rows.index[-1] < frame.index[0]:
+        return pd.concat([rows, frame])
+    return pd.concat([frame, rows]).sort_index(kind="stable")
+
+
+# --- File layout / change detection ---
+
+def _layout(data):
+    view = memoryview(data)
+    end = data.find(b"\n")
+    header_len = len(data) if end < 0 else end + 1
+    return {
+        "size": len(data),
+        "header_len": header_len,
+        "header_hash": _hash(view[:header_len]),
+        "body_hash": _hash(view[header_len:]),
+        "ends_with_newline": data.endswith(b"\n"),
+    }
+
+
+def _find_new_rows(data, base_meta):
+    """Locate rows added to the top or bottom of a previously loaded file.
+
+    Returns ``(header, rows)``: the file's header line, which may differ
+    from the loaded one, and the raw CSV lines of the new rows. Returns
+    ``None`` when the body changed other than by a pure insertion.
+    """
+    layout = base_meta["layout"]
+    body_len = layout["size"] - layout["header_len"]
+    end = data.find(b"\n")
+    header_len = len(data) if end < 0 else end + 1
+    if len(data) - header_len <= body_len:
+        return None
+    view = memoryview(data)
+    header = data[:header_len]
+
+    # Prepended: header line, then new lines, then the old body verbatim
+    split = len(data) - body_len
+    if data[split - 1:split] == b"\n" and _hash(view[split:]) == layout["body_hash"]:
+        return header, data[header_len:split]
+
+    # Appended: the old body follows the header and ended on a line break
+    old_end = header_len + body_len
+    boundary = layout["ends_with_newline"] or data[old_end:old_end + 1] in (b"\r", b"\n")
+    if boundary and _hash(view[header_len:old_end]) == layout["body_hash"]:
+        return header, data[old_end:].lstrip(b"\r\n")
+    return None
+
+
+def _header_columns(header):
+    """Column names of a CSV header line, without the index column."""
+    return next(csv.reader([header.decode("utf-8-sig").rstrip("\r\n")]))[1:]
+
+
+def _parse_rows(text, frame):
+    """Parse a header line plus new rows with the dtypes of ``frame``."""
+    n_fields = len(frame.columns) + 1
+    lines = csv.reader(io.StringIO(text.decode("utf-8-sig")))
+    next(lines)
+    for fields in lines:
+        if fields and len(fields) != n_fields:
+            raise SchemaError(f"row {fields[0]!r} has {len(fields)} fields, expected {n_fields}")
+    dtypes = frame.dtypes
+    text_columns = dtypes[[not pd.api.types.is_numeric_dtype(t) for t in dtypes]].to_dict()
+    return pd.read_csv(io.BytesIO(text), index_col=0, parse_dates=True, dtype=text_columns)
+
+
+# --- On-disk cache ---
+# meta.json records the stat/layout of the file the cache was built from,
+# a base Parquet file and the segments ingested on top of it since. A
+# segment is kept as the raw header + new CSV lines: writing it is a plain
+# file write, and reading it back only parses those few rows.
+
+def _meta_path(path, cache_dir):
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.meta.json")
+
+
+def _read_meta(path, cache_dir):
+    try:
+        with open(_meta_path(path, cache_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_cached(meta, cache_dir):
+    try:
+        frame = pd.read_parquet(os.path.join(cache_dir, meta["base"]))
+        for name in meta["segments"]:
+            with open(os.path.join(cache_dir, name), "rb") as f:
+                rows = _parse_rows(f.read(), frame)
+            frame = merge_rows(frame, rows)
+        return frame
+    except (ImportError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_parquet(frame, cache_dir, name):
+    path = os.path.join(cache_dir, name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    frame.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def _write_segment(text, cache_dir, name):
+    path = os.path.join(cache_dir, name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _write_meta(meta, path, cache_dir):
+    meta_path = _meta_path(path, cache_dir)
+    tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _prune(meta, path, cache_dir):
+    keep = {meta["base"], *meta["segments"]}
+    prefix = f"{os.path.basename(path)}."
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith((".parquet", ".csv")) and name not in keep:
+            os.remove(os.path.join(cache_dir, name))
+
+
+def _save(meta, frame, segment, stamp, cache_dir):
+    # The cache is an optimisation only: a read-only checkout or a missing
+    # pyarrow must never stop the terminal from loading.
+    base = os.path.basename(stamp.path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if segment is not None and meta.get("base") and len(meta["segments"]) < MAX_SEGMENTS:
+            name = f"{base}.{meta['digest']}.segment.csv"
+            _write_segment(segment, cache_dir, name)
+            meta = {**meta, "segments": meta["segments"] + [name]}
+        elif segment is not None or not meta.get("base"):
+            name = f"{base}.{meta['digest']}.parquet"
+            _write_parquet(frame, cache_dir, name)
+            meta = {**meta, "base": name, "segments": []}
+        _write_meta(meta, stamp.path, cache_dir)
+        _prune(meta, stamp.path, cache_dir)
+    except (ImportError, OSError, ValueError):
+        pass
+    return meta
+
+
+# --- Loading ---
+
+def _load(stamp, cache_dir, previous):
+    started = time.perf_counter()
+
+    def done(frame, meta, source):
+        store = PriceStore(frame, meta["digest"], stamp, time.perf_counter() - started, source)
+        return store, meta
+
+    meta = _read_meta(stamp.path, cache_dir)
+    if meta and meta.get("format") != _CACHE_FORMAT:
+        meta = None
+    if meta and meta.get("mtime_ns") == stamp.mtime_ns and meta.get("size") == stamp.size:
+        frame = _read_cached(meta, cache_dir)
+        if frame is not None:
+            return done(frame, meta, "parquet")
+
+    with open(stamp.path, "rb") as f:
+        data = f.read()
+    info = {
+        "format": _CACHE_FORMAT,
+        "mtime_ns": stamp.mtime_ns,
+        "size": stamp.size,
+        "digest": _version_digest(data),
+        "layout": _layout(data),
+    }
+
+    # Base to ingest into: this process's copy, else whatever is on disk
+    if previous is not None:
+        base_frame, base_meta = previous
+    elif meta:
+        base_frame, base_meta = _read_cached(meta, cache_dir), meta
+    else:
+        base_frame, base_meta = None, None
+
+    if base_frame is not None:
+        if base_meta["digest"] == info["digest"]:
+            # Touched but unchanged
+            return done(base_frame, _save({**base_meta, **info}, base_frame, None, stamp, cache_dir), "parquet")
+        found = _find_new_rows(data, base_meta)
+        if found is not None and found[1].strip():
+            header, chunk = found
+            if _hash(header) != base_meta["layout"]["header_hash"]:
+                # Rows were added under an edited header: the loaded columns must still match it
+                validate_schema(_header_columns(header), base_frame.columns)
+            text = header + chunk
+            rows = _parse_rows(text, base_frame)
+            try:
+                frame = merge_rows(base_frame, rows)
+            except ValueError:
+                # Repeated dates or values that do not fit the stored dtypes;
+                # the full parse below reports the first and settles the second
+                pass
+            else:
+                meta = _save({**base_meta, **info}, frame, text, stamp, cache_dir)
+                return done(frame, meta, "ingest")
+
+    frame = parse_csv(stamp.path)
+    meta = _save({**info, "base": None, "segments": []}, frame, None, stamp, cache_dir)
+    return done(frame, meta, "csv")
+
+
+def load_prices(path=DEFAULT_CSV, cache_dir=CACHE_DIR):
+    """Return the price history for ``path``, reloading only what changed.
+
+    Raises ``FileNotFoundError`` if the CSV does not exist and
+    ``SchemaError`` if rows added to it do not match its header or a date
+    appears twice.
+    """
+    with timed("load"):
+        stamp = source_stamp(path)
+        with _memo_lock:
+            entry = _memo.get(stamp.path)
+            if entry is not None and entry[0].stamp == stamp:
+                return entry[0]
+            previous = (entry[0].frame, entry[1]) if entry is not None else None
+            store, meta = _load(stamp, cache_dir, previous)
+            _memo[stamp.path] = (store, meta)
+            return store
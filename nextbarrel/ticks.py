@@ -0,0 +1,462 @@
+"""Intraday price ticks pushed by a local feed process.
+
+    python -m nextbarrel.ticks replay --rate 500
+    python -m nextbarrel.ticks replay --file ticks.ndjson --address unix:/tmp/nextbarrel.sock
+    python -m nextbarrel.ticks record --out ticks.ndjson --seconds 60
+
+The feed is one JSON object per line, ``{"s": column, "t": epoch_ms, "v":
+value}``, sent over TCP (``host:port``) or a Unix socket (``unix:path``).
+``TickFeed`` reads it in a background thread and reconnects when the feed
+goes away. Ticks are applied in batches, one per socket read, to a
+``TickBook``: a fixed-size ring buffer of times and values per column.
+Every column has a version that changes only when one of its ticks
+arrives, so a renderer on a timer redraws just the columns that moved (see
+the Live panel in ``app.py``).
+
+``replay`` is a stand-in for the real feed. It serves random walks starting
+from each column's latest close with its daily volatility spread over a
+trading day, or a file written by ``record`` re-stamped with the current
+time.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from nextbarrel.charts import ticks_json
+from nextbarrel.profiling import timed
+
+DEFAULT_ADDRESS = "127.0.0.1:9750"
+LIVE_COLUMNS = ("Ice Brent M1", "Nymex WTI futures M1", "Dubai M1")
+# Ticks kept per column; older ones are overwritten
+CAPACITY = 20_000
+# Seconds between redraws of the live panel
+REFRESH_SECONDS = 1.0
+DEFAULT_RATE = 300
+# Seconds between reconnection attempts, doubling up to the maximum
+RETRY_SECONDS = 0.5
+MAX_RETRY_SECONDS = 5.0
+# Seconds the daily volatility of a synthetic walk is spread over
+TRADING_SECONDS = 8 * 3600
+
+_READ_BYTES = 65536
+_SEND_INTERVAL = 0.01
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Tick:
+    column: str
+    time: int
+    value: float
+
+
+def encode(tick):
+    """One feed line for ``tick``."""
+    return (json.dumps({"s": tick.column, "t": tick.time, "v": tick.value}) + "\n").encode("utf-8")
+
+
+def decode(line):
+    """``Tick`` for one feed line; ``ValueError`` if it is not one."""
+    try:
+        fields = json.loads(line)
+        return Tick(str(fields["s"]), int(fields["t"]), float(fields["v"]))
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"bad tick {line[:80]!r}: {e}") from None
+
+
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def parse_address(address):
+    """``(family, address)`` for ``socket`` from ``"host:port"`` or ``"unix:path"``."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"bad feed address {address!r}, expected host:port or unix:path")
+    return socket.AF_INET, (host, int(port))
+
+
+class TickRing:
+    """The last ``capacity`` ticks of one column as parallel time/value arrays."""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def extend(self, times, values):
+        times, values = times[-self.capacity:], values[-self.capacity:]
+        start = self.total % self.capacity
+        head = min(len(times), self.capacity - start)
+        self._times[start:start + head], self._values[start:start + head] = times[:head], values[:head]
+        self._times[:len(times) - head], self._values[:len(values) - head] = times[head:], values[head:]
+        self.total += len(times)
+
+    def arrays(self):
+        """Copies of the buffered ``(times, values)``, oldest first."""
+        if self.total <= self.capacity:
+            return self._times[:self.total].copy(), self._values[:self.total].copy()
+        start = self.total % self.capacity
+        return np.roll(self._times, -start), np.roll(self._values, -start)
+
+    def since(self, seen):
+        """``(times, lost)`` of the ticks after the first ``seen``: times still buffered, count overwritten."""
+        new = self.total - seen
+        kept = min(new, len(self))
+        if kept <= 0:
+            return np.zeros(0, dtype=np.int64), max(new, 0)
+        return self.arrays()[0][-kept:], new - kept
+
+    def last(self):
+        if not self.total:
+            return None
+        i = (self.total - 1) % self.capacity
+        return int(self._times[i]), float(self._values[i])
+
+
+class TickBook:
+    """Ring buffers per column with a version per column."""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.ticks = 0
+        self._rings = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def apply(self, ticks):
+        """Add ``ticks``; return the columns they touched."""
+        by_column = {}
+        for tick in ticks:
+            by_column.setdefault(tick.column, []).append(tick)
+        with self._lock:
+            for column, batch in by_column.items():
+                ring = self._rings.get(column)
+                if ring is None:
+                    ring = self._rings[column] = TickRing(self.capacity)
+                ring.extend(
+                    np.fromiter((t.time for t in batch), np.int64, len(batch)),
+                    np.fromiter((t.value for t in batch), np.float64, len(batch)),
+                )
+                self._versions[column] = self._versions.get(column, 0) + 1
+            self.ticks += len(ticks)
+        return set(by_column)
+
+    def columns(self):
+        with self._lock:
+            return tuple(self._rings)
+
+    def version(self, column):
+        """Changes whenever ``column`` receives ticks; 0 before the first one."""
+        with self._lock:
+            return self._versions.get(column, 0)
+
+    def latest(self, column):
+        """``(Timestamp, value)`` of the last tick of ``column``, or None."""
+        with self._lock:
+            ring = self._rings.get(column)
+            last = ring.last() if ring is not None else None
+        if last is None:
+            return None
+        return pd.Timestamp(last[0], unit="ms", tz="UTC"), last[1]
+
+    def since(self, column, seen):
+        """``(total, times, lost)``: ticks of ``column`` so far, and ``TickRing.since(seen)``."""
+        with self._lock:
+            ring = self._rings.get(column)
+            if ring is None:
+                return 0, np.zeros(0, dtype=np.int64), 0
+            return (ring.total, *ring.since(seen))
+
+    def series(self, column):
+        """Buffered ticks of ``column`` as a Series on a UTC DatetimeIndex."""
+        with self._lock:
+            ring = self._rings.get(column)
+            times, values = ring.arrays() if ring is not None else (np.zeros(0, np.int64), np.zeros(0))
+        index = pd.DatetimeIndex(times.astype("datetime64[ms]"), name="time").tz_localize("UTC")
+        return pd.Series(values, index=index, name=column)
+
+
+@dataclass(frozen=True)
+class LiveView:
+    """What the live panel shows for one column; ``change`` is from ``close``, NaN without one."""
+
+    column: str
+    time: pd.Timestamp
+    value: float
+    change: float
+    figure: str
+
+
+def live_view(book, column, close=None, label=None):
+    """``LiveView`` of ``column`` in ``book``, or None before its first tick."""
+    latest = book.latest(column)
+    if latest is None:
+        return None
+    when, value = latest
+    change = value - close if close is not None else float("nan")
+    return LiveView(column, when, value, change, ticks_json(column, label or column, book))
+
+
+class TickFeed:
+    """Background reader of one feed address into a ``TickBook``.
+
+    ``connected``, ``received`` (valid ticks), ``rejected`` (bad lines)
+    and ``error`` (the last connection error) describe its state.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, capacity=CAPACITY):
+        self.address = address
+        self.book = TickBook(capacity)
+        self.connected = False
+        self.received = 0
+        self.rejected = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="nextbarrel-ticks", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        sock = self._socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        retry = RETRY_SECONDS
+        while not self._stop.is_set():
+            try:
+                family, address = parse_address(self.address)
+                with socket.socket(family, socket.SOCK_STREAM) as sock:
+                    sock.connect(address)
+                    self._socket, self.connected, self.error = sock, True, None
+                    retry = RETRY_SECONDS
+                    self._read(sock)
+            except OSError as e:
+                self.error = str(e)
+            finally:
+                self._socket, self.connected = None, False
+            self._stop.wait(retry)
+            retry = min(retry * 2, MAX_RETRY_SECONDS)
+
+    def _read(self, sock):
+        pending = b""
+        while not self._stop.is_set():
+            data = sock.recv(_READ_BYTES)
+            if not data:
+                return
+            *lines, pending = (pending + data).split(b"\n")
+            ticks = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    ticks.append(decode(line))
+                except ValueError:
+                    self.rejected += 1
+            if ticks:
+                with timed("ticks"):
+                    self.book.apply(ticks)
+                self.received += len(ticks)
+
+
+def tick_feed(address=DEFAULT_ADDRESS, capacity=CAPACITY):
+    """Process-wide ``TickFeed`` for ``address``, started on first use."""
+    key = (address, capacity)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = _feeds[key] = TickFeed(address, capacity)
+        feed.start()
+    return feed
+
+
+def synthetic_ticks(closes, vols, rate=DEFAULT_RATE, seed=None):
+    """Endless ``Tick`` stream: a random walk per column from ``closes`` at ``rate`` ticks/s in total.
+
+    ``vols`` are daily standard deviations, spread over ``TRADING_SECONDS``.
+    """
+    rng = np.random.default_rng(seed)
+    columns = list(closes)
+    prices = np.array([closes[c] for c in columns], dtype=float)
+    step = np.array([vols[c] for c in columns], dtype=float) * np.sqrt(len(columns) / (rate * TRADING_SECONDS))
+    while True:
+        i = int(rng.integers(len(columns)))
+        prices[i] += rng.normal(0.0, step[i])
+        yield Tick(columns[i], now_ms(), round(float(prices[i]), 3))
+
+
+def file_ticks(path):
+    """Endless ``Tick`` stream looping over a recorded file, stamped with the current time."""
+    with open(path, "rb") as f:
+        recorded = [decode(line) for line in f if line.strip()]
+    if not recorded:
+        raise ValueError(f"no ticks in {path}")
+    while True:
+        for tick in recorded:
+            yield Tick(tick.column, now_ms(), tick.value)
+
+
+def closes_and_vols(columns, csv_path=None):
+    """Latest close and daily volatility of ``columns`` from the price history."""
+    from nextbarrel.store import DEFAULT_CSV, load_prices
+
+    frame = load_prices(csv_path or DEFAULT_CSV).frame
+    closes, vols = {}, {}
+    for column in columns:
+        if column not in frame.columns:
+            raise ValueError(f"unknown column {column!r}")
+        quoted = frame[column].dropna()
+        closes[column] = float(quoted.iloc[-1]) if len(quoted) else 0.0
+        vol = float(quoted.diff().std()) if len(quoted) > 2 else 0.0
+        vols[column] = vol if np.isfinite(vol) and vol > 0 else max(abs(closes[column]) * 0.01, 0.01)
+    return closes, vols
+
+
+def paced(ticks, rate=DEFAULT_RATE):
+    """Lists of ``ticks`` released at ``rate`` ticks/s in total."""
+    started, sent = time.perf_counter(), 0
+    while True:
+        due = int((time.perf_counter() - started) * rate) - sent
+        if due > 0:
+            batch = list(islice(ticks, due))
+            if not batch:
+                return
+            yield batch
+            sent += len(batch)
+        else:
+            time.sleep(_SEND_INTERVAL)
+
+
+def _send(conn, batches, stop):
+    for batch in batches:
+        if stop.is_set():
+            return
+        conn.sendall(b"".join(encode(tick) for tick in batch))
+
+
+def serve_replay(address, make_batches, stop=None, ready=None):
+    """Send ``make_batches()`` (lists of ticks) to every client of ``address`` until ``stop`` is set.
+
+    ``ready`` is set once the address accepts connections.
+    """
+    stop = stop or threading.Event()
+    family, bind = parse_address(address)
+    if family == socket.AF_UNIX and os.path.exists(bind):
+        os.unlink(bind)
+    with socket.socket(family, socket.SOCK_STREAM) as server:
+        if family == socket.AF_INET:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(bind)
+        server.listen()
+        server.settimeout(0.2)
+        if ready is not None:
+            ready.set()
+
+        def client(conn):
+            with conn:
+                try:
+                    _send(conn, make_batches(), stop)
+                except OSError:
+                    pass
+
+        while not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=client, args=(conn,), daemon=True).start()
+
+
+def record(address, out, seconds):
+    """Write the ticks ``address`` sends during ``seconds`` to ``out``; return how many."""
+    family, target = parse_address(address)
+    deadline = time.monotonic() + seconds
+    count, pending = 0, b""
+    with socket.socket(family, socket.SOCK_STREAM) as sock, open(out, "wb") as f:
+        sock.connect(target)
+        sock.settimeout(0.5)
+        while time.monotonic() < deadline:
+            try:
+                data = sock.recv(_READ_BYTES)
+            except socket.timeout:
+                continue
+            if not data:
+                break
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    f.write(line + b"\n")
+                    count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nextbarrel.ticks", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="serve replayed or synthetic ticks")
+    replay.add_argument("--address", default=DEFAULT_ADDRESS, help="host:port or unix:path (default: %(default)s)")
+    replay.add_argument("--rate", type=float, default=DEFAULT_RATE, help="ticks per second (default: %(default)s)")
+    replay.add_argument("--columns", nargs="+", default=list(LIVE_COLUMNS))
+    replay.add_argument("--csv", help="history the synthetic walks start from")
+    replay.add_argument("--file", help="replay ticks recorded with 'record' instead")
+    replay.add_argument("--seed", type=int)
+    rec = commands.add_parser("record", help="write a feed's ticks to a file")
+    rec.add_argument("--address", default=DEFAULT_ADDRESS)
+    rec.add_argument("--out", required=True)
+    rec.add_argument("--seconds", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "record":
+            print(f"{args.out}: {record(args.address, args.out, args.seconds)} ticks")
+            return 0
+        if args.file:
+            next(file_ticks(args.file))
+            make_ticks = partial(file_ticks, args.file)
+        else:
+            closes, vols = closes_and_vols(args.columns, args.csv)
+            make_ticks = partial(synthetic_ticks, closes, vols, args.rate, args.seed)
+        print(f"Serving {args.rate:g} ticks/s on {args.address}", file=sys.stderr)
+        serve_replay(args.address, lambda: paced(make_ticks(), args.rate))
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Time windows over the ascending price index.
+
+Windows are resolved with ``searchsorted`` on the DatetimeIndex and applied
+as positional slices, so selecting a timeframe is O(log n) and returns a
+view of the loaded frame rather than a copy. Relative windows such as YTD
+are anchored on the last date in the data, not on today's date.
+"""
+
+import pandas as pd
+
+from nextbarrel.profiling import timed
+
+TIMEFRAMES = ("1W", "1M", "3M", "YTD", "ALL")
+DEFAULT_TIMEFRAME = "3M"
+
+_LOOKBACK = {
+    "1W": pd.Timedelta(weeks=1),
+    "1M": pd.Timedelta(days=30),
+    "3M": pd.Timedelta(days=90),
+}
+
+
+def window_bounds(index, timeframe=DEFAULT_TIMEFRAME, start=None, end=None):
+    """Return the ``(start, end)`` timestamps of a window over ``index``.
+
+    ``timeframe`` is one of ``TIMEFRAMES``. Explicit ``start``/``end``
+    override the corresponding bound, so a custom range is
+    ``window_bounds(index, "ALL", start, end)``.
+    """
+    if len(index) == 0:
+        raise ValueError("cannot resolve a window over an empty index")
+    last = index[-1]
+    if timeframe == "ALL":
+        lower = index[0]
+    elif timeframe == "YTD":
+        lower = pd.Timestamp(year=last.year, month=1, day=1)
+    elif timeframe in _LOOKBACK:
+        lower = last - _LOOKBACK[timeframe]
+    else:
+        raise ValueError(f"unknown timeframe {timeframe!r}, expected one of {TIMEFRAMES}")
+    lower = pd.Timestamp(start) if start is not None else lower.normalize()
+    upper = pd.Timestamp(end) if end is not None else last
+    return lower, upper
+
+
+def window_positions(index, start, end):
+    """Positional ``slice`` covering ``start <= date <= end`` on an ascending index."""
+    lo = index.searchsorted(start, side="left")
+    hi = index.searchsorted(end, side="right")
+    return slice(lo, hi)
+
+
+def window(frame, timeframe=DEFAULT_TIMEFRAME, start=None, end=None):
+    """Rows of ``frame`` inside the window, as a view of ``frame``."""
+    with timed("filter"):
+        lower, upper = window_bounds(frame.index, timeframe, start, end)
+        return frame.iloc[window_positions(frame.index, lower, upper)]
+
+
+def window_key(frame):
+    """Identify a window by its first/last date and length, for cache keys."""
+    if frame.empty:
+        return (None, None, 0)
+    return (frame.index[0], frame.index[-1], len(frame))
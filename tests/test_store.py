@@ -0,0 +1,66 @@
+import os
+import shutil
+
+import pytest
+
+from nextbarrel import store
+from nextbarrel.store import SchemaError, load_prices
+
+CSV = os.path.join(os.path.dirname(__file__), os.pardir, "Historical_prices.csv")
+RENAMED = b"Tanker dirty west Africa to China 260kt $/mt "
+
+
+@pytest.fixture
+def prices(tmp_path, monkeypatch):
+    path = tmp_path / "prices.csv"
+    shutil.copy(CSV, path)
+    monkeypatch.setattr(store, "_memo", {})
+    return str(path)
+
+
+def _split(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    header_len = data.index(b"\n") + 1
+    first_row = data[header_len:data.index(b"\n", header_len) + 1]
+    return data[:header_len], first_row, data[header_len:]
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    # A different mtime, as a real update would have
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def _later(row):
+    """``row`` moved to a date after the whole history."""
+    return b"01/01/2100," + row.partition(b",")[2]
+
+
+def test_prepended_row_is_ingested(prices, tmp_path):
+    before = load_prices(prices, tmp_path / "cache")
+    header, row, body = _split(prices)
+    _write(prices, header + _later(row) + body)
+    after = load_prices(prices, tmp_path / "cache")
+    assert after.source == "ingest"
+    assert len(after.frame) == len(before.frame) + 1
+    assert after.frame.index.is_unique
+
+
+def test_renamed_header_column_is_a_schema_error(prices, tmp_path):
+    load_prices(prices, tmp_path / "cache")
+    header, row, body = _split(prices)
+    assert RENAMED in header
+    _write(prices, header.replace(RENAMED, RENAMED.rstrip()) + _later(row) + body)
+    with pytest.raises(SchemaError, match="column mismatch"):
+        load_prices(prices, tmp_path / "cache")
+
+
+def test_repeated_date_is_a_schema_error(prices, tmp_path):
+    load_prices(prices, tmp_path / "cache")
+    header, row, body = _split(prices)
+    _write(prices, header + row + body)
+    with pytest.raises(SchemaError):
+        load_prices(prices, tmp_path / "cache")